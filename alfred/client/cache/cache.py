@@ -1,7 +1,14 @@
 import abc
 import ast
+import atexit
+import contextlib
+import hashlib
+import json
 import logging
-from typing import Optional, List, Callable, Union, Any, Dict
+import os
+import time
+import weakref
+from typing import Optional, List, Callable, Union, Any, Dict, Tuple
 
 import pandas as pd
 
@@ -10,6 +17,18 @@ from alfred.fm.response import deserialize, Response
 
 logger = logging.getLogger(__name__)
 
+# caches with a write-behind buffer, flushed at interpreter exit without being kept alive until then
+_buffered_caches = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_buffered_caches():
+    """
+    Flush the write-behind buffers of the caches still alive at interpreter exit
+    """
+    for cache in list(_buffered_caches):
+        cache.flush()
+
 
 def to_metadata_string(**kwargs: Any) -> str:
     """
@@ -44,8 +63,20 @@ class Cache(abc.ABC):
         - SqliteCache: Sqlite3 - based cache
     TODO:
         - RedisCache: Redis - based cache
+
+    Writes issued through `buffered_write` (as done by `cached_query`) are held in a write-behind buffer
+    and flushed to the backend in one transaction once `write_buffer_size` rows are pending,
+    `write_buffer_interval_ms` milliseconds have passed since the last flush (checked on each write),
+    on `save()` and at interpreter exit. `read_chunked` looks up buffered rows in the buffer, while the other
+    readers (`read`, `read_by_*`, `to_pandas`) flush the buffer first, so buffered rows are visible to all of them;
+    cache implementations should call `flush()` at the start of these readers.
     """
 
+    lookup_chunk_size: int = 4096
+    last_hit_ratio: Optional[float] = None
+    write_buffer_size: int = 1024
+    write_buffer_interval_ms: int = 1000
+
     @abc.abstractmethod
     def read(self, prompt: str, metadata: Optional[str] = None) -> list:
         """
@@ -73,7 +104,7 @@ class Cache(abc.ABC):
         :type prompts: list
         :param metadata: (optional) Metadata string
         :type metadata: str
-        :return: List of serialized responses
+        :return: List of serialized responses aligned with the prompts, None for cache misses
         :rtype: list
         """
         raise NotImplementedError(
@@ -210,6 +241,149 @@ class Cache(abc.ABC):
             f"to_pandas() is not implemented for {self.__class__.__name__}"
         )
 
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Context manager grouping the writes issued inside it into a single backend transaction.
+        Backends without transaction support keep the default no-op implementation.
+        """
+        yield
+
+    def _get_write_buffer(self) -> Dict[Optional[str], Dict[str, str]]:
+        """
+        Return the write-behind buffer, creating it on first use
+
+        :return: Buffered responses as {metadata: {serialized prompt: serialized response}}
+        :rtype: Dict[Optional[str], Dict[str, str]]
+        """
+        if not hasattr(self, "_write_buffer"):
+            self._write_buffer = {}
+            self._write_buffer_len = 0
+            self._last_flush = time.monotonic()
+            _buffered_caches.add(self)
+        return self._write_buffer
+
+    def buffered_write(
+        self, prompts: List[str], responses: List[str], metadata: Optional[str] = None
+    ):
+        """
+        Queue serialized prompts and responses in the write-behind buffer,
+        flushing the buffer if it is full or the flush interval has elapsed
+
+        :param prompts: List of serialized prompts
+        :type prompts: List[str]
+        :param responses: List of serialized responses
+        :type responses: List[str]
+        :param metadata: (optional) Metadata string
+        :type metadata: str
+        """
+        pending = self._get_write_buffer().setdefault(metadata, {})
+        for prompt, response in zip(prompts, responses):
+            if prompt not in pending:
+                self._write_buffer_len += 1
+            pending[prompt] = response
+        if (
+            self._write_buffer_len >= self.write_buffer_size
+            or (time.monotonic() - self._last_flush) * 1000
+            >= self.write_buffer_interval_ms
+        ):
+            self.flush()
+
+    def flush(self):
+        """
+        Write all buffered rows to the backend in one transaction,
+        using `write_batch` per metadata group and falling back to per-row `write`
+        """
+        if not getattr(self, "_write_buffer_len", 0):
+            return
+        with self.transaction():
+            for metadata, pending in self._write_buffer.items():
+                prompts, responses = list(pending.keys()), list(pending.values())
+                try:
+                    self.write_batch(prompts, responses, metadata=metadata)
+                except NotImplementedError:
+                    for prompt, response in zip(prompts, responses):
+                        self.write(prompt, response, metadata=metadata)
+        logger.info(f"Flushed {self._write_buffer_len} buffered cache writes")
+        self._write_buffer = {}
+        self._write_buffer_len = 0
+        self._last_flush = time.monotonic()
+
+    def read_chunked(
+        self, prompts: List[str], metadata: Optional[str] = None
+    ) -> List[Optional[str]]:
+        """
+        Look up a list of serialized prompts with one bulk read per chunk of `lookup_chunk_size` prompts.
+        Falls back to per-prompt `read` for caches that do not implement `read_batch`.
+        Rows still pending in the write-behind buffer take precedence over the backend.
+
+        :param prompts: List of serialized prompts
+        :type prompts: List[str]
+        :param metadata: (optional) Metadata string
+        :type metadata: str
+        :return: List of serialized responses aligned with the prompts, None for cache misses
+        :rtype: List[Optional[str]]
+        """
+        responses = []
+        for start in range(0, len(prompts), self.lookup_chunk_size):
+            chunk = prompts[start : start + self.lookup_chunk_size]
+            try:
+                responses += self.read_batch(chunk, metadata)
+            except NotImplementedError:
+                responses += [self.read(prompt, metadata) for prompt in chunk]
+
+        pending = getattr(self, "_write_buffer", {}).get(metadata)
+        if pending:
+            responses = [
+                pending.get(prompt, response)
+                for prompt, response in zip(prompts, responses)
+            ]
+        return responses
+
+    def _lookup(
+        self, queries: List[Union[Query, str]], metadata: str
+    ) -> Tuple[List[str], List[Optional[Response]], List[int]]:
+        """
+        Serialize the queries and look them up in the cache, recording the hit ratio
+
+        :param queries: List of queries
+        :type queries: List[Union[Query, str]]
+        :param metadata: Metadata string
+        :type metadata: str
+        :return: The serialized queries, the cached responses (None for cache misses)
+            and the indices of the queries missing from the cache
+        :rtype: Tuple[List[str], List[Optional[Response]], List[int]]
+        """
+        serialized_queries = [
+            query.serialize() if isinstance(query, Query) else str(query)
+            for query in queries
+        ]
+        cached_responses = self.read_chunked(serialized_queries, metadata)
+
+        responses, new_q_idx = [], []
+        for q_idx, cached_response in enumerate(cached_responses):
+            if cached_response:
+                responses.append(deserialize(cached_response))
+            else:
+                responses.append(None)
+                new_q_idx.append(q_idx)
+
+        self.last_hit_ratio = (
+            1 - len(new_q_idx) / len(queries) if len(queries) > 0 else 0.0
+        )
+        logger.info(
+            f"Cache hit ratio: {len(queries) - len(new_q_idx)}/{len(queries)} "
+            f"({self.last_hit_ratio:.2%})"
+        )
+        return serialized_queries, responses, new_q_idx
+
+    def checkpoint(self):
+        """
+        Make every write issued so far durable.
+        The default implementation flushes the write-behind buffer to the backend.
+        """
+        self.flush()
+
     def cached_query(self, model_run: Callable) -> Callable:
         """
         Decorator function for model queries, fetch from cache db if exist else write into cache_db
@@ -239,17 +413,8 @@ class Cache(abc.ABC):
             list_flag = isinstance(queries, list)
             queries = [queries] if not list_flag else queries
 
-            responses, new_q_idx, new_queries = [], [], []
-            for q_idx, query in enumerate(queries):
-                cached_response = self.read(
-                    query.serialize() if isinstance(query, Query) else str(query),
-                    metadata,
-                )
-                if cached_response:
-                    responses.append(deserialize(cached_response))
-                else:
-                    responses.append(None)
-                    new_q_idx.append(q_idx)
+            serialized_queries, responses, new_q_idx = self._lookup(queries, metadata)
+
             _new_queries = [queries[idx] for idx in new_q_idx]
             if len(new_q_idx) > 0:
                 logger.info(f"Running {len(new_q_idx)} queries")
@@ -263,23 +428,14 @@ class Cache(abc.ABC):
                     else _model_responses
                 )
                 _serialized_responses = [
-                    response.serialize() for response in _model_responses
-                ]
-                _serialized_new_queries = [
-                    query.serialize() if isinstance(query, Query) else str(query)
-                    for query in _new_queries
+                    response.to_bytes() for response in _model_responses
                 ]
-                try:
-                    self.write_batch(
-                        _serialized_new_queries,
-                        _serialized_responses,
-                        metadata=metadata,
-                    )
-                except NotImplementedError:
-                    for query, response in zip(
-                        _serialized_new_queries, _serialized_responses
-                    ):
-                        self.write(query, response, metadata=metadata)
+                _serialized_new_queries = [serialized_queries[idx] for idx in new_q_idx]
+                self.buffered_write(
+                    _serialized_new_queries,
+                    _serialized_responses,
+                    metadata=metadata,
+                )
 
                 for idx, q_idx in enumerate(new_q_idx):
                     responses[q_idx] = _model_responses[idx]
@@ -289,3 +445,153 @@ class Cache(abc.ABC):
             return responses[0] if not list_flag else responses
 
         return run_query
+
+    def resumable_query(
+        self,
+        model_run: Callable,
+        checkpoint_size: int = 1024,
+        manifest_path: Optional[str] = None,
+    ) -> Callable:
+        """
+        Decorator function for long-running model queries that checkpoints progress into the cache.
+
+        Like `cached_query`, queries found in the cache are not run again. The remaining queries
+        are run in chunks of `checkpoint_size`, and every chunk's responses are written and
+        checkpointed as soon as it completes. A run that dies part-way can therefore be restarted
+        with the same queries and only runs the queries that are still missing.
+
+        Progress is recorded in a JSON manifest at `manifest_path`
+        (by default next to the cache file, if the cache has one),
+        which is rewritten after every chunk and is also available as `self.manifest`.
+
+        :param model_run: Model run function
+        :type model_run: Callable
+        :param checkpoint_size: The number of queries to run between checkpoints
+        :type checkpoint_size: int
+        :param manifest_path: (optional) Path of the progress manifest
+        :type manifest_path: str
+        :return: Decorated function
+        :rtype: Callable
+        """
+        if manifest_path is None and getattr(self, "cache_location", None):
+            manifest_path = f"{self.cache_location}.manifest.json"
+
+        def run_query(
+            queries: Union[Query, List[Query], str, List[str]], **kwargs: Any
+        ) -> Union[Response, List[Response]]:
+            """
+            Run query function wrapper that fetches cached responses, runs the missing queries
+            chunk by chunk and checkpoints every completed chunk into the cache
+
+            :param queries: List of queries
+            :type queries: Union[Query, List[Query], str, List[str]]
+            :param kwargs: Keyword arguments
+            :type kwargs: Any
+            :return: List of responses
+            :rtype: Union[Response, List[Response]]
+            """
+            metadata = to_metadata_string(**kwargs)
+            list_flag = isinstance(queries, list)
+            queries = [queries] if not list_flag else queries
+
+            serialized_queries, responses, new_q_idx = self._lookup(queries, metadata)
+
+            job_digest = hashlib.blake2b(metadata.encode(), digest_size=8)
+            for serialized_query in serialized_queries:
+                job_digest.update(serialized_query.encode())
+            manifest = {
+                "job_id": job_digest.hexdigest(),
+                "metadata": metadata,
+                "total": len(queries),
+                "cached": len(queries) - len(new_q_idx),
+                "completed": len(queries) - len(new_q_idx),
+                "checkpoint_size": checkpoint_size,
+                "chunks_completed": 0,
+                "chunks_total": -(-len(new_q_idx) // checkpoint_size),
+                "attempt": 1,
+                "status": "running",
+                "error": None,
+                "started_at": time.time(),
+                "updated_at": time.time(),
+            }
+            previous = read_manifest(manifest_path) if manifest_path else None
+            if previous is not None and previous.get("job_id") == manifest["job_id"]:
+                manifest["attempt"] = previous.get("attempt", 0) + 1
+                manifest["started_at"] = previous.get("started_at", time.time())
+            self.manifest = manifest
+            self._update_manifest(manifest_path)
+
+            for start in range(0, len(new_q_idx), checkpoint_size):
+                chunk = new_q_idx[start : start + checkpoint_size]
+                logger.info(
+                    f"Running queries {start + 1}-{start + len(chunk)} of {len(new_q_idx)}"
+                )
+                try:
+                    _model_responses = model_run(
+                        [queries[idx] for idx in chunk], **kwargs
+                    )
+                except BaseException as e:
+                    self._update_manifest(manifest_path, status="failed", error=repr(e))
+                    raise
+                _model_responses = (
+                    [_model_responses]
+                    if not isinstance(_model_responses, list)
+                    else _model_responses
+                )
+                self.buffered_write(
+                    [serialized_queries[idx] for idx in chunk],
+                    [response.to_bytes() for response in _model_responses],
+                    metadata=metadata,
+                )
+                self.checkpoint()
+                for idx, response in zip(chunk, _model_responses):
+                    responses[idx] = response
+
+                self._update_manifest(
+                    manifest_path,
+                    completed=manifest["completed"] + len(chunk),
+                    chunks_completed=manifest["chunks_completed"] + 1,
+                )
+
+            self._update_manifest(manifest_path, status="done")
+            logger.info(f"Returning {len(responses)} responses")
+
+            return responses[0] if not list_flag else responses
+
+        return run_query
+
+    def _update_manifest(self, manifest_path: Optional[str], **updates: Any):
+        """
+        Update the progress manifest of the current resumable run and write it to disk atomically
+
+        :param manifest_path: Path of the progress manifest, None to keep it in memory only
+        :type manifest_path: str
+        :param updates: Manifest fields to update
+        :type updates: Any
+        """
+        self.manifest.update(updates, updated_at=time.time())
+        if manifest_path is None:
+            return
+        manifest_dir = os.path.dirname(manifest_path)
+        if manifest_dir:
+            os.makedirs(manifest_dir, exist_ok=True)
+        tmp_path = f"{manifest_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp_path, manifest_path)
+
+
+def read_manifest(manifest_path: str) -> Optional[Dict]:
+    """
+    Read the progress manifest written by `Cache.resumable_query`
+
+    :param manifest_path: Path of the progress manifest
+    :type manifest_path: str
+    :return: The manifest, or None if it does not exist or cannot be parsed
+    :rtype: Optional[Dict]
+    """
+    try:
+        with open(manifest_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
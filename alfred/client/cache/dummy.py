@@ -27,6 +27,7 @@ class DummyCache(Cache):
         :return: The response from the cache
         :rtype: List
         """
+        self.flush()
         try:
             response = [
                 {"response": self.cache[prompt + metadata if metadata else prompt]}
@@ -85,13 +86,14 @@ class DummyCache(Cache):
 
     def save(self, path: str) -> str:
         """
-        Does not save but return the path argrument
+        Does not save but flushes buffered writes and return the path argrument
 
         :param path: The path to save the cache to
         :type path: str
         :return: The path argument
         :rtype: str
         """
+        self.flush()
         return path
 
     def to_pandas(self) -> None:
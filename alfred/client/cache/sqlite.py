@@ -1,3 +1,5 @@
+import contextlib
+import hashlib
 import logging
 import os
 import sqlite3
@@ -9,25 +11,60 @@ from alfred.client.cache.cache import Cache
 
 logger = logging.getLogger(__name__)
 
+SCHEMA_VERSION = 2
+DIGEST_SIZE = 16
+
+
+def prompt_digest(prompt: str, metadata: Optional[str] = None) -> bytes:
+    """
+    Compute the fixed-width key of a serialized prompt and its metadata string
+
+    Each field is length-prefixed so that different (prompt, metadata) splits never hash the same input.
+
+    :param prompt: The serialized prompt
+    :type prompt: str
+    :param metadata: (optional) The metadata string, omitted from the digest if None
+    :type metadata: str
+    :return: The blake2b digest of the prompt and metadata
+    :rtype: bytes
+    """
+    digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    for field in (prompt,) if metadata is None else (prompt, metadata):
+        field = field.encode("utf-8")
+        digest.update(len(field).to_bytes(8, "little"))
+        digest.update(field)
+    return digest.digest()
+
 
 class SQLiteCache(Cache):
     """
     In-memory/local storage key-value store caching system using SQLite
 
-    The cache operates in memory and is periodically saved to disk.
+    By default the cache operates in memory and is periodically saved to disk.
+    With `disk_backed=True` the cache instead works directly on the cache file in WAL mode:
+    memory use stays flat regardless of the cache size and several processes can share one cache file.
+    Every `write` and `write_batch` call is committed in its own short transaction, so that no write lock
+    is held between calls; rows are grouped into fewer commits with `write_batch`, `buffered_write`
+    or a `transaction()` block.
 
-    The cache's main components are a 3-column table that contains:
+    The cache's main components are a table that contains:
+        - key: digest of the serialized prompt and metadata (primary key)
+        - prompt_key: digest of the serialized prompt alone (indexed)
         - prompt: the serialized prompt that was used to generate the response
         - metadata: the metadata associated with the prompt
-        - response: the serialized response generated by the prompt
+        - response: the response generated by the prompt, as a binary record (see `Response.to_bytes`)
+          or, for rows written by older versions, a JSON string
 
-    # TODO: Make response (de)serializable such that it fits in to the entries
+    The full prompt and metadata are kept alongside the digests and checked on every read,
+    so a digest collision can never return the wrong response.
+    Cache files created with older schema versions are migrated when they are opened.
     """
 
     def __init__(
         self,
         session_name: str = "prompt-session-0",
         cache_location: Optional[str] = None,
+        disk_backed: bool = False,
     ):
         """
         Initialize the SQLite-based cache
@@ -36,24 +73,172 @@ class SQLiteCache(Cache):
         :type session_name: str
         :param cache_location: (Optional) The location of the cache file
         :type cache_location: str
+        :param disk_backed: (Optional) Whether to operate directly on the cache file in WAL mode instead of an in-memory copy, defaults to False
+        :type disk_backed: bool
         """
 
         self.cache_location = cache_location or f".cache/{session_name}.sqlite3"
-        self.cache_db = sqlite3.connect(":memory:", check_same_thread=False)
+        self.disk_backed = disk_backed
+        self._connect()
+
+    def _connect(self):
+        """
+        Open the cache connection, either on an in-memory copy of the cache file or on the file itself
+        """
+        self._transaction_depth = 0
+        if self.disk_backed:
+            cache_dir = os.path.dirname(self.cache_location)
+            if cache_dir:
+                os.makedirs(cache_dir, exist_ok=True)
+            self.cache_db = sqlite3.connect(
+                self.cache_location, timeout=30.0, check_same_thread=False
+            )
+            self.cache_db.execute("PRAGMA journal_mode = WAL")
+            self.cache_db.execute("PRAGMA synchronous = NORMAL")
+        else:
+            self.cache_db = sqlite3.connect(":memory:", check_same_thread=False)
+
+            # check if cache exists
+            if os.path.exists(self.cache_location):
+                con = sqlite3.connect(self.cache_location)
+                con.backup(self.cache_db)
+                con.close()
+        self._init_schema()
+
+    def _commit(self):
+        """
+        Commit the current transaction, unless inside a `transaction()` block
+        """
+        if self._transaction_depth > 0:
+            return
+        self.cache_db.commit()
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Group all writes issued inside the block into a single SQLite transaction,
+        rolled back if the block raises.
+        In disk-backed mode, the block holds the write lock of the cache file from its first write on.
+        """
+        self._transaction_depth += 1
+        try:
+            yield
+        except Exception:
+            self._transaction_depth -= 1
+            if self._transaction_depth == 0:
+                self.cache_db.rollback()
+            raise
+        self._transaction_depth -= 1
+        if self._transaction_depth == 0:
+            self._commit()
+
+    def flush(self):
+        """
+        Write the buffered rows and commit all pending writes to the cache
+        """
+        if self._is_closed():
+            dropped = getattr(self, "_write_buffer_len", 0)
+            if dropped:
+                logger.warning(
+                    f"Dropped {dropped} buffered cache writes, the connection to {self.cache_location} is closed"
+                )
+                self._write_buffer = {}
+                self._write_buffer_len = 0
+            return
+        super().flush()
+        self._commit()
+
+    def _is_closed(self) -> bool:
+        """
+        Check whether the cache connection has been closed
 
-        # check if cache exists
-        if os.path.exists(self.cache_location):
-            con = sqlite3.connect(self.cache_location)
-            con.backup(self.cache_db)
-            con.close()
+        :return: True if the connection is closed
+        :rtype: bool
+        """
+        try:
+            self.cache_db.in_transaction
+        except sqlite3.ProgrammingError:
+            return True
+        return False
+
+    def checkpoint(self):
+        """
+        Make every write issued so far durable: commit in disk-backed mode,
+        otherwise copy the in-memory cache to the cache file (disk-backed mode is much cheaper for large jobs)
+        """
+        if self.disk_backed:
+            self.flush()
         else:
-            # create cache
+            self.save()
+
+    def _init_schema(self):
+        """
+        Create the cache table if it does not exist, or migrate it to the current schema version
+        """
+        version = self.cache_db.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+
+        # serialize concurrent initializations/migrations of a shared cache file
+        self.cache_db.execute("BEGIN IMMEDIATE")
+        version = self.cache_db.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            self.cache_db.commit()
+            return
+
+        legacy = self.cache_db.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'prompt_cache'"
+        ).fetchone()
+        if legacy:
+            logger.info(
+                f"Migrating cache {self.cache_location} to schema version {SCHEMA_VERSION}"
+            )
+            self.cache_db.execute("ALTER TABLE prompt_cache RENAME TO prompt_cache_v1")
+
+        self.cache_db.execute(
+            "CREATE TABLE prompt_cache (key blob PRIMARY KEY, prompt_key blob,"
+            + " prompt text, metadata text, response text);"
+        )
+        self.cache_db.execute(
+            "CREATE INDEX IF NOT EXISTS prompt_cache_prompt_key ON prompt_cache (prompt_key);"
+        )
+
+        if legacy:
+            self.cache_db.create_function(
+                "prompt_digest", -1, prompt_digest, deterministic=True
+            )
             self.cache_db.execute(
-                "CREATE TABLE prompt_cache (prompt text,"
-                + " metadata text, response text, "
-                + " PRIMARY KEY (prompt, metadata));"
+                "INSERT OR IGNORE INTO prompt_cache (key, prompt_key, prompt, metadata, response) "
+                + "SELECT prompt_digest(prompt, COALESCE(metadata, '{}')), prompt_digest(prompt), "
+                + "prompt, COALESCE(metadata, '{}'), response FROM prompt_cache_v1"
             )
-            self.cache_db.commit()
+            self.cache_db.execute("DROP TABLE prompt_cache_v1")
+
+        self.cache_db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.cache_db.commit()
+
+    @staticmethod
+    def _to_record(prompt: str, metadata: Optional[str], response: str) -> tuple:
+        """
+        Build a table row for the given prompt, metadata and response
+
+        :param prompt: The serialized prompt
+        :type prompt: str
+        :param metadata: (optional) The metadata string, defaults to empty metadata if None
+        :type metadata: str
+        :param response: The serialized response
+        :type response: str
+        :return: The row as (key, prompt_key, prompt, metadata, response)
+        :rtype: tuple
+        """
+        metadata = "{}" if metadata is None else metadata
+        return (
+            prompt_digest(prompt, metadata),
+            prompt_digest(prompt),
+            prompt,
+            metadata,
+            response,
+        )
 
     def write(self, prompt: str, response: str, metadata: Optional[str] = None):
         """
@@ -67,10 +252,11 @@ class SQLiteCache(Cache):
         :type metadata: str
         """
         self.cache_db.execute(
-            "INSERT INTO prompt_cache (prompt, metadata, response) VALUES (?, ?, ?)",
-            (prompt, metadata, response),
+            "INSERT OR REPLACE INTO prompt_cache (key, prompt_key, prompt, metadata, response) "
+            + "VALUES (?, ?, ?, ?, ?)",
+            self._to_record(prompt, metadata, response),
         )
-        self.cache_db.commit()
+        self._commit()
 
     def write_batch(
         self, prompts: List[str], responses: List[str], metadata: Optional[str] = None
@@ -85,15 +271,15 @@ class SQLiteCache(Cache):
         :param metadata: (optional) The metadata to write
         :type metadata: str
         """
-        if metadata is None:
-            metadata = ["{}"] * len(prompts)
-        else:
-            metadata = [metadata] * len(prompts)
         self.cache_db.executemany(
-            "INSERT INTO prompt_cache (prompt, metadata, response) VALUES (?, ?, ?)",
-            zip(prompts, metadata, responses),
+            "INSERT OR REPLACE INTO prompt_cache (key, prompt_key, prompt, metadata, response) "
+            + "VALUES (?, ?, ?, ?, ?)",
+            (
+                self._to_record(prompt, metadata, response)
+                for prompt, response in zip(prompts, responses)
+            ),
         )
-        self.cache_db.commit()
+        self._commit()
 
     def fetch_data(self, sql_suffix: str, *args: Any) -> List:
         """
@@ -103,12 +289,15 @@ class SQLiteCache(Cache):
         :type sql_suffix: str
         :param args: The args to use
         :type args: Any
-        :return: The fetched data records as List. Will return empty list if no records found
+        :return: The fetched data records as (prompt, metadata, response) tuples. Will return empty list if no records found
         :rtype: List
         """
-
+        # rows still in the write-behind buffer are written first so that they are found
+        self.flush()
         cursor = self.cache_db.cursor()
-        sqlite_select_query = """SELECT * from prompt_cache """ + sql_suffix
+        sqlite_select_query = (
+            """SELECT prompt, metadata, response from prompt_cache """ + sql_suffix
+        )
         cursor.execute(sqlite_select_query, *args)
         records = cursor.fetchall()
         cursor.close()
@@ -123,7 +312,9 @@ class SQLiteCache(Cache):
         :return: The records as a list
         :rtype: List
         """
-        return self.fetch_data(f"WHERE prompt = ?", prompt)
+        return self.fetch_data(
+            f"WHERE prompt_key = ? AND prompt = ?", (prompt_digest(prompt), prompt)
+        )
 
     def read_by_prompt_and_metadata(self, prompt: str, metadata: str) -> List:
         """
@@ -136,7 +327,10 @@ class SQLiteCache(Cache):
         :return: The records as a list
         :rtype: List
         """
-        return self.fetch_data(f"WHERE prompt = ? AND metadata = ?", (prompt, metadata))
+        return self.fetch_data(
+            f"WHERE key = ? AND prompt = ? AND metadata = ?",
+            (prompt_digest(prompt, metadata), prompt, metadata),
+        )
 
     def read_by_prompts_and_metadata(self, prompts: List[str], metadata: str) -> List:
         """
@@ -149,10 +343,12 @@ class SQLiteCache(Cache):
         :return: The records as a list
         :rtype: List
         """
-        return self.fetch_data(
-            f"WHERE prompt IN ({','.join('?' * len(prompts))}) AND metadata = ?",
-            (*prompts, metadata),
+        records = self.fetch_data(
+            f"WHERE key IN ({','.join('?' * len(prompts))}) AND metadata = ?",
+            (*(prompt_digest(prompt, metadata) for prompt in prompts), metadata),
         )
+        prompts = set(prompts)
+        return [record for record in records if record[0] in prompts]
 
     def read_by_metadata(self, metadata: str) -> List:
         """
@@ -163,7 +359,7 @@ class SQLiteCache(Cache):
         :return: The records as a list
         :rtype: List
         """
-        return self.fetch_data(f"WHERE metadata = ?", metadata)
+        return self.fetch_data(f"WHERE metadata = ?", (metadata,))
 
     def read(self, prompt: str, metadata: Optional[str] = None) -> List:
         """
@@ -186,31 +382,64 @@ class SQLiteCache(Cache):
         except IndexError:
             return None
 
-    def read_batch(self, prompts: List[str], metadata: Optional[str] = None) -> List:
+    def read_batch(
+        self, prompts: List[str], metadata: Optional[str] = None
+    ) -> List[Optional[str]]:
         """
         Read a batch of values from the cache by prompt
 
-        return responses, new_q_idx, _new_queries
-
-        TODO: Need to reimplement this to support unided responses
+        The prompt digests are loaded into a temporary lookup table and joined against the cache table
+        so that the whole batch is resolved in a single query.
 
         :param prompts: The prompts to read
         :type prompts: List[str]
         :param metadata: (optional) The metadata to read
         :type metadata: str
-        :return: The responses as a list
-        :rtype: List
+        :return: The responses aligned with the prompts, None for cache misses
+        :rtype: List[Optional[str]]
         """
-        records = self.read_by_prompts_and_metadata(prompts, metadata)
         responses = [None] * len(prompts)
-        new_q_idx = []
-        _new_queries = []
-        for i, record in enumerate(records):
-            responses[i] = record[2]
-            if responses[i] is None:
-                new_q_idx.append(i)
-                _new_queries.append(prompts[i])
-        return responses, new_q_idx, _new_queries
+        cursor = self.cache_db.cursor()
+        cursor.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS prompt_lookup "
+            + "(idx INTEGER PRIMARY KEY, key blob, prompt text)"
+        )
+        if metadata:
+            cursor.executemany(
+                "INSERT INTO prompt_lookup (idx, key, prompt) VALUES (?, ?, ?)",
+                (
+                    (idx, prompt_digest(prompt, metadata), prompt)
+                    for idx, prompt in enumerate(prompts)
+                ),
+            )
+            cursor.execute(
+                "SELECT prompt_lookup.idx, prompt_cache.response FROM prompt_lookup "
+                + "JOIN prompt_cache ON prompt_cache.key = prompt_lookup.key "
+                + "AND prompt_cache.prompt = prompt_lookup.prompt "
+                + "AND prompt_cache.metadata = ?",
+                (metadata,),
+            )
+        else:
+            cursor.executemany(
+                "INSERT INTO prompt_lookup (idx, key, prompt) VALUES (?, ?, ?)",
+                (
+                    (idx, prompt_digest(prompt), prompt)
+                    for idx, prompt in enumerate(prompts)
+                ),
+            )
+            cursor.execute(
+                "SELECT prompt_lookup.idx, prompt_cache.response FROM prompt_lookup "
+                + "JOIN prompt_cache ON prompt_cache.prompt_key = prompt_lookup.key "
+                + "AND prompt_cache.prompt = prompt_lookup.prompt"
+            )
+        for idx, response in cursor.fetchall():
+            if responses[idx] is None:
+                responses[idx] = response
+        cursor.execute("DELETE FROM prompt_lookup")
+        cursor.close()
+        # ends the read transaction so that writes from other processes become visible
+        self._commit()
+        return responses
 
     def to_pandas(self) -> pd.DataFrame:
         """
@@ -219,15 +448,26 @@ class SQLiteCache(Cache):
         :return: The cache db as a pandas dataframe
         :rtype: pd.DataFrame
         """
-        return pd.read_sql_query("SELECT * FROM prompt_cache", self.cache_db)
+        self.flush()
+        return pd.read_sql_query(
+            "SELECT prompt, metadata, response FROM prompt_cache", self.cache_db
+        )
 
     def save(self, path: Optional[str] = None):
         """
         Save the cache to a file
 
+        In disk-backed mode, pending writes are committed and the cache is only copied if a different path is given.
+
         :param path: (optional) The path to save the cache to. If not provided, will save to the path provided at initialization
         :type path: str
         """
+        self.flush()
+        if self.disk_backed:
+            if path is None or os.path.abspath(path) == os.path.abspath(
+                self.cache_location
+            ):
+                return
         self.cache_db.backup(sqlite3.connect(path or self.cache_location))
 
     def load(self, path: Optional[str] = None):
@@ -237,11 +477,11 @@ class SQLiteCache(Cache):
         :param path: (optional) The path to load the cache from. If not provided, will load from the path provided at initialization
         :type path: str
         """
-        if path is not None: self.cache_location = path
-        self.cache_db = sqlite3.connect(":memory:", check_same_thread=False)
-        if os.path.exists(self.cache_location):
-            con = sqlite3.connect(self.cache_location)
-            con.backup(self.cache_db)
-            con.close()
-        else:
+        self.flush()
+        if self.disk_backed:
+            self.cache_db.close()
+        if path is not None:
+            self.cache_location = path
+        if not os.path.exists(self.cache_location):
             logger.warning("Cache file does not exist")
+        self._connect()
@@ -2,6 +2,7 @@ import logging
 from typing import Any, List, Optional, Union, Dict, Tuple
 
 import numpy as np
+import pyarrow
 import torch
 from grpc import FutureTimeoutError
 
@@ -36,6 +37,7 @@ class Client:
         ssh_pk: str = "~/.ssh/id_rsa",
         ssh_node: Optional[str] = None,
         cache: Optional[Cache] = None,
+        checkpoint_size: Optional[int] = None,
         **kwargs: Any,
     ):
         """
@@ -56,6 +58,8 @@ class Client:
         :type ssh_node: str
         :param cache: (optional) The cache to use. (e.g. "SQLite", "Dummy")
         :type cache: Cache Object
+        :param checkpoint_size: (optional) Run queries as a resumable job that checkpoints every `checkpoint_size` queries into the cache (requires a cache)
+        :type checkpoint_size: int
         :param kwargs: Additional keyword arguments
         :type kwargs: Any
         """
@@ -98,7 +102,12 @@ class Client:
                 self.cache = SQLiteCache()
             elif cache == "Dummy":
                 self.cache = DummyCache()
-            self.run = self.cache.cached_query(self.run)
+            else:
+                self.cache = cache
+            if checkpoint_size:
+                self.run = self.cache.resumable_query(self.run, checkpoint_size)
+            else:
+                self.run = self.cache.cached_query(self.run)
 
         self.grpcClient = None
         if end_point and model_type not in ["dummy", "openllm", "ollama",]:
@@ -271,6 +280,8 @@ class Client:
         :return: The response(s) from the model.
         :rtype: Union[Response, List[Response]]
         """
+        if isinstance(queries, (pyarrow.Array, pyarrow.ChunkedArray)):
+            queries = queries.to_pylist()
         single_query = False
         if (
             isinstance(queries, str)
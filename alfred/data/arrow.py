@@ -1,5 +1,6 @@
-from typing import Union, Optional, Dict, Tuple, Iterable, Any, List
+from typing import Union, Optional, Dict, Tuple, Iterable, Any, List, Sequence
 
+import numpy as np
 import pandas
 import pyarrow
 from datasets.info import DatasetInfo
@@ -26,6 +27,7 @@ class IterableArrowDataset(Dataset):
     - version(): Return the version of the dataset.
     - __len__(): Return the number of rows in the dataset.
     - __getitem__(uid): Return the row with the given unique identifier.
+    - take(indices): Return the rows at the given indices.
     - itercolumns(*args, **kwargs): Iterate over all columns in their numerical order.
     - __iter__(): Iterate over the rows of the dataset, yielding a dictionary for each row.
     - save_to_disk(path: str): Save the dataset to disk at the specified path.
@@ -58,6 +60,10 @@ class IterableArrowDataset(Dataset):
         self._split = split
         self._info = info or DatasetInfo()
         self._split = split
+        # zero-copy record batches of the table and the row offset of each of them,
+        # built on the first random access
+        self._batches = None
+        self._offsets = None
 
     @staticmethod
     def pyarrow_typer(data: Any) -> pyarrow.DataType:
@@ -103,7 +109,7 @@ class IterableArrowDataset(Dataset):
         :return: The schema of the table and its columns.
         :rtype: pyarrow.Schema
         """
-        return self.table.schema
+        return self._data.schema
 
     @property
     def columns(self) -> List[pyarrow.ChunkedArray]:
@@ -113,7 +119,7 @@ class IterableArrowDataset(Dataset):
         :return: A list of all columns in numerical order.
         :rtype: List[pyarrow.ChunkedArray]
         """
-        return self.table.columns
+        return self._data.columns
 
     def data(self) -> Union[pyarrow.Table, pandas.DataFrame]:
         """
@@ -144,29 +150,91 @@ class IterableArrowDataset(Dataset):
         """returns the number of rows in the dataset"""
         return self.num_rows
 
-    def __getitem__(self, uid: int, **kawrgs: Any) -> Dict[str, Any]:
+    def _locate(self, indices: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Locate rows in the chunk-offset index: a binary search over the record batch offsets,
+        i.e. O(log chunks) per row.
+
+        :param indices: The row indices, negative indices count from the end.
+        :type indices: np.ndarray
+        :return: The record batch of each row and the row index within its batch.
+        :rtype: Tuple[np.ndarray, np.ndarray]
+        """
+        if self._offsets is None:
+            self._batches = self._data.to_batches()
+            self._offsets = np.cumsum(
+                [0] + [batch.num_rows for batch in self._batches], dtype=np.int64
+            )
+        indices = np.where(indices < 0, indices + self.num_rows, indices)
+        if indices.size > 0 and (indices.min() < 0 or indices.max() >= self.num_rows):
+            raise IndexError(f"Index out of range for {self.num_rows} rows")
+        batch_ids = np.searchsorted(self._offsets, indices, side="right") - 1
+        return batch_ids, indices - self._offsets[batch_ids]
+
+    def take(self, indices: Sequence[int]) -> List[Dict[str, Any]]:
+        """
+        Return the rows at the given indices, in the given order.
+        Rows are gathered batch by batch from the chunk-offset index, only the requested rows are materialized.
+
+        :param indices: The row indices.
+        :type indices: Sequence[int]
+        :return: The rows as dictionaries.
+        :rtype: List[Dict[str, Any]]
+        """
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+        batch_ids, local_indices = self._locate(indices)
+        rows = [None] * len(indices)
+        order = np.argsort(batch_ids, kind="stable")
+        bounds = np.flatnonzero(np.diff(batch_ids[order])) + 1
+        for group in np.split(order, bounds):
+            if len(group) == 0:
+                continue
+            batch = self._batches[batch_ids[group[0]]]
+            for position, row in zip(
+                group, batch.take(pyarrow.array(local_indices[group])).to_pylist()
+            ):
+                rows[position] = row
+        return rows
+
+    def __getitem__(
+        self, uid: Union[int, slice, Sequence[int]], **kawrgs: Any
+    ) -> Union[Dict[str, Any], List[Dict[str, Any]], "IterableArrowDataset"]:
         """
         Return the row with the given unique identifier.
 
-        :param uid: The unique identifier of the row to return.
-        :type uid: int or slice
+        :param uid: The unique identifier of the row to return, a slice or a sequence of indices.
+        :type uid: int or slice or Sequence[int]
         :param kawrgs: Additional keyword arguments.
         :type kawrgs: Any
-        :return: The row with the given unique identifier.
-        :rtype: Dict[str, Any]
+        :return: The row with the given unique identifier, a (zero-copy) dataset for a slice,
+                 or a list of rows for a sequence of indices.
+        :rtype: Union[Dict[str, Any], List[Dict[str, Any]], IterableArrowDataset]
         """
-        return self._data.to_pandas().iloc[uid]
+        if isinstance(uid, slice):
+            start, stop, step = uid.indices(self.num_rows)
+            if step == 1:
+                return IterableArrowDataset(
+                    self._data.slice(start, max(stop - start, 0)),
+                    info=self._info,
+                    split=self._split,
+                )
+            uid = range(start, stop, step)
+        if not isinstance(uid, (int, np.integer)):
+            return self.take(uid)
+        return self._getitem(uid)
 
     def _getitem(self, uid: int) -> Dict[str, Any]:
         """
         Return the row with the given unique identifier.
 
         :param uid: The unique identifier of the row to return.
-        :type uid: int or slice
+        :type uid: int
         :return: The row with the given unique identifier.
         :rtype: Dict[str, Any]
         """
-        return self._data.to_pandas().iloc[uid]
+        batch_ids, local_indices = self._locate(np.array([uid], dtype=np.int64))
+        batch = self._batches[batch_ids[0]]
+        return batch.slice(int(local_indices[0]), 1).to_pylist()[0]
 
     def itercolumns(self, *args: Any, **kwargs: Any) -> Iterable:
         """
@@ -205,17 +273,21 @@ class IterableArrowDataset(Dataset):
 
 class BufferedArrowDataset(Dataset):
     """
-    This class represents a dataset stored in a pyarrow buffer.
+    This class represents a dataset stored in a pyarrow buffer or an Arrow IPC/Feather file.
     It provides methods for accessing and iterating over the data,
     as well as for saving and loading the dataset to and from disk.
 
     This will be very useful for datasets that are too large to fit into memory.
+    Files are opened with `pyarrow.memory_map`, so the table references the mapped pages instead of
+    copying them, row access and slices are zero-copy `Table.slice`s, and column projection
+    (`columns=` or `select`) makes sure the other columns are never touched.
 
     Properties:
 
     - shape (Tuple[int, int]): The shape of the dataset (number of rows and columns).
     - num_rows (int): The number of rows in the dataset.
     - num_cols (int): The number of columns in the dataset.
+    - column_names (List[str]): The names of the columns.
 
     Methods:
 
@@ -223,39 +295,68 @@ class BufferedArrowDataset(Dataset):
     - info(): Return the metadata about the dataset.
     - split(): Return the information about how the dataset has been split.
     - version(): Return the version of the dataset.
+    - select(columns): Return a dataset with only the given columns.
     - __len__(): Return the number of rows in the dataset.
-    - __getitem__(uid): Return the row with the given unique identifier.
+    - __getitem__(uid): Return the row with the given unique identifier, or a dataset for a slice.
     - __iter__(): Iterate over the rows of the dataset, yielding a dictionary for each row.
-    - save_to_disk(path: str): Save the dataset to disk at the specified path.
-    - load_from_disk(path: str): Load the dataset from disk from the specified path.
+    - save_to_disk(path: str): Save the dataset to disk at the specified path in the Arrow IPC file format.
+    - load_from_disk(path: str): Load (memory-map) the dataset from an Arrow IPC file at the specified path.
     """
 
     def __init__(
         self,
-        buffer: pyarrow.Buffer,
+        buffer: Union[pyarrow.Buffer, pyarrow.Table, str],
         info: Optional[DatasetInfo] = None,
         split: Optional[Union[str, NamedSplit]] = None,
+        columns: Optional[List[str]] = None,
     ):
         """
         Initializes a  BufferedArrowDataset class.
 
-        :param buffer: The pyarrow buffer containing the dataset.
-        :type buffer: pyarrow.Buffer
+        :param buffer: The pyarrow buffer containing the dataset (IPC stream or file format),
+                       the path to an Arrow IPC/Feather file to memory-map, or a pyarrow Table.
+        :type buffer: Union[pyarrow.Buffer, pyarrow.Table, str]
         :param info: The metadata about the dataset.
         :type info: Optional[DatasetInfo]
         :param split: The information about how the dataset has been split.
         :type split: Optional[Union[str, NamedSplit]]
+        :param columns: (optional) only expose these columns (projection)
+        :type columns: Optional[List[str]]
         """
-        self._stream = pyarrow.BufferReader(buffer)
-        o_stream = pyarrow.ipc.open_stream(self._stream)
-        self._data = o_stream.read_all()
+        if isinstance(buffer, pyarrow.Table):
+            self._data = buffer
+        else:
+            self._data = self._read_ipc(
+                pyarrow.memory_map(buffer, "r")
+                if isinstance(buffer, str)
+                else pyarrow.BufferReader(buffer)
+            )
+        if columns is not None:
+            self._data = self._data.select(columns)
         self._info = info or DatasetInfo()
         self._split = split
 
+    @staticmethod
+    def _read_ipc(source: pyarrow.NativeFile) -> pyarrow.Table:
+        """
+        Read an Arrow IPC file (or Feather v2), falling back to the IPC stream format.
+        Reading from a memory map or a buffer is zero-copy.
+
+        :param source: The memory-mapped file or buffer reader.
+        :type source: pyarrow.NativeFile
+        :return: The table.
+        :rtype: pyarrow.Table
+        """
+        try:
+            return pyarrow.ipc.open_file(source).read_all()
+        except pyarrow.ArrowInvalid:
+            source.seek(0)
+            return pyarrow.ipc.open_stream(source).read_all()
+
     @property
     def shape(self) -> Tuple[int, int]:
         """returns the shape of the dataset (number of rows and columns)"""
-        return (self.num_rows, self.num_columns)
+        return (self.num_rows, self.num_cols)
 
     @property
     def num_rows(self) -> int:
@@ -267,6 +368,11 @@ class BufferedArrowDataset(Dataset):
         """returns the number of columns in the dataset"""
         return len(self._data.columns)
 
+    @property
+    def column_names(self) -> List[str]:
+        """returns the names of the columns"""
+        return self._data.column_names
+
     def data(self):
         """returns the underlying pyarrow Table"""
         return self._data
@@ -291,18 +397,45 @@ class BufferedArrowDataset(Dataset):
         """returns the number of rows in the dataset"""
         return self.num_rows
 
-    def __getitem__(self, uid: int, **kawrgs: Any) -> Dict[str, Any]:
+    def select(self, columns: List[str]) -> "BufferedArrowDataset":
+        """
+        Project the dataset on the given columns without copying, e.g. the keywords of a template.
+
+        :param columns: The names of the columns to keep.
+        :type columns: List[str]
+        :return: The projected dataset.
+        :rtype: BufferedArrowDataset
         """
-        Retuns the row with the given unique identifier.
+        return BufferedArrowDataset(self._data, self._info, self._split, columns)
+
+    def __getitem__(
+        self, uid: Union[int, slice], **kawrgs: Any
+    ) -> Union[Dict[str, Any], "BufferedArrowDataset"]:
+        """
+        Retuns the row with the given unique identifier, or a dataset of the rows for a slice.
+        Both are zero-copy slices of the underlying table, only the returned row is materialized.
 
         :param uid: The unique identifier of the row to return.
         :type uid: int or slice
         :param kawrgs: Additional keyword arguments.
         :type kawrgs: Any
         :return: The row with the given unique identifier.
-        :rtype: Dict[str, Any]
+        :rtype: Union[Dict[str, Any], BufferedArrowDataset]
         """
-        return self._dataset[uid]
+        if isinstance(uid, slice):
+            start, stop, step = uid.indices(self.num_rows)
+            if step == 1:
+                table = self._data.slice(start, max(stop - start, 0))
+            else:
+                table = self._data.take(
+                    pyarrow.array(range(start, stop, step), type=pyarrow.int64())
+                )
+            return BufferedArrowDataset(table, self._info, self._split)
+        if uid < 0:
+            uid += self.num_rows
+        if not 0 <= uid < self.num_rows:
+            raise IndexError(f"Index {uid} out of range for {self.num_rows} rows")
+        return self._data.slice(uid, 1).to_pylist()[0]
 
     def __iter__(self) -> Iterable:
         """
@@ -317,12 +450,29 @@ class BufferedArrowDataset(Dataset):
 
     def __repr__(self):
         """returns a string representation of the dataset"""
-        return f"{self.__class__.__name__}(dataset={self._dataset})"
+        return f"{self.__class__.__name__}(shape={self.shape}, columns={self.column_names})"
 
     def save_to_disk(self, path: str):
-        """saves the dataset to disk at the specified path"""
-        pass
+        """
+        Saves the dataset to disk at the specified path in the Arrow IPC file format,
+        record batch by record batch so that memory-mapped datasets larger than memory can be written.
+
+        :param path: The path of the file to write.
+        :type path: str
+        """
+        with pyarrow.OSFile(path, "wb") as sink:
+            with pyarrow.ipc.new_file(sink, self._data.schema) as writer:
+                for batch in self._data.to_batches():
+                    writer.write_batch(batch)
 
     def load_from_disk(self, path: str):
-        """loads the dataset from disk from the specified path"""
-        pass
+        """
+        Loads the dataset from an Arrow IPC/Feather file at the specified path by memory-mapping it.
+
+        :param path: The path of the file to load.
+        :type path: str
+        :return: The dataset.
+        :rtype: BufferedArrowDataset
+        """
+        self._data = self._read_ipc(pyarrow.memory_map(path, "r"))
+        return self
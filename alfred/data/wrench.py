@@ -4,10 +4,14 @@ Wrench Dataset Class is a dataset wrapper for Wrench, a weak supervision benchma
 
 """
 
+import hashlib
 import json
 import logging
 import os
-from typing import Optional
+import uuid
+from functools import cached_property
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
 
 import pyarrow
 from datasets.info import DatasetInfo
@@ -16,6 +20,10 @@ from .arrow import IterableArrowDataset
 
 logger = logging.getLogger(__name__)
 
+# version of the Arrow cache files written by `WrenchBenchmarkDataset._convert`,
+# to be bumped whenever the conversion changes so that stale caches are not served
+ARROW_CACHE_VERSION = 1
+
 try:
     from wrench.dataset import get_data_home, get_dataset_type
 
@@ -27,6 +35,74 @@ except ModuleNotFoundError:
     WRENCH_AVAILABLE = False
 
 
+def iter_json_items(path: str, chunk_size: int = 1 << 20) -> Iterator[Tuple[str, Any]]:
+    """
+    Incrementally parse the (key, value) items of a JSON file holding one top-level object,
+    reading the file chunk by chunk so that only one item is decoded in memory at a time.
+
+    :param path: The path of the JSON file.
+    :type path: str
+    :param chunk_size: (optional) The number of characters read at once, defaults to 1M
+    :type chunk_size: int
+    :return: An iterator over the items of the top-level object.
+    :rtype: Iterator[Tuple[str, Any]]
+    """
+    decoder = json.JSONDecoder()
+    with open(path, encoding="utf-8") as f:
+        buffer, pos = "", 0
+
+        def _read() -> bool:
+            nonlocal buffer, pos
+            chunk = f.read(chunk_size)
+            buffer, pos = buffer[pos:] + chunk, 0
+            return len(chunk) > 0
+
+        def _peek() -> str:
+            nonlocal pos
+            while True:
+                while pos < len(buffer) and buffer[pos] in " \t\n\r":
+                    pos += 1
+                if pos < len(buffer):
+                    return buffer[pos]
+                if not _read():
+                    raise ValueError(f"Unexpected end of JSON file {path}")
+
+        def _decode() -> Any:
+            nonlocal pos
+            _peek()
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buffer, pos)
+                    # a number at the end of the buffer may continue in the next chunk
+                    if end < len(buffer) or isinstance(value, (dict, list, str)):
+                        pos = end
+                        return value
+                except json.JSONDecodeError:
+                    pass
+                if not _read():
+                    value, pos = decoder.raw_decode(buffer, pos)
+                    return value
+
+        def _expect(char: str):
+            nonlocal pos
+            if _peek() != char:
+                raise ValueError(
+                    f"Expected '{char}' in JSON file {path}, got '{_peek()}'"
+                )
+            pos += 1
+
+        _expect("{")
+        if _peek() == "}":
+            return
+        while True:
+            key = _decode()
+            _expect(":")
+            yield key, _decode()
+            if _peek() == "}":
+                return
+            _expect(",")
+
+
 class WrenchBenchmarkDataset(IterableArrowDataset):
     """
     Dataset wrapper for Wrench Dataset.
@@ -46,11 +122,22 @@ class WrenchBenchmarkDataset(IterableArrowDataset):
     """
 
     def __init__(
-        self, dataset_name: str, split: str = "train", local_path: Optional[str] = None
+        self,
+        dataset_name: str,
+        split: str = "train",
+        local_path: Optional[str] = None,
+        cache_dir: Optional[str] = None,
+        use_cache: bool = True,
+        batch_size: int = 8192,
     ):
         """
         Initialize the Wrench Dataset class.
 
+        The split file is parsed incrementally into Arrow record batches, which are written to an
+        Arrow IPC cache file keyed by the split file's path, size and modification time and by the
+        cache format version. Later loads of an unchanged split memory-map the cache instead of
+        parsing the JSON again, and writing a new cache removes the stale caches of the same file.
+
         :param dataset_name: The name of the dataset to load.
         :type dataset_name: str
         :param split: The split to load, defaults to "train"
@@ -59,6 +146,12 @@ class WrenchBenchmarkDataset(IterableArrowDataset):
                             If the wrench dataset is installed as a package then
                             it is totally fine to leave it as None.
         :type local_path: str
+        :param cache_dir: (Optional) The directory of the Arrow cache, defaults to ~/.cache/alfred/wrench
+        :type cache_dir: str
+        :param use_cache: (Optional) Whether to read and write the Arrow cache, defaults to True
+        :type use_cache: bool
+        :param batch_size: (Optional) The number of instances per Arrow record batch, defaults to 8192
+        :type batch_size: int
         """
 
         if split not in ["train", "valid", "test"]:
@@ -79,60 +172,182 @@ class WrenchBenchmarkDataset(IterableArrowDataset):
                     "local_path must be specified if wrench is not installed."
                 )
 
-        try:
-            with open(os.path.join(local_path, dataset_name, split + ".json")) as f:
-                raw_data = json.load(f)
-        except FileNotFoundError:
+        json_path = os.path.join(local_path, dataset_name, split + ".json")
+        if not os.path.exists(json_path):
             warn_msg = f"No {split} data found under {local_path} for {dataset_name}."
             logger.warning(warn_msg)
             if WRENCH_AVAILABLE:
                 warn_msg += "\nPlease check if you have downloaded the dataset. You can download wrench datasets from https://drive.google.com/drive/folders/1v55IKG2JN9fMtKJWU48B_5_DcPWGnpTq"
             raise FileNotFoundError(warn_msg)
 
-        self.uid2label = {}
-        self.labels = []
-        # Strong assumption: every data has the same fields!!!
-        _inst = list(raw_data.values())[0]["data"]
+        if use_cache:
+            stat = os.stat(json_path)
+            cache_dir = cache_dir or os.path.join(
+                Path.home(), ".cache", "alfred", "wrench"
+            )
+            path_hash = hashlib.blake2b(
+                os.path.abspath(json_path).encode("utf-8"), digest_size=4
+            ).hexdigest()
+            cache_prefix = f"{dataset_name}_{split}_{path_hash}_"
+            cache_path = os.path.join(
+                cache_dir,
+                f"{cache_prefix}v{ARROW_CACHE_VERSION}_{stat.st_size}_{stat.st_mtime_ns}.arrow",
+            )
+            if not os.path.exists(cache_path):
+                os.makedirs(cache_dir, exist_ok=True)
+                # write to a temporary file first so that a partial cache is never picked up
+                tmp_path = f"{cache_path}.{uuid.uuid4().hex}.tmp"
+                try:
+                    with pyarrow.OSFile(tmp_path, "wb") as sink:
+                        self._convert(json_path, sink, batch_size)
+                    os.replace(tmp_path, cache_path)
+                finally:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                self._remove_stale_caches(cache_dir, cache_prefix, cache_path)
+            else:
+                logger.info(f"Loading cached wrench dataset from {cache_path}")
+            _data = pyarrow.ipc.open_file(
+                pyarrow.memory_map(cache_path, "r")
+            ).read_all()
+        else:
+            sink = pyarrow.BufferOutputStream()
+            self._convert(json_path, sink, batch_size)
+            _data = pyarrow.ipc.open_file(sink.getvalue()).read_all()
+
         self.valid_field = {
-            key: self.pyarrow_typer(value)
-            for key, value in _inst.items()
-            if type(value) in [str, int, float]
+            field.name: field.type
+            for field in _data.schema
+            if field.name not in ["uid", "label"]
         }
-        self.uid2idx = {}
-        self.data_list = []
-        for idx, (uid, inst) in enumerate(raw_data.items()):
-            lean_data = {key: inst["data"][key] for key in self.valid_field.keys()}
-            lean_data = {**{"uid": uid}, **lean_data, **{"label": inst["label"]}}
-            self.data_list.append(lean_data)
-
-            self.uid2label[uid] = inst["label"]
-            self.labels.append(inst["label"])
-            self.uid2idx[uid] = idx
-
-        self.uids = list(self.uid2label.keys())
 
         info = DatasetInfo(
             description=f"Wrench Dataset: {dataset_name}, {split} split",
             version="0.0.0",
         )
 
-        schema = pyarrow.schema(
-            {
-                **{"uid": self.pyarrow_typer(self.uids[0])},
-                **self.valid_field,
-                **{"label": self.pyarrow_typer(self.uid2label[self.uids[0]])},
-            }
-        )
-
-        _data = pyarrow.Table.from_pylist(self.data_list, schema=schema)
-
         self.dataset_name = dataset_name
 
         super().__init__(_data, info=info, split=split)
 
+    @staticmethod
+    def _remove_stale_caches(cache_dir: str, cache_prefix: str, cache_path: str):
+        """
+        Remove the Arrow caches of older versions of a split file, or written by older cache versions
+
+        :param cache_dir: The directory of the Arrow cache.
+        :type cache_dir: str
+        :param cache_prefix: The file name prefix of the caches of the split file.
+        :type cache_prefix: str
+        :param cache_path: The path of the current cache, which is kept.
+        :type cache_path: str
+        """
+        for file_name in os.listdir(cache_dir):
+            path = os.path.join(cache_dir, file_name)
+            if (
+                file_name.startswith(cache_prefix)
+                and file_name.endswith(".arrow")
+                and path != cache_path
+            ):
+                try:
+                    os.remove(path)
+                    logger.info(f"Removed stale wrench cache {path}")
+                except OSError as e:
+                    logger.warning(f"Could not remove stale wrench cache {path}: {e}")
+
+    @classmethod
+    def _convert(cls, json_path: str, sink: pyarrow.NativeFile, batch_size: int):
+        """
+        Stream a WRENCH split file into Arrow record batches written to an IPC file,
+        keeping the uid, the str/int/float data fields (as found in the first instance) and the label
+
+        :param json_path: The path of the split file.
+        :type json_path: str
+        :param sink: The sink to write the IPC file to.
+        :type sink: pyarrow.NativeFile
+        :param batch_size: The number of instances per record batch.
+        :type batch_size: int
+        """
+        writer, schema, columns = None, None, None
+
+        def _flush():
+            writer.write_batch(
+                pyarrow.record_batch(
+                    [columns[name] for name in schema.names], schema=schema
+                )
+            )
+            for column in columns.values():
+                column.clear()
+
+        for uid, inst in iter_json_items(json_path):
+            if writer is None:
+                # Strong assumption: every data has the same fields!!!
+                schema = pyarrow.schema(
+                    {
+                        "uid": cls.pyarrow_typer(uid),
+                        **{
+                            key: cls.pyarrow_typer(value)
+                            for key, value in inst["data"].items()
+                            if type(value) in [str, int, float]
+                        },
+                        "label": cls.pyarrow_typer(inst["label"]),
+                    }
+                )
+                columns = {name: [] for name in schema.names}
+                writer = pyarrow.ipc.new_file(sink, schema)
+            columns["uid"].append(uid)
+            for name in schema.names[1:-1]:
+                columns[name].append(inst["data"][name])
+            columns["label"].append(inst["label"])
+            if len(columns["uid"]) == batch_size:
+                _flush()
+
+        if writer is None:
+            raise ValueError(f"No instance found in {json_path}")
+        if len(columns["uid"]) > 0:
+            _flush()
+        writer.close()
+
+    @cached_property
+    def uids(self) -> List[str]:
+        """returns the uids of the instances"""
+        return self._data["uid"].to_pylist()
+
+    @cached_property
+    def labels(self) -> List[Any]:
+        """returns the labels of the instances"""
+        return self._data["label"].to_pylist()
+
+    @cached_property
+    def uid2idx(self) -> Dict[str, int]:
+        """returns the mapping from uid to row index"""
+        return {uid: idx for idx, uid in enumerate(self.uids)}
+
+    @cached_property
+    def uid2label(self) -> Dict[str, Any]:
+        """returns the mapping from uid to label"""
+        return dict(zip(self.uids, self.labels))
+
+    def take_uids(self, uids: Sequence[str]) -> List[Dict[str, Any]]:
+        """
+        Return the data instances with the given uids, in the given order
+
+        :param uids: The uids of the instances.
+        :type uids: Sequence[str]
+        :return: The data instances as dictionaries.
+        :rtype: List[Dict[str, Any]]
+        """
+        return self.take([self.uid2idx[uid] for uid in uids])
+
     def __getattr__(self, uid):
         """returns the data instance with the given uid"""
-        return self.data_list[self.uid2idx[uid]]
+        # only reached for missing attributes, private ones are not uids
+        if uid.startswith("_") or "_data" not in self.__dict__:
+            raise AttributeError(uid)
+        try:
+            return self._getitem(self.uid2idx[uid])
+        except KeyError:
+            raise AttributeError(uid)
 
     def __repr__(self):
         """returns the string representation of the dataset"""
@@ -22,6 +22,8 @@ class AI21Model(APIAccessFoundationModel):
     This class provides a wrapper for the OpenAI API for generating completions.
     """
 
+    max_concurrency = 4
+
     def _ai21_query(
         self,
         query_string: str,
@@ -102,16 +104,10 @@ class AI21Model(APIAccessFoundationModel):
         :return: A list of `CompletionResponse` objects containing the generated completions.
         :rtype: List[CompletionResponse]
         """
-        output = []
-        for query in batch_instance:
-            output.append(
-                CompletionResponse(
-                    prediction=self._ai21_query(
-                        query, model=self.model_string, **kwargs
-                    )
-                )
-            )
-        return output
+        predictions = self._concurrent_map(
+            self._ai21_query, batch_instance, model=self.model_string, **kwargs
+        )
+        return [CompletionResponse(prediction=prediction) for prediction in predictions]
 
     def _score_batch(
         self,
@@ -127,20 +123,15 @@ class AI21Model(APIAccessFoundationModel):
         :param scoring_instruction: The instruction prompt for scoring
         :type scoring_instruction: str
         """
-        output = []
-        for query in batch_instance:
-            _scoring_prompt = (
-                scoring_instruction.replace(
-                    "[[label_space]]", ",".join(query.candidates)
-                )
-                + query.prompt
-            )
-            output.append(
-                RankedResponse(
-                    prediction=self._ai21_query(
-                        _scoring_prompt, model=self.model_string, **kwargs
-                    ),
-                    scores={},
-                )
-            )
-        return output
+        scoring_prompts = [
+            scoring_instruction.replace("[[label_space]]", ",".join(query.candidates))
+            + query.prompt
+            for query in batch_instance
+        ]
+        predictions = self._concurrent_map(
+            self._ai21_query, scoring_prompts, model=self.model_string, **kwargs
+        )
+        return [
+            RankedResponse(prediction=prediction, scores={})
+            for prediction in predictions
+        ]
@@ -47,6 +47,8 @@ class AnthropicModel(APIAccessFoundationModel):
     This class provides a wrapper for the anthropic API for generating completions.
     """
 
+    max_concurrency = 8
+
     def _anthropic_query(
         self,
         query: Union[str, List],
@@ -164,16 +166,10 @@ class AnthropicModel(APIAccessFoundationModel):
         :return: A list of `CompletionResponse` objects containing the generated completions.
         :rtype: List[CompletionResponse]
         """
-        output = []
-        for query in batch_instance:
-            output.append(
-                CompletionResponse(
-                    prediction=self._anthropic_query(
-                        query, model=self.model_string, **kwargs
-                    )
-                )
-            )
-        return output
+        predictions = self._concurrent_map(
+            self._anthropic_query, batch_instance, model=self.model_string, **kwargs
+        )
+        return [CompletionResponse(prediction=prediction) for prediction in predictions]
 
     def _score_batch(
         self,
@@ -189,23 +185,18 @@ class AnthropicModel(APIAccessFoundationModel):
         :param scoring_instruction: The instruction prompt for scoring
         :type scoring_instruction: str
         """
-        output = []
-        for query in batch_instance:
-            _scoring_prompt = (
-                scoring_instruction.replace(
-                    "[[label_space]]", ",".join(query.candidates)
-                )
-                + query.prompt
-            )
-            output.append(
-                RankedResponse(
-                    prediction=self._anthropic_query(
-                        _scoring_prompt, model=self.model_string, **kwargs
-                    ),
-                    scores={},
-                )
-            )
-        return output
+        scoring_prompts = [
+            scoring_instruction.replace("[[label_space]]", ",".join(query.candidates))
+            + query.prompt
+            for query in batch_instance
+        ]
+        predictions = self._concurrent_map(
+            self._anthropic_query, scoring_prompts, model=self.model_string, **kwargs
+        )
+        return [
+            RankedResponse(prediction=prediction, scores={})
+            for prediction in predictions
+        ]
 
     def chat(self, **kwargs: Any):
         """
@@ -16,6 +16,8 @@ class CohereModel(APIAccessFoundationModel):
     This class provides a wrapper for the OpenAI API for generating completions.
     """
 
+    max_concurrency = 8
+
     def _cohere_query(
         self,
         query_string: str,
@@ -61,23 +63,18 @@ class CohereModel(APIAccessFoundationModel):
         :param scoring_instruction: The instruction prompt for scoring
         :type scoring_instruction: str
         """
-        output = []
-        for query in batch_instance:
-            _scoring_prompt = (
-                scoring_instruction.replace(
-                    "[[label_space]]", ",".join(query.candidates)
-                )
-                + query.prompt
-            )
-            output.append(
-                RankedResponse(
-                    prediction=self._cohere_query(
-                        _scoring_prompt, model=self.model_string, **kwargs
-                    ),
-                    scores={},
-                )
-            )
-        return output
+        scoring_prompts = [
+            scoring_instruction.replace("[[label_space]]", ",".join(query.candidates))
+            + query.prompt
+            for query in batch_instance
+        ]
+        predictions = self._concurrent_map(
+            self._cohere_query, scoring_prompts, model=self.model_string, **kwargs
+        )
+        return [
+            RankedResponse(prediction=prediction, scores={})
+            for prediction in predictions
+        ]
 
     def _cohere_embedding_query(
         self,
@@ -139,16 +136,10 @@ class CohereModel(APIAccessFoundationModel):
         :return: A list of `CompletionResponse` objects containing the generated completions.
         :rtype: List[CompletionResponse]
         """
-        output = []
-        for query in batch_instance:
-            output.append(
-                CompletionResponse(
-                    prediction=self._cohere_query(
-                        query, model=self.model_string, **kwargs
-                    )
-                )
-            )
-        return output
+        predictions = self._concurrent_map(
+            self._cohere_query, batch_instance, model=self.model_string, **kwargs
+        )
+        return [CompletionResponse(prediction=prediction) for prediction in predictions]
 
     def _encode_batch(
         self,
@@ -168,7 +159,4 @@ class CohereModel(APIAccessFoundationModel):
         :return: A list of `torch.Tensor` objects containing the generated embeddings.
         :rtype: List[torch.Tensor]
         """
-        output = []
-        for query in batch_instance:
-            output.append(self._cohere_embedding_query(query))
-        return output
+        return self._concurrent_map(self._cohere_embedding_query, batch_instance)
@@ -37,6 +37,8 @@ class GoogleModel(APIAccessFoundationModel):
     This class provides a wrapper for the Google API for generating completions.
     """
 
+    max_concurrency = 8
+
     @retry(
         num_retries=3,
         wait_time=0.1,
@@ -174,12 +176,10 @@ class GoogleModel(APIAccessFoundationModel):
         :return: A list of `CompletionResponse` objects containing the generated completions.
         :rtype: List[CompletionResponse]
         """
-        output = []
-        for query in batch_instance:
-            output.append(
-                CompletionResponse(prediction=self._google_genai_query(query, **kwargs))
-            )
-        return output
+        predictions = self._concurrent_map(
+            self._google_genai_query, batch_instance, **kwargs
+        )
+        return [CompletionResponse(prediction=prediction) for prediction in predictions]
 
     def _score_batch(
         self,
@@ -195,21 +195,18 @@ class GoogleModel(APIAccessFoundationModel):
         :param scoring_instruction: The instruction prompt for scoring
         :type scoring_instruction: str
         """
-        output = []
-        for query in batch_instance:
-            _scoring_prompt = (
-                scoring_instruction.replace(
-                    "[[label_space]]", ",".join(query.candidates)
-                )
-                + query.prompt
-            )
-            output.append(
-                RankedResponse(
-                    prediction=self._google_genai_query(_scoring_prompt, **kwargs),
-                    scores={},
-                )
-            )
-        return output
+        scoring_prompts = [
+            scoring_instruction.replace("[[label_space]]", ",".join(query.candidates))
+            + query.prompt
+            for query in batch_instance
+        ]
+        predictions = self._concurrent_map(
+            self._google_genai_query, scoring_prompts, **kwargs
+        )
+        return [
+            RankedResponse(prediction=prediction, scores={})
+            for prediction in predictions
+        ]
 
     def _encode_batch(
         self,
@@ -238,10 +235,9 @@ class GoogleModel(APIAccessFoundationModel):
                 f"Model {self.model_string} does not support embedding."
                 f"Please choose from {GOOGLE_GENAI_EMBEDDING_MODELS}"
             )
-        output = []
-        for query in batch_instance:
-            output.append(self._google_genai_embedding_query(query, **kwargs))
-        return output
+        return self._concurrent_map(
+            self._google_genai_embedding_query, batch_instance, **kwargs
+        )
 
     def chat(self, **kwargs: Any):
         """
@@ -23,6 +23,8 @@ class GroqModel(APIAccessFoundationModel):
     This class provides a wrapper for the OpenAI API for generating completions.
     """
 
+    max_concurrency = 4
+
     def _groq_query(
         self,
         query_string: Union[str, List[Dict]],
@@ -102,12 +104,8 @@ class GroqModel(APIAccessFoundationModel):
         :return: A list of `CompletionResponse` objects containing the generated completions.
         :rtype: List[CompletionResponse]
         """
-        output = []
-        for query in batch_instance:
-            output.append(
-                CompletionResponse(prediction=self._groq_query(query, **kwargs))
-            )
-        return output
+        predictions = self._concurrent_map(self._groq_query, batch_instance, **kwargs)
+        return [CompletionResponse(prediction=prediction) for prediction in predictions]
 
     def _score_batch(
         self,
@@ -123,23 +121,18 @@ class GroqModel(APIAccessFoundationModel):
         :param scoring_instruction: The instruction prompt for scoring
         :type scoring_instruction: str
         """
-        output = []
-        for query in batch_instance:
-            _scoring_prompt = (
-                scoring_instruction.replace(
-                    "[[label_space]]", ",".join(query.candidates)
-                )
-                + query.prompt
-            )
-            output.append(
-                RankedResponse(
-                    prediction=self._groq_query(
-                        _scoring_prompt, model=self.model_string, **kwargs
-                    ),
-                    scores={},
-                )
-            )
-        return output
+        scoring_prompts = [
+            scoring_instruction.replace("[[label_space]]", ",".join(query.candidates))
+            + query.prompt
+            for query in batch_instance
+        ]
+        predictions = self._concurrent_map(
+            self._groq_query, scoring_prompts, model=self.model_string, **kwargs
+        )
+        return [
+            RankedResponse(prediction=prediction, scores={})
+            for prediction in predictions
+        ]
 
     def chat(self, **kwargs: Any):
         """
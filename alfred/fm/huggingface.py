@@ -2,9 +2,10 @@ import logging
 import os
 from contextlib import nullcontext
 from pathlib import Path
-from typing import Optional, List, Union, Tuple, Dict, Any
+from typing import Optional, List, Union, Tuple, Dict, Any, Iterator
 
 import torch
+from tqdm.auto import tqdm
 from transformers import (
     AutoModelForSeq2SeqLM,
     AutoModelForCausalLM,
@@ -14,7 +15,8 @@ from transformers import (
 )
 
 from .model import LocalAccessFoundationModel
-from .response import CompletionResponse
+from .query import Query, RankedQuery
+from .response import CompletionResponse, RankedResponse
 from .utils import colorize_str, type_print
 
 import json
@@ -69,6 +71,7 @@ class HuggingFaceModel(LocalAccessFoundationModel):
         int_8: bool = False,
         trust_remote_code: bool = True,
         tokenizer: Optional[PreTrainedTokenizer] = None,
+        prefix_sharing: bool = False,
     ):
         """
         Constructor for the HuggingFaceModel class.
@@ -90,7 +93,10 @@ class HuggingFaceModel(LocalAccessFoundationModel):
         :type trust_remote_code: bool
         :param tokenizer: (optional) A custom tokenizer to use, if desired.
         :type tokenizer: transformers.PreTrainedTokenizer
+        :param prefix_sharing: (optional) Whether to score the candidates of ranked queries from a shared prompt KV cache, only for causal models (default: False)
+        :type prefix_sharing: bool
         """
+        self.prefix_sharing = prefix_sharing
         if not local_path:
             for HF_ENV_PATH in [
                 "TRANSFORMERS_CACHE",
@@ -255,7 +261,9 @@ class HuggingFaceModel(LocalAccessFoundationModel):
                 max_length=self.max_position_embeddings,
             )
 
-        end_device = list(self.model.hf_device_map.values())[-1]
+        end_device = list(
+            getattr(self.model, "hf_device_map", {"": self.model.device}).values()
+        )[-1]
 
         logger.log(logging.INFO, f"Ranking {len(candidate)} instances")
 
@@ -271,8 +279,8 @@ class HuggingFaceModel(LocalAccessFoundationModel):
             candidate_token_ids = candidate_tokens.input_ids.to(end_device)
 
             logits = self.model(
-                input_ids=inputs.input_ids.cuda(),
-                attention_mask=inputs.attention_mask.cuda(),
+                input_ids=inputs.input_ids.to(self.model.device),
+                attention_mask=inputs.attention_mask.to(self.model.device),
                 labels=candidate_token_ids,
             ).logits
         else:
@@ -305,12 +313,8 @@ class HuggingFaceModel(LocalAccessFoundationModel):
                     attention_mask=attention_mask,
                 ).logits[:, prefix_length - 1 : -1]
             else:
-                position_ids = torch.maximum(
-                    torch.cumsum(attention_mask.cuda().to(torch.long), dim=-1) - 1,
-                    torch.zeros(
-                        1,
-                        dtype=torch.long,
-                    ).cuda()[None, None],
+                position_ids = torch.clamp(
+                    torch.cumsum(attention_mask.to(torch.long), dim=-1) - 1, min=0
                 )
 
                 logits = self.model(
@@ -319,13 +323,13 @@ class HuggingFaceModel(LocalAccessFoundationModel):
                     attention_mask=attention_mask,
                 ).logits[:, prefix_length - 1 : -1]
 
-        masked_log_probs = candidate_tokens.attention_mask.to(
-            logits.get_device()
-        ).unsqueeze(-1) * torch.nn.functional.log_softmax(logits, dim=-1)
+        masked_log_probs = candidate_tokens.attention_mask.to(logits.device).unsqueeze(
+            -1
+        ) * torch.nn.functional.log_softmax(logits, dim=-1)
         seq_token_log_probs = torch.gather(
             masked_log_probs,
             -1,
-            candidate_token_ids.to(logits.get_device()).unsqueeze(-1),
+            candidate_token_ids.to(logits.device).unsqueeze(-1),
         )
         seq_log_prob = seq_token_log_probs.squeeze(dim=-1).sum(dim=-1)
         seq_log_prob = seq_log_prob.view(len(candidate), -1)
@@ -347,6 +351,210 @@ class HuggingFaceModel(LocalAccessFoundationModel):
             for logit_id, logit in enumerate(torch.flatten(seq_log_prob))
         ]
 
+    def stream(
+        self,
+        queries: Union[List[Query], List[str], List[Tuple[str, str]]],
+        batch_policy: str = "dynamic",
+        batch_size: int = 1024,
+        mode: str = "generate",
+        pretokenize: bool = True,
+        **kwargs,
+    ) -> Iterator[Tuple[int, Union[CompletionResponse, RankedResponse, torch.Tensor]]]:
+        """
+        Run queries through the model and yield (index, response) pairs as batches complete,
+        see `FoundationModel.stream`.
+
+        With `prefix_sharing` enabled, ranked queries for causal models are scored
+        by `_score_prefix_shared` instead of one forward pass per (prompt, candidate) pair.
+        """
+        if (
+            self.prefix_sharing
+            and isinstance(queries[0], RankedQuery)
+            and not self.model.config.is_encoder_decoder
+            and not kwargs.get("hidden_state", False)
+        ):
+            return self._score_prefix_shared(
+                queries, batch_size=batch_size, no_tqdm=kwargs.get("no_tqdm", False)
+            )
+        return super().stream(
+            queries, batch_policy, batch_size, mode, pretokenize, **kwargs
+        )
+
+    def _score_prefix_shared(
+        self,
+        queries: List[RankedQuery],
+        batch_size: int = 64,
+        no_tqdm: bool = False,
+    ) -> Iterator[Tuple[int, RankedResponse]]:
+        """
+        Score ranked queries by encoding each prompt once and scoring all of its candidates
+        from the prompt's KV cache (past_key_values), instead of encoding the prompt
+        once per candidate.
+
+        Prompts are sorted by length and batched so that each batch holds about
+        `batch_size` (prompt, candidate) pairs.
+
+        :param queries: A list of ranked queries
+        :type queries: List[RankedQuery]
+        :param batch_size: The approximate number of (prompt, candidate) pairs per batch
+        :type batch_size: int
+        :param no_tqdm: Whether to disable the progress bar
+        :type no_tqdm: bool
+        :return: An iterator of (index of the query, ranked response) pairs
+        :rtype: Iterator[Tuple[int, RankedResponse]]
+        """
+        prompts_per_batch = max(
+            1, batch_size // max(len(query.candidates) for query in queries)
+        )
+        prompt_ids = [
+            self.tokenizer(
+                query.prompt,
+                add_special_tokens=False,
+                truncation=True,
+                max_length=self.max_position_embeddings,
+            ).input_ids
+            for query in queries
+        ]
+        order = sorted(
+            range(len(queries)), key=lambda idx: len(prompt_ids[idx]), reverse=True
+        )
+
+        for start in tqdm(range(0, len(order), prompts_per_batch), disable=no_tqdm):
+            batch_idx = order[start : start + prompts_per_batch]
+            with torch.no_grad():
+                batch_responses = self._score_shared_prefix_batch(
+                    [prompt_ids[idx] for idx in batch_idx],
+                    [queries[idx].candidates for idx in batch_idx],
+                )
+            yield from zip(batch_idx, batch_responses)
+
+    def _score_shared_prefix_batch(
+        self,
+        prompt_ids: List[List[int]],
+        candidates: List[List[str]],
+    ) -> List[RankedResponse]:
+        """
+        Score the candidates of a batch of tokenized prompts.
+
+        The prompts are left-padded and encoded once; the KV cache is then gathered
+        to one row per (prompt, candidate) pair and only the candidate tokens are run
+        through the model. The log probability of the first candidate token comes
+        from the last prompt position.
+
+        :param prompt_ids: The token ids of each prompt
+        :type prompt_ids: List[List[int]]
+        :param candidates: The candidates of each prompt
+        :type candidates: List[List[str]]
+        :return: A list of ranked responses, one per prompt
+        :rtype: List[RankedResponse]
+        """
+        device = self.model.device
+        pad_token_id = self.tokenizer.pad_token_id
+        if pad_token_id is None:
+            pad_token_id = self.tokenizer.eos_token_id or 0
+
+        prompt_len = max(len(ids) for ids in prompt_ids)
+        input_ids = torch.full((len(prompt_ids), prompt_len), pad_token_id)
+        attention_mask = torch.zeros((len(prompt_ids), prompt_len), dtype=torch.long)
+        for row, ids in enumerate(prompt_ids):
+            if len(ids) > 0:
+                input_ids[row, -len(ids) :] = torch.tensor(ids)
+                attention_mask[row, -len(ids) :] = 1
+        input_ids, attention_mask = input_ids.to(device), attention_mask.to(device)
+
+        output = self.model(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            position_ids=(attention_mask.cumsum(dim=-1) - 1).clamp(min=0),
+            use_cache=True,
+        )
+        last_log_probs = torch.nn.functional.log_softmax(
+            output.logits[:, -1].float(), dim=-1
+        )
+
+        num_candidates = [len(_candidates) for _candidates in candidates]
+        row_idx = torch.repeat_interleave(
+            torch.arange(len(prompt_ids)), torch.tensor(num_candidates)
+        ).to(device)
+        candidate_ids = [
+            self.tokenizer(
+                candidate,
+                truncation=True,
+                max_length=self.max_position_embeddings,
+                add_special_tokens=not (
+                    isinstance(self.model, LlamaPreTrainedModel)
+                    or isinstance(self.model, MistralPreTrainedModel)
+                ),
+            ).input_ids
+            for _candidates in candidates
+            for candidate in _candidates
+        ]
+        candidate_len = max(len(ids) for ids in candidate_ids)
+        candidate_input_ids = torch.full(
+            (len(candidate_ids), candidate_len), pad_token_id
+        )
+        candidate_mask = torch.zeros(
+            (len(candidate_ids), candidate_len), dtype=torch.long
+        )
+        for row, ids in enumerate(candidate_ids):
+            candidate_input_ids[row, : len(ids)] = torch.tensor(ids, dtype=torch.long)
+            candidate_mask[row, : len(ids)] = 1
+        candidate_input_ids = candidate_input_ids.to(device)
+        candidate_mask = candidate_mask.to(device)
+
+        past_key_values = output.past_key_values
+        if hasattr(past_key_values, "batch_select_indices"):
+            past_key_values.batch_select_indices(row_idx)
+        else:
+            past_key_values = tuple(
+                tuple(tensor[row_idx] for tensor in layer) for layer in past_key_values
+            )
+        prompt_lengths = attention_mask.sum(dim=-1)[row_idx]
+
+        log_probs = last_log_probs[row_idx].unsqueeze(1)
+        if candidate_len > 1:
+            candidate_logits = self.model(
+                input_ids=candidate_input_ids[:, :-1],
+                attention_mask=torch.cat(
+                    [attention_mask[row_idx], candidate_mask[:, :-1]], dim=-1
+                ),
+                position_ids=prompt_lengths.unsqueeze(-1)
+                + torch.arange(candidate_len - 1, device=device),
+                past_key_values=past_key_values,
+                use_cache=True,
+            ).logits
+            log_probs = torch.cat(
+                [
+                    log_probs,
+                    torch.nn.functional.log_softmax(candidate_logits.float(), dim=-1),
+                ],
+                dim=1,
+            )
+        seq_log_prob = (
+            torch.gather(log_probs, -1, candidate_input_ids.unsqueeze(-1)).squeeze(-1)
+            * candidate_mask
+        ).sum(dim=-1)
+
+        responses = []
+        for _candidates, _logits in zip(
+            candidates, torch.split(seq_log_prob.cpu(), num_candidates)
+        ):
+            scores = torch.nn.functional.softmax(_logits, dim=0)
+            responses.append(
+                RankedResponse(
+                    prediction=_candidates[int(torch.argmax(scores))],
+                    scores={
+                        candidate: score.item()
+                        for candidate, score in zip(_candidates, scores)
+                    },
+                    logits={
+                        candidate: logit.item()
+                        for candidate, logit in zip(_candidates, _logits)
+                    },
+                )
+            )
+        return responses
+
     def _generate_batch(
         self,
         batch: List[str],
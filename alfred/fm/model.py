@@ -1,17 +1,37 @@
 import abc
 import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import nullcontext
 from PIL import Image
-from typing import List, Optional, Dict, Union, Tuple, OrderedDict, Any
+from typing import (
+    List,
+    Optional,
+    Dict,
+    Union,
+    Tuple,
+    OrderedDict,
+    Any,
+    Callable,
+    Iterator,
+)
 
 import numpy as np
+import pyarrow
 import torch
 from tqdm.auto import tqdm
 
 from .query import Query, RankedQuery, CompletionQuery
 from .response import Response, CompletionResponse, RankedResponse
-from .utils import DynamicBatcher, clear_cuda_cache, batch_multimodal, static_batch
+from .utils import (
+    DynamicBatcher,
+    RateLimiter,
+    batch_multimodal,
+    clear_cuda_cache,
+    is_rate_limit_error,
+    retry_delay,
+    static_batch,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -76,27 +96,17 @@ class FoundationModel(abc.ABC):
             f"_encode_batch() is not implemented for {self.__class__.__name__}"
         )
 
-    def forward(
+    def _batch_queries(
         self,
         queries: Union[List[Query], List[str], List[Tuple[str, str]]],
-        batch_policy: str = "dynamic",
-        batch_size: int = 1024,
-        mode: str = "generate",
-        pretokenize: bool = True,
-        **kwargs,
-    ) -> Union[
-        List[CompletionResponse],
-        List[RankedResponse],
-        List[OrderedDict],
-        List[torch.Tensor],
-    ]:
+        batch_policy: str,
+        batch_size: int,
+        mode: str,
+        pretokenize: bool,
+        limit_scale: float = 1.0,
+    ) -> Tuple[List, List[List[int]], str, bool, Optional[DynamicBatcher]]:
         """
-        This function is the main entry point for running queries through the foundation model.
-        It accepts raw query content and automatically converts it into query objects.
-        The function then determines whether to run the queries through the _generate_batch
-        or _score_batch method based on the type of queries. Finally, the function processes
-        the queries using one of two batching policies (dynamic, static) and passes them
-        through the foundation model.
+        Batch the queries according to the batching policy and the model type.
 
         :param queries: A list of queries
         :type queries: Union[List[Query], List[str], List[Tuple[str, str]]]
@@ -108,32 +118,32 @@ class FoundationModel(abc.ABC):
         :type mode: str
         :param pretokenize: Whether to tokenize the queries while batching
         :type pretokenize: bool
-        :param kwargs: Additional arguments to pass to the foundation model
-        :type kwargs: Any
-        :return: A list of responses
-        :rtype: Union[List[CompletionResponse], List[RankedResponse], List[OrderedDict], List[torch.Tensor]]
+        :param limit_scale: The factor applied to the dynamic batcher's size limit
+        :type limit_scale: float
+        :return: The batches, the instance indices of every batch, the inference mode,
+            whether the batches are tokenized and the dynamic batcher (if used).
+            For dynamically batched ranked queries, an instance index points to
+            candidate `index % candidate_size` of query `index // candidate_size`.
+        :rtype: Tuple[List, List[List[int]], str, bool, Optional[DynamicBatcher]]
         """
-        with_grad = kwargs.get("with_grad", False)
-        no_tqdm = kwargs.get("no_tqdm", False)
-
         if type(queries[0]) in [RankedQuery, tuple]:
             mode = "score"
 
+        DB = None
+        pretokenized = False
         if isinstance(self, LocalAccessFoundationModel):
             try:
                 batched_queries = batch_multimodal(
                     queries, mode=self.multimodal_mode, batch_size=batch_size
                 )
-                batch_policy = "static"
-                pretokenized = False
                 mode = (
                     "generate" if self.multimodal_mode == "autoregressive" else "score"
                 )
             except AttributeError:
                 if batch_policy == "static":
                     batched_queries = static_batch(queries, batch_size=batch_size)
-                    pretokenized = False
                 elif batch_policy == "dynamic":
+                    tokenizer = None
                     if pretokenize:
                         pretokenized = True
                         try:
@@ -142,82 +152,189 @@ class FoundationModel(abc.ABC):
                             logger.error(
                                 "Tokenizer not found. Please set the tokenizer attribute for the model"
                             )
-                            tokenizer = None
                             pretokenized = False
-                    else:
-                        pretokenized = False
-                        tokenizer = None
                     DB = DynamicBatcher(
                         queries, tokenizer=tokenizer, max_batch_size=batch_size
                     )
+                    DB.limit_size = int(DB.limit_size * limit_scale)
                     batched_queries = DB.batch()
                 else:
                     raise ValueError(f"batch_policy {batch_policy} not supported")
         else:
-            batch_policy = "static"
-            pretokenized = False
-            if isinstance(queries[0], Tuple):
-                if isinstance(queries[0][0], Image.Image):
-                    mode = "generate"
-                    batched_queries = batch_multimodal(
-                        queries, mode=self.multimodal_mode, batch_size=batch_size
-                    )
-                else:
-                    batched_queries = np.array_split(queries, len(queries))
+            if isinstance(queries[0], Tuple) and isinstance(queries[0][0], Image.Image):
+                mode = "generate"
+                batched_queries = batch_multimodal(
+                    queries, mode=self.multimodal_mode, batch_size=batch_size
+                )
             else:
-                batched_queries = np.array_split(queries, len(queries))
-        if mode == "generate":
-            inferece_fn = self._generate_batch
-        elif mode == "score":
-            inferece_fn = self._score_batch
-        elif mode == "encode":
-            inferece_fn = self._encode_batch
+                batched_queries = self._api_batch(queries, batch_size)
+
+        if DB is not None:
+            offsets = np.cumsum([0] + DB.batch_sizes)
+            batch_indices = [
+                DB.len_sorted_idx[start:end].tolist()
+                for start, end in zip(offsets[:-1], offsets[1:])
+            ]
         else:
-            raise ValueError(f"mode {mode} not supported")
+            batch_indices = []
+            offset = 0
+            for batch in batched_queries:
+                size = len(batch[0]) if isinstance(batch, tuple) else len(batch)
+                batch_indices.append(list(range(offset, offset + size)))
+                offset += size
+        return batched_queries, batch_indices, mode, pretokenized, DB
+
+    def stream(
+        self,
+        queries: Union[List[Query], List[str], List[Tuple[str, str]]],
+        batch_policy: str = "dynamic",
+        batch_size: int = 1024,
+        mode: str = "generate",
+        pretokenize: bool = True,
+        **kwargs,
+    ) -> Iterator[Tuple[int, Union[Response, OrderedDict, torch.Tensor]]]:
+        """
+        Streaming variant of `forward`: runs the queries through the foundation model and
+        yields `(original_index, response)` pairs as soon as each batch completes,
+        so that responses can be consumed (e.g. voted on or cached) while inference continues.
 
+        Responses are yielded in batch order, which is not the query order under dynamic batching.
+        A ranked query is yielded once the scores of all of its candidates are available.
+        If a batch runs out of memory, only the queries that have not been yielded yet
+        are re-batched with a smaller batch size.
+
+        :param queries: A list of queries
+        :type queries: Union[List[Query], List[str], List[Tuple[str, str]]]
+        :param batch_policy: The batching policy to use. Can be either 'dynamic' or 'static'
+        :type batch_policy: str
+        :param batch_size: The batch size to use for static batching or maximum batch size for dynamic batching
+        :type batch_size: int
+        :param mode: LLM inference mode, choose from ['generate', 'score', 'encode']
+        :type mode: str
+        :param pretokenize: Whether to tokenize the queries while batching
+        :type pretokenize: bool
+        :param kwargs: Additional arguments to pass to the foundation model
+        :type kwargs: Any
+        :return: An iterator of (index of the query, response) pairs
+        :rtype: Iterator[Tuple[int, Union[Response, OrderedDict, torch.Tensor]]]
+        """
+        with_grad = kwargs.get("with_grad", False)
+        no_tqdm = kwargs.get("no_tqdm", False)
+
+        remaining = list(range(len(queries)))
+        limit_scale = 1.0
         attempts = 0
-        while attempts < 3:
+        while len(remaining) > 0:
+            done = set()
+            batched_queries, batch_indices, _mode, pretokenized, DB = (
+                self._batch_queries(
+                    [queries[idx] for idx in remaining],
+                    batch_policy,
+                    batch_size,
+                    mode,
+                    pretokenize,
+                    limit_scale=limit_scale,
+                )
+            )
+            if _mode == "generate":
+                inferece_fn = self._generate_batch
+            elif _mode == "score":
+                inferece_fn = self._score_batch
+            elif _mode == "encode":
+                inferece_fn = self._encode_batch
+            else:
+                raise ValueError(f"mode {_mode} not supported")
+
+            ranked = DB is not None and DB.ranked
+            pending_candidates = {}
             try:
                 logger.info(f"Inferring {len(batched_queries)} batches")
-                with nullcontext() if with_grad else torch.no_grad():
-                    responses = []
-                    for batch_id, batch in enumerate(
-                        tqdm(batched_queries, disable=no_tqdm)
-                    ):
-                        responses += inferece_fn(
+                for batch, indices in zip(
+                    tqdm(batched_queries, disable=no_tqdm), batch_indices
+                ):
+                    with nullcontext() if with_grad else torch.no_grad():
+                        batch_responses = inferece_fn(
                             batch, tokenized=pretokenized, **kwargs
                         )
-                    break
+                    for idx, response in zip(indices, batch_responses):
+                        if ranked:
+                            idx, candidate_idx = divmod(idx, DB.candidate_size)
+                            candidates = pending_candidates.setdefault(idx, {})
+                            candidates[candidate_idx] = response
+                            if len(candidates) < DB.candidate_size:
+                                continue
+                            del pending_candidates[idx]
+                            response = DB.merge_rank_response(
+                                [candidates[i] for i in range(DB.candidate_size)]
+                            )
+                        done.add(idx)
+                        yield remaining[idx], response
+                break
             except RuntimeError as e:
                 attempts += 1
-                if "out of memory" in str(e):
-                    logger.log(
-                        logging.INFO,
-                        "WARNING: out of memory, trying to allocate a new batch",
-                    )
-                    clear_cuda_cache()
-                    if batch_policy == "static":
-                        batch_size = int(batch_size * 0.8)
-                        batched_queries = static_batch(queries, batch_size=batch_size)
-                        logging.info(f"New batch size: {batch_size}")
-                    elif batch_policy == "dynamic":
-                        DB = DynamicBatcher(
-                            queries,
-                            tokenizer=tokenizer,
-                            max_batch_size=int(DB.max_batch_size * 0.9),
-                        )
-                        DB.limit_size = int(DB.limit_size * 0.9)
-                        batched_queries = DB.batch()
-                        logging.info(
-                            f"New lmt_sz, bs: {DB.limit_size}, {DB.max_batch_size}"
-                        )
-                else:
+                if "out of memory" not in str(e) or attempts >= 3:
                     raise e
+                logger.log(
+                    logging.INFO,
+                    "WARNING: out of memory, trying to allocate a new batch",
+                )
+                clear_cuda_cache()
+                if batch_policy == "dynamic":
+                    batch_size = int(batch_size * 0.9)
+                    limit_scale *= 0.9
+                else:
+                    batch_size = int(batch_size * 0.8)
+                logger.info(f"New batch size: {batch_size}")
+                remaining = [
+                    query_idx
+                    for idx, query_idx in enumerate(remaining)
+                    if idx not in done
+                ]
+        clear_cuda_cache()
 
-        if batch_policy == "dynamic":
-            responses = DB.reorder(responses)
+    def forward(
+        self,
+        queries: Union[List[Query], List[str], List[Tuple[str, str]]],
+        batch_policy: str = "dynamic",
+        batch_size: int = 1024,
+        mode: str = "generate",
+        pretokenize: bool = True,
+        **kwargs,
+    ) -> Union[
+        List[CompletionResponse],
+        List[RankedResponse],
+        List[OrderedDict],
+        List[torch.Tensor],
+    ]:
+        """
+        This function is the main entry point for running queries through the foundation model.
+        It accepts raw query content and automatically converts it into query objects.
+        The function then determines whether to run the queries through the _generate_batch
+        or _score_batch method based on the type of queries. Finally, the function processes
+        the queries using one of two batching policies (dynamic, static) and passes them
+        through the foundation model.
 
-        return list(responses)
+        :param queries: A list of queries
+        :type queries: Union[List[Query], List[str], List[Tuple[str, str]]]
+        :param batch_policy: The batching policy to use. Can be either 'dynamic' or 'static'
+        :type batch_policy: str
+        :param batch_size: The batch size to use for static batching or maximum batch size for dynamic batching
+        :type batch_size: int
+        :param mode: LLM inference mode, choose from ['generate', 'score', 'encode']
+        :type mode: str
+        :param pretokenize: Whether to tokenize the queries while batching
+        :type pretokenize: bool
+        :param kwargs: Additional arguments to pass to the foundation model
+        :type kwargs: Any
+        :return: A list of responses
+        :rtype: Union[List[CompletionResponse], List[RankedResponse], List[OrderedDict], List[torch.Tensor]]
+        """
+        responses = [None] * len(queries)
+        for idx, response in self.stream(
+            queries, batch_policy, batch_size, mode, pretokenize, **kwargs
+        ):
+            responses[idx] = response
+        return responses
 
     def generate(
         self,
@@ -314,13 +431,16 @@ class FoundationModel(abc.ABC):
         The function then processes the queries and returns the responses in the appropriate format.
         For single instance queries, a single response object is returned.
 
-        :param queries: A single query or a list of queries
-        :type queries: Union[Query, str, Tuple[str, str], List[Query], List[str]]
+        :param queries: A single query, a list of queries or an arrow array of prompts
+        :type queries: Union[Query, str, Tuple[str, str], List[Query], List[str], pyarrow.Array]
         :param kwargs: Additional arguments to pass to the foundation model
         :type kwargs: Any
         :return: A single response or a list of responses
         :rtype: Union[str, Response, List[Response]]
         """
+        if isinstance(queries, (pyarrow.Array, pyarrow.ChunkedArray)):
+            # e.g. a prompt column rendered by StringTemplate.render_table
+            queries = queries.to_pylist()
         if isinstance(queries, List):
             if type(queries[0]) == RankedQuery:
                 mode = "score"
@@ -376,6 +496,25 @@ class FoundationModel(abc.ABC):
 
 
 class APIAccessFoundationModel(FoundationModel):
+    """
+    Generic interface for API-based foundation models.
+
+    API requests are latency-bound, so each batch is fanned out over a bounded thread pool
+    of `max_concurrency` in-flight requests (see `_concurrent_map`).
+    Subclasses set `max_concurrency` to the limit suited to their provider;
+    it can also be changed per model instance.
+
+    Every request first draws from a token-bucket `rate_limiter` shared by all workers,
+    sized by `requests_per_minute` and `tokens_per_minute` (None means unlimited).
+    Rate-limited requests are retried up to `max_retries` times after pausing the limiter
+    for the Retry-After time or a jittered exponential backoff.
+    """
+
+    max_concurrency: int = 8
+    requests_per_minute: Optional[float] = None
+    tokens_per_minute: Optional[float] = None
+    max_retries: int = 5
+
     def __init__(self, model_string: str, cfg: Optional[Dict] = None):
         """
         Initializes the APIAccessFoundationModel class,
@@ -389,6 +528,118 @@ class APIAccessFoundationModel(FoundationModel):
         self.cfg = cfg
         self.model_string = model_string
 
+    @staticmethod
+    def _api_batch(
+        queries: Union[List[Query], List[str]], batch_size: int
+    ) -> List[List[Union[Query, str]]]:
+        """
+        Split API queries into batches of at most `batch_size` queries.
+        Completion queries are unpacked into their raw prompts, ranked queries are kept as is.
+
+        :param queries: A list of queries
+        :type queries: Union[List[Query], List[str]]
+        :param batch_size: The maximum number of queries per batch
+        :type batch_size: int
+        :return: A list of batches
+        :rtype: List[List[Union[Query, str]]]
+        """
+        queries = [
+            query.load()[0] if isinstance(query, CompletionQuery) else query
+            for query in queries
+        ]
+        return [
+            queries[start : start + batch_size]
+            for start in range(0, len(queries), batch_size)
+        ]
+
+    def _concurrent_map(
+        self, fn: Callable, batch_instance: List, **kwargs: Any
+    ) -> List[Any]:
+        """
+        Apply `fn` to every instance of the batch with at most `max_concurrency` requests in flight.
+        The results are returned in the order of the input instances.
+
+        :param fn: The function issuing a single API request, called as fn(instance, **kwargs)
+        :type fn: Callable
+        :param batch_instance: A batch of query instances
+        :type batch_instance: List
+        :param kwargs: Additional keyword arguments to pass to `fn`
+        :type kwargs: Any
+        :return: The results of `fn` for each instance
+        :rtype: List[Any]
+        """
+        if self.max_concurrency <= 1 or len(batch_instance) <= 1:
+            return [
+                self._rate_limited_call(fn, instance, **kwargs)
+                for instance in batch_instance
+            ]
+
+        executor = getattr(self, "_executor", None)
+        if executor is None or executor._max_workers != self.max_concurrency:
+            if executor is not None:
+                executor.shutdown(wait=False)
+            executor = ThreadPoolExecutor(
+                max_workers=self.max_concurrency,
+                thread_name_prefix=f"{self.__class__.__name__}-request",
+            )
+            self._executor = executor
+        return list(
+            executor.map(
+                lambda instance: self._rate_limited_call(fn, instance, **kwargs),
+                batch_instance,
+            )
+        )
+
+    @property
+    def rate_limiter(self) -> RateLimiter:
+        """
+        The rate limiter shared by all workers of this model.
+        Assign the same RateLimiter to several models to make them share one budget.
+
+        :return: The rate limiter
+        :rtype: RateLimiter
+        """
+        if getattr(self, "_rate_limiter", None) is None:
+            self._rate_limiter = RateLimiter(
+                requests_per_minute=self.requests_per_minute,
+                tokens_per_minute=self.tokens_per_minute,
+            )
+        return self._rate_limiter
+
+    @rate_limiter.setter
+    def rate_limiter(self, rate_limiter: RateLimiter):
+        self._rate_limiter = rate_limiter
+
+    def _rate_limited_call(self, fn: Callable, instance: Any, **kwargs: Any) -> Any:
+        """
+        Issue a single API request within the rate limits, retrying rate-limited requests.
+
+        The token cost of a request is estimated as a quarter of the prompt length in
+        characters plus the requested `max_tokens`.
+
+        :param fn: The function issuing a single API request, called as fn(instance, **kwargs)
+        :type fn: Callable
+        :param instance: A query instance
+        :type instance: Any
+        :param kwargs: Additional keyword arguments to pass to `fn`
+        :type kwargs: Any
+        :return: The result of `fn`
+        :rtype: Any
+        """
+        tokens = len(str(instance)) // 4 + (kwargs.get("max_tokens") or 0)
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire(tokens)
+            try:
+                return fn(instance, **kwargs)
+            except Exception as e:
+                if attempt == self.max_retries or not is_rate_limit_error(e):
+                    raise e
+                delay = retry_delay(e, attempt)
+                logger.info(
+                    f"Rate limited by the API, pausing requests for {delay:.2f}s"
+                )
+                self.rate_limiter.pause(delay)
+
 
 class LocalAccessFoundationModel(FoundationModel):
     def __init__(self, model_string: str, local_path: Optional[str] = None):
@@ -57,7 +57,7 @@ OPENAI_MODELS = (
     "o1-pro",
     "o1-mini",
     "o3-mini",
-    "gpt-4.5-preview"
+    "gpt-4.5-preview",
 )
 
 OPENAI_EMBEDDING_MODELS = (
@@ -81,6 +81,8 @@ class OpenAIModel(APIAccessFoundationModel):
     This class provides a wrapper for the OpenAI API for generating completions.
     """
 
+    max_concurrency = 16
+
     @retry(
         num_retries=3,
         wait_time=0.1,
@@ -255,12 +257,8 @@ class OpenAIModel(APIAccessFoundationModel):
         :return: A list of `CompletionResponse` objects containing the generated completions.
         :rtype: List[CompletionResponse]
         """
-        output = []
-        for query in batch_instance:
-            output.append(
-                CompletionResponse(prediction=self._openai_query(query, **kwargs))
-            )
-        return output
+        predictions = self._concurrent_map(self._openai_query, batch_instance, **kwargs)
+        return [CompletionResponse(prediction=prediction) for prediction in predictions]
 
     def _encode_batch(
         self,
@@ -289,10 +287,9 @@ class OpenAIModel(APIAccessFoundationModel):
                 f"Model {self.model_string} does not support embedding."
                 f"Please choose from {OPENAI_EMBEDDING_MODELS}"
             )
-        output = []
-        for query in batch_instance:
-            output.append(self._openai_embedding_query(query, **kwargs))
-        return output
+        return self._concurrent_map(
+            self._openai_embedding_query, batch_instance, **kwargs
+        )
 
     def _score_batch(
         self,
@@ -308,20 +305,18 @@ class OpenAIModel(APIAccessFoundationModel):
         :param scoring_instruction: The instruction prompt for scoring
         :type scoring_instruction: str
         """
-        output = []
-        for query in batch_instance:
-            _scoring_prompt = (
-                scoring_instruction.replace(
-                    "[[label_space]]", ",".join(query.candidates)
-                )
-                + query.prompt
-            )
-            output.append(
-                RankedResponse(
-                    prediction=self._openai_query(_scoring_prompt, **kwargs), scores={}
-                )
-            )
-        return output
+        scoring_prompts = [
+            scoring_instruction.replace("[[label_space]]", ",".join(query.candidates))
+            + query.prompt
+            for query in batch_instance
+        ]
+        predictions = self._concurrent_map(
+            self._openai_query, scoring_prompts, **kwargs
+        )
+        return [
+            RankedResponse(prediction=prediction, scores={})
+            for prediction in predictions
+        ]
 
     def chat(self, **kwargs: Any):
         """
@@ -375,7 +370,8 @@ class OpenAIModel(APIAccessFoundationModel):
                 message_log.append({"role": "user", "content": query})
                 _feedback("", no_newline=True)
                 response = []
-                for resp in self._openai_query(
+                for resp in self._rate_limited_call(
+                    self._openai_query,
                     message_log,
                     chat=True,
                     temperature=temperature,
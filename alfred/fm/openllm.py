@@ -24,6 +24,8 @@ class OpenLLMModel(APIAccessFoundationModel):
     A wrapper for the OpenLLM Models using OpenAI's Python package
     """
 
+    max_concurrency = 16
+
     @retry(
         num_retries=3,
         wait_time=0.1,
@@ -111,12 +113,8 @@ class OpenLLMModel(APIAccessFoundationModel):
         :return: A list of `CompletionResponse` objects containing the generated completions.
         :rtype: List[CompletionResponse]
         """
-        output = []
-        for query in batch_instance:
-            output.append(
-                CompletionResponse(prediction=self._api_query(query, **kwargs))
-            )
-        return output
+        predictions = self._concurrent_map(self._api_query, batch_instance, **kwargs)
+        return [CompletionResponse(prediction=prediction) for prediction in predictions]
 
     def _score_batch(
         self,
@@ -132,17 +130,13 @@ class OpenLLMModel(APIAccessFoundationModel):
         :param scoring_instruction: The instruction prompt for scoring
         :type scoring_instruction: str
         """
-        output = []
-        for query in batch_instance:
-            _scoring_prompt = (
-                scoring_instruction.replace(
-                    "[[label_space]]", ",".join(query.candidates)
-                )
-                + query.prompt
-            )
-            output.append(
-                RankedResponse(
-                    prediction=self._api_query(_scoring_prompt, **kwargs), scores={}
-                )
-            )
-        return output
\ No newline at end of file
+        scoring_prompts = [
+            scoring_instruction.replace("[[label_space]]", ",".join(query.candidates))
+            + query.prompt
+            for query in batch_instance
+        ]
+        predictions = self._concurrent_map(self._api_query, scoring_prompts, **kwargs)
+        return [
+            RankedResponse(prediction=prediction, scores={})
+            for prediction in predictions
+        ]
\ No newline at end of file
@@ -1,8 +1,10 @@
 import ast
 import base64
 import io
+import itertools
 import json
 import logging
+import numpy as np
 import torch
 import torch.nn.functional as F
 from typing import Optional, Union, Iterable, Tuple, Any, List
@@ -13,8 +15,9 @@ from PIL import Image
 from ..query import Query, RankedQuery, CompletionQuery
 from ..remote.protos import query_pb2
 from .protos import query_pb2_grpc
-from ..remote.utils import bytes_to_tensor
-from ..response import RankedResponse, CompletionResponse
+from ..remote.utils import PROTOCOL_VERSION, bytes_to_tensor, proto_to_tensor
+from ..utils import reorder_array
+from ..response import RankedResponse, CompletionResponse, deserialize
 
 logger = logging.getLogger(__name__)
 
@@ -31,6 +34,7 @@ class gRPCClient:
         self.host = host
         self.port = port
         self.session_id = None
+        self.protocol_version = None
 
         if credentials:
             self.channel = grpc.secure_channel(f"{self.host}:{self.port}", credentials)
@@ -45,13 +49,40 @@ class gRPCClient:
 
     def handshake(self):
         try:
-            response = self.stub.Handshake(query_pb2.HandshakeRequest())
+            response = self.stub.Handshake(
+                query_pb2.HandshakeRequest(protocol_version=PROTOCOL_VERSION)
+            )
             self.session_id = response.session_id
-            logger.info(f"Handshake completed. Session ID: {self.session_id}")
+            # servers before protocol version 2 do not send their version
+            self.protocol_version = response.protocol_version or 1
+            logger.info(
+                f"Handshake completed. Session ID: {self.session_id} "
+                f"(protocol version {self.protocol_version})"
+            )
         except Exception as e:
             logger.error(f"Handshake failed: {e}")
             raise e
 
+    def _in_session(self, call, *args, **kwargs):
+        """
+        Make a call in the current session, opening a new session and retrying once
+        if the server has closed it, e.g. after it was idle for longer than the server's session TTL
+
+        :param call: the streaming call to make, e.g. `self._run`
+        :type call: Callable
+        :return: the output of the call
+        """
+        if not self.session_id:
+            self.handshake()
+        try:
+            return call(*args, **kwargs)
+        except grpc.RpcError as e:
+            if e.code() != grpc.StatusCode.UNAUTHENTICATED:
+                raise e
+            logger.info(f"Session {self.session_id} was closed, handshaking again")
+            self.handshake()
+            return call(*args, **kwargs)
+
     @staticmethod
     def _interpret_msg(msg):
         candidate = None
@@ -94,11 +125,11 @@ class gRPCClient:
         queries: Union[Iterable[Query], Iterable[str], Iterable[Tuple]],
         **kwargs: Any,
     ):
-        if not self.session_id:
-            self.handshake()
-
+        if not isinstance(queries, (list, tuple)):
+            # a retry in a new session sends the queries again
+            queries = list(queries)
         try:
-            output = self._run(queries, **kwargs)
+            output = self._in_session(self._run, queries, **kwargs)
         except Exception as e:
             logger.error(f"Failed to run queries: {e}")
             raise e
@@ -110,11 +141,8 @@ class gRPCClient:
         reduction: str = "mean",
         **kwargs: Any,
     ):
-        if not self.session_id:
-            self.handshake()
-
         try:
-            output = self._encode(queries, reduction, **kwargs)
+            output = self._in_session(self._encode, queries, reduction, **kwargs)
         except Exception as e:
             logger.error(f"Failed to encode queries: {e}")
             raise e
@@ -128,16 +156,38 @@ class gRPCClient:
         kwargs = json.dumps(kwargs)
 
         def _run_req_gen():
-            for query in queries:
+            for request_id, query in enumerate(queries):
                 msg, candidate = self._interpret_msg(query)
                 yield query_pb2.RunRequest(
-                    message=msg, candidate=candidate, kwargs=kwargs
+                    message=msg,
+                    candidate=candidate,
+                    kwargs=kwargs,
+                    request_id=request_id,
                 )
 
         metadata = (("session_id", self.session_id),)
-        output = []
+        # the server streams responses back as its micro-batches finish, tagged with request ids
+        output, request_ids = [], []
+        # ranked responses sent as packed arrays are built together once the stream is complete
+        ranked_idx, ranked_messages = [], []
         for response in self.stub.Run(_run_req_gen(), metadata=metadata):
-            if response.ranked:
+            request_ids.append(
+                response.request_id
+                if response.HasField("request_id")
+                else len(request_ids)
+            )
+            if len(response.candidates) > 0:
+                ranked_idx.append(len(output))
+                ranked_messages.append(response)
+                output.append(None)
+            elif response.HasField("response"):
+                decoded = deserialize(response.response)
+                if response.HasField("embedding_tensor"):
+                    decoded["embeddings" if response.ranked else "embedding"] = (
+                        proto_to_tensor(response.embedding_tensor)
+                    )
+                output.append(decoded)
+            elif response.ranked:
                 logits = ast.literal_eval(response.logit)
                 candidates = list(logits.keys())
                 logit_values = torch.tensor(list(logits.values()))
@@ -162,7 +212,71 @@ class gRPCClient:
                         response.message, embedding=bytes_to_tensor(response.embedding)
                     )
                 )
-        return output
+        for idx, response in zip(
+            ranked_idx, self._build_ranked_responses(ranked_messages)
+        ):
+            output[idx] = response
+        return reorder_array(output, request_ids)
+
+    @staticmethod
+    def _build_ranked_responses(messages: List[Any]) -> List[RankedResponse]:
+        """
+        Build RankedResponses from RunResponses carrying candidates, logits and (optionally) scores
+        as packed arrays. The logits of all messages are gathered into one array, and the scores
+        missing from the messages are computed with one segmented softmax over it.
+
+        :param messages: RunResponse messages with at least one candidate each
+        :type messages: List[query_pb2.RunResponse]
+        :return: the ranked responses, in the order of the messages
+        :rtype: List[RankedResponse]
+        """
+        if len(messages) == 0:
+            return []
+        lengths = np.fromiter(
+            (len(message.candidates) for message in messages),
+            dtype=np.int64,
+            count=len(messages),
+        )
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+        logits = np.fromiter(
+            itertools.chain.from_iterable(message.logits for message in messages),
+            dtype=np.float64,
+            count=offsets[-1],
+        )
+        probabilities = None
+        if any(len(message.scores) != len(message.logits) for message in messages):
+            starts = offsets[:-1]
+            exp = np.exp(
+                logits - np.repeat(np.maximum.reduceat(logits, starts), lengths)
+            )
+            probabilities = (
+                exp / np.repeat(np.add.reduceat(exp, starts), lengths)
+            ).tolist()
+        logits = logits.tolist()
+        offsets = offsets.tolist()
+
+        responses = []
+        for idx, message in enumerate(messages):
+            start, end = offsets[idx], offsets[idx + 1]
+            candidates = list(message.candidates)
+            scores = (
+                list(message.scores)
+                if len(message.scores) == end - start
+                else probabilities[start:end]
+            )
+            responses.append(
+                RankedResponse(
+                    prediction=message.message,
+                    scores=dict(zip(candidates, scores)),
+                    logits=dict(zip(candidates, logits[start:end])),
+                    embeddings=(
+                        proto_to_tensor(message.embedding_tensor)
+                        if message.HasField("embedding_tensor")
+                        else None
+                    ),
+                )
+            )
+        return responses
 
     def _encode(
         self,
@@ -181,7 +295,9 @@ class gRPCClient:
         metadata = (("session_id", self.session_id),)
         output = []
         for response in self.stub.Encode(_encode_req_gen(), metadata=metadata):
-            if response.success:
+            if response.success and response.HasField("tensor"):
+                output.append(proto_to_tensor(response.tensor))
+            elif response.success:
                 output.append(bytes_to_tensor(response.embedding))
             else:
                 output.append(None)
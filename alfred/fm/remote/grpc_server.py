@@ -5,7 +5,7 @@ import json
 import logging
 import uuid
 import socket
-from typing import Optional
+from typing import Any, Dict, Optional
 
 import grpc
 from PIL import Image
@@ -14,9 +14,10 @@ from tqdm.auto import tqdm
 from ..query import RankedQuery, CompletionQuery
 from ..remote.protos import query_pb2
 from .protos import query_pb2_grpc
-from ..remote.utils import tensor_to_bytes
+from ..remote.utils import PROTOCOL_VERSION, tensor_to_bytes, tensor_to_proto
 from ..response import RankedResponse, CompletionResponse
 from .message_queue import MessageBroker, Message
+from .scheduler import BatchScheduler
 
 logger = logging.getLogger(__name__)
 
@@ -29,130 +30,312 @@ class gRPCServer(query_pb2_grpc.QueryServiceServicer):
         model,
         port: int = 10719,
         credentials: Optional[grpc.ServerCredentials] = None,
+        max_batch_size: int = 64,
+        max_wait_ms: float = 10.0,
+        max_pending: int = 1024,
+        session_ttl_s: float = 3600.0,
     ):
+        """
+        Serve a model over gRPC
+
+        The queries of all Run streams are published to the message broker and merged across
+        sessions into batches by a BatchScheduler as they arrive: a batch is closed once it holds
+        `max_batch_size` queries or `max_wait_ms` milliseconds after its first query, and its
+        responses are streamed back to their sessions, tagged with their request ids,
+        as soon as it finishes. Streams whose requests carry no request ids get their responses
+        in submission order instead.
+
+        At most `max_pending` queries are queued ahead of the model, beyond that the request
+        streams are held back. Sessions without an open stream for `session_ttl_s` seconds
+        are closed, and the queue depths are logged at the same interval.
+
+        :param model: the model (or client) to serve
+        :param port: (optional) the port to serve on, defaults to 10719
+        :type port: int
+        :param credentials: (optional) the server credentials, serves insecurely if None
+        :type credentials: grpc.ServerCredentials
+        :param max_batch_size: (optional) the maximum number of queries per batch, defaults to 64
+        :type max_batch_size: int
+        :param max_wait_ms: (optional) the maximum time to wait for a batch to fill, defaults to 10ms
+        :type max_wait_ms: float
+        :param max_pending: (optional) the maximum number of queries queued ahead of the model,
+                            defaults to 1024
+        :type max_pending: int
+        :param session_ttl_s: (optional) the time to live of an idle session in seconds,
+                              defaults to one hour
+        :type session_ttl_s: float
+        """
         self.model = model
         self.port = port
-        self.broker = MessageBroker()
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.session_ttl_s = session_ttl_s
+        self.broker = MessageBroker(max_topic_size=max_pending)
+        self.scheduler = BatchScheduler(
+            model,
+            self.broker,
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms,
+            max_pending=max_pending,
+        )
+        self.protocol_versions = {}
+        # session id -> number of open Run and Encode streams
+        self.active_streams = {}
         self.executor = asyncio.get_event_loop()
         self.serve(credentials)
 
     async def Handshake(self, request, context):
         session_id = str(uuid.uuid4())
-        self.broker.sessions[session_id] = asyncio.Queue()
-        logger.info(f"New session created: {session_id}")
-        return query_pb2.HandshakeResponse(session_id=session_id)
+        self.broker.open_session(session_id)
+        # clients before protocol version 2 do not send their version
+        protocol_version = (
+            min(request.protocol_version, PROTOCOL_VERSION)
+            if request.HasField("protocol_version")
+            else 1
+        )
+        self.protocol_versions[session_id] = protocol_version
+        logger.info(
+            f"New session created: {session_id} (protocol version {protocol_version})"
+        )
+        return query_pb2.HandshakeResponse(
+            session_id=session_id, protocol_version=protocol_version
+        )
 
     async def Run(self, request_iterator, context):
-        metadata = dict(context.invocation_metadata())
-        session_id = metadata.get("session_id")
-        if not session_id or session_id not in self.broker.sessions:
-            logger.error(f"Invalid session: {session_id}")
-            context.abort(grpc.StatusCode.UNAUTHENTICATED, "Invalid session")
+        session_id = await self._open_stream(context)
 
-        self.broker.subscribe("queries", session_id)
-        self.broker.subscribe("responses", session_id)
+        protocol_version = self.protocol_versions.get(session_id, 1)
 
-        datasets = []
+        # the scheduler merges the queries with those of the other sessions and sends each
+        # response back here as (request_id, response), (None, num_requests) ends the stream
+        replies = asyncio.Queue()
         kwargs = {}
-
-        async for request in request_iterator:
-            instance = request.message
-            candidate = request.candidate
-            request_kwargs = request.kwargs
-
-            if candidate:
-                if instance.startswith(IMAGE_SIGNATURE):
-                    instance = Image.open(
-                        io.BytesIO(base64.b64decode(instance[len(IMAGE_SIGNATURE) :]))
+        # clients that do not send request ids pair the responses with their queries by position,
+        # so their responses are held back until they are in submission order
+        in_order = False
+
+        async def _receive():
+            nonlocal in_order
+            num_requests = 0
+            try:
+                async for request in request_iterator:
+                    instance = self._parse_run_request(request)
+                    if request.kwargs:
+                        kwargs.update(json.loads(request.kwargs))
+                    if request.HasField("request_id"):
+                        request_id = request.request_id
+                    else:
+                        request_id = num_requests
+                        in_order = True
+                    num_requests += 1
+                    message = Message(
+                        "queries",
+                        instance,
+                        session_id,
+                        reply_to=replies,
+                        metadata={"request_id": request_id, "kwargs": dict(kwargs)},
                     )
-            else:
-                if IMAGE_SIGNATURE in instance:
-                    prompt, img = instance.split(IMAGE_SIGNATURE)
-                    img = Image.open(io.BytesIO(base64.b64decode(img)))
-                    instance = (img, prompt)
-
-            if request_kwargs:
-                kwargs.update(json.loads(request_kwargs))
-
-            if candidate:
-                instance = RankedQuery(
-                    prompt=instance, candidates=candidate.split("|||")
-                )
-            else:
-                instance = CompletionQuery(instance)
-
-            datasets.append(instance)
-            message = Message("queries", instance, session_id)
-            await self.broker.publish(message)
-
-        logger.info(f"Received {len(datasets)} queries from session {session_id}")
-
-        responses = self._process_queries(datasets, kwargs)
-
-        for response in responses:
-            yield response
-
-    def _process_queries(self, datasets, kwargs):
-        responses = self.model.run(datasets, **kwargs)
-        for response in tqdm(responses):
-            if isinstance(response, CompletionResponse):
-                yield query_pb2.RunResponse(
-                    message=response.prediction,
-                    ranked=False,
-                    embedding=tensor_to_bytes(response.embedding),
-                )
-            elif isinstance(response, RankedResponse):
-                yield query_pb2.RunResponse(
-                    message=response.prediction,
-                    ranked=True,
-                    logit=str(response.logits),
-                    embedding=tensor_to_bytes(response.embeddings),
+                    await self.broker.publish(message)
+            finally:
+                logger.info(
+                    f"Received {num_requests} queries from session {session_id}"
                 )
-            else:
-                logger.error(f"Response type {type(response)} not supported")
-                raise ValueError("Response type not supported")
-
-    async def Encode(self, request_iterator, context):
+                await replies.put((None, num_requests))
+
+        receiver = asyncio.ensure_future(_receive())
+        num_requests, num_responses = None, 0
+        held, next_request_id = {}, 0
+        try:
+            while num_requests is None or num_responses < num_requests:
+                request_id, response = await replies.get()
+                if request_id is None:
+                    num_requests = response
+                    continue
+                if isinstance(response, Exception):
+                    raise response
+                message = self._to_run_response(response, protocol_version)
+                message.request_id = request_id
+                num_responses += 1
+                if not in_order:
+                    yield message
+                    continue
+                held[request_id] = message
+                while next_request_id in held:
+                    yield held.pop(next_request_id)
+                    next_request_id += 1
+            # surfaces errors raised while receiving the requests
+            await receiver
+        finally:
+            receiver.cancel()
+            if num_requests is None or num_responses < num_requests:
+                # the stream ended early, e.g. the client disconnected
+                self.scheduler.discard(replies)
+            self._close_stream(session_id)
+
+    async def _open_stream(self, context) -> str:
+        """
+        Validate the session of a stream and keep it open while the stream is
+
+        :param context: the context of the RPC
+        :return: the session id
+        :rtype: str
+        """
         metadata = dict(context.invocation_metadata())
         session_id = metadata.get("session_id")
-        if not session_id or session_id not in self.broker.sessions:
+        if not session_id or not self.broker.touch(session_id):
             logger.error(f"Invalid session: {session_id}")
-            context.abort(grpc.StatusCode.UNAUTHENTICATED, "Invalid session")
+            await context.abort(grpc.StatusCode.UNAUTHENTICATED, "Invalid session")
+        self.active_streams[session_id] = self.active_streams.get(session_id, 0) + 1
+        return session_id
+
+    def _close_stream(self, session_id: str):
+        """release a stream of a session, whose time to live starts over once it has none left"""
+        self.active_streams[session_id] -= 1
+        if self.active_streams[session_id] == 0:
+            del self.active_streams[session_id]
+        self.broker.touch(session_id)
+
+    async def _collect_sessions(self):
+        """close the sessions idle for longer than `session_ttl_s` and log the queue depths"""
+        while True:
+            await asyncio.sleep(self.session_ttl_s)
+            for session_id in self.broker.expire_sessions(
+                self.session_ttl_s, active=self.active_streams
+            ):
+                self.protocol_versions.pop(session_id, None)
+                logger.info(f"Session expired: {session_id}")
+            logger.info(f"Queues: {self.metrics()}")
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Queue depths of the server
+
+        :return: the broker and scheduler metrics, and the number of open streams
+        :rtype: Dict[str, Any]
+        """
+        return {
+            "broker": self.broker.metrics(),
+            "scheduler": self.scheduler.metrics(),
+            "streams": sum(self.active_streams.values()),
+        }
+
+    @staticmethod
+    def _parse_run_request(request):
+        instance = request.message
+        candidate = request.candidate
+
+        if candidate:
+            if instance.startswith(IMAGE_SIGNATURE):
+                instance = Image.open(
+                    io.BytesIO(base64.b64decode(instance[len(IMAGE_SIGNATURE) :]))
+                )
+        else:
+            if IMAGE_SIGNATURE in instance:
+                prompt, img = instance.split(IMAGE_SIGNATURE)
+                img = Image.open(io.BytesIO(base64.b64decode(img)))
+                instance = (img, prompt)
+
+        if candidate:
+            return RankedQuery(prompt=instance, candidates=candidate.split("|||"))
+        return CompletionQuery(instance)
+
+    @staticmethod
+    def _to_run_response(response, protocol_version=PROTOCOL_VERSION):
+        if not isinstance(response, (CompletionResponse, RankedResponse)):
+            logger.error(f"Response type {type(response)} not supported")
+            raise ValueError("Response type not supported")
+        ranked = isinstance(response, RankedResponse)
+        embedding_key = "embeddings" if ranked else "embedding"
+        if protocol_version < 2:
+            return query_pb2.RunResponse(
+                message=response.prediction,
+                ranked=ranked,
+                logit=str(response.logits) if ranked else None,
+                embedding=tensor_to_bytes(response[embedding_key]),
+            )
+        embedding_tensor = tensor_to_proto(response[embedding_key])
+        if (
+            protocol_version >= 3
+            and ranked
+            and isinstance(response.logits, dict)
+            and len(response.logits) > 0
+        ):
+            # candidates, logits and scores as aligned packed arrays
+            candidates = list(response.logits.keys())
+            scores = response.scores
+            if not (
+                isinstance(scores, dict) and scores.keys() == response.logits.keys()
+            ):
+                # the client computes the softmax of the logits instead
+                scores = None
+            return query_pb2.RunResponse(
+                message=response.prediction,
+                ranked=True,
+                success=True,
+                candidates=candidates,
+                logits=[float(logit) for logit in response.logits.values()],
+                scores=(
+                    None
+                    if scores is None
+                    else [float(scores[candidate]) for candidate in candidates]
+                ),
+                embedding_tensor=embedding_tensor,
+            )
+        # the response travels as one binary record, the embedding as a raw tensor buffer
+        record = type(response)(**{**response, embedding_key: None}).to_bytes()
+        return query_pb2.RunResponse(
+            message=response.prediction,
+            ranked=ranked,
+            success=True,
+            response=record,
+            embedding_tensor=embedding_tensor,
+        )
 
-        self.broker.subscribe("encode_queries", session_id)
-        self.broker.subscribe("encode_responses", session_id)
+    async def Encode(self, request_iterator, context):
+        session_id = await self._open_stream(context)
 
         datasets = []
         reduction = None
         kwargs = {}
 
-        async for request in request_iterator:
-            instance = request.message
-            reduction = request.reduction
-            request_kwargs = request.kwargs
+        protocol_version = self.protocol_versions.get(session_id, 1)
+        try:
+            async for request in request_iterator:
+                instance = request.message
+                reduction = request.reduction
+                request_kwargs = request.kwargs
 
-            if request_kwargs:
-                kwargs.update(json.loads(request_kwargs))
+                if request_kwargs:
+                    kwargs.update(json.loads(request_kwargs))
 
-            datasets.append(instance)
-            message = Message("encode_queries", instance, session_id)
-            await self.broker.publish(message)
+                datasets.append(instance)
 
-        logger.info(
-            f"Received {len(datasets)} queries for embeddings from session {session_id}"
-        )
+            logger.info(
+                f"Received {len(datasets)} queries for embeddings from session {session_id}"
+            )
 
-        responses = await self._process_encoding(datasets, reduction, kwargs)
+            responses = self._process_encoding(
+                datasets, reduction, kwargs, protocol_version
+            )
 
-        async for response in responses:
-            yield response
+            async for response in responses:
+                yield response
+        finally:
+            self._close_stream(session_id)
 
-    async def _process_encoding(self, datasets, reduction, kwargs):
+    async def _process_encoding(
+        self, datasets, reduction, kwargs, protocol_version=PROTOCOL_VERSION
+    ):
         responses = self.model.encode(datasets, reduction=reduction, **kwargs)
-        async for response in tqdm(responses):
-            yield query_pb2.EncodeResponse(
-                success=True, embedding=tensor_to_bytes(response)
-            )
+        for response in tqdm(responses):
+            if protocol_version < 2:
+                yield query_pb2.EncodeResponse(
+                    success=True, embedding=tensor_to_bytes(response)
+                )
+            else:
+                yield query_pb2.EncodeResponse(
+                    success=True, tensor=tensor_to_proto(response)
+                )
 
     def serve(self, credentials):
         server = grpc.aio.server()
@@ -163,6 +346,8 @@ class gRPCServer(query_pb2_grpc.QueryServiceServicer):
             server.add_insecure_port(f"[::]:{self.port}")
 
         async def start_server():
+            self.scheduler.start()
+            self._collector = asyncio.ensure_future(self._collect_sessions())
             await server.start()
             hostname = socket.gethostname()
             logger.info(f"gRPC server starting at {hostname}:{self.port}")
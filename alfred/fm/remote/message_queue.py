@@ -1,33 +1,124 @@
 import asyncio
+import time
 import uuid
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Iterable, Optional
 
 
 class Message:
-    def __init__(self, topic: str, content: Any, session_id: str):
+    def __init__(
+        self,
+        topic: str,
+        content: Any,
+        session_id: str,
+        reply_to: Optional[asyncio.Queue] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+    ):
         self.id = str(uuid.uuid4())
         self.topic = topic
         self.content = content
         self.session_id = session_id
+        # where the consumer of the message sends its reply, e.g. the responses of a Run call
+        self.reply_to = reply_to
+        self.metadata = metadata or {}
 
 
 class Topic:
-    def __init__(self, name: str):
+    def __init__(self, name: str, maxsize: int = 0):
         self.name = name
-        self.messages = asyncio.Queue()
+        # only holds messages once a consumer has claimed the topic,
+        # publishers then wait for the consumer while it is full
+        self.messages = asyncio.Queue(maxsize)
         self.subscribers: List[str] = []
+        self.consumed = False
+        self.num_published = 0
 
 
 class MessageBroker:
-    def __init__(self):
+    def __init__(self, max_topic_size: int = 1024, max_session_size: int = 1024):
+        """
+        Initialize the message broker
+
+        :param max_topic_size: (optional) the maximum number of messages a consumed topic holds
+                               before publishing to it waits, defaults to 1024
+        :type max_topic_size: int
+        :param max_session_size: (optional) the maximum number of messages a session queue holds,
+                                 the oldest ones are dropped beyond, defaults to 1024
+        :type max_session_size: int
+        """
+        self.max_topic_size = max_topic_size
+        self.max_session_size = max_session_size
         self.topics: Dict[str, Topic] = {}
         self.sessions: Dict[str, asyncio.Queue] = {}
+        self.last_seen: Dict[str, float] = {}
+        self.num_dropped = 0
 
     def create_topic(self, topic_name: str) -> Topic:
         if topic_name not in self.topics:
-            self.topics[topic_name] = Topic(topic_name)
+            self.topics[topic_name] = Topic(topic_name, self.max_topic_size)
         return self.topics[topic_name]
 
+    def consume_topic(self, topic_name: str) -> Topic:
+        """
+        Claim a topic for a consumer: its messages are queued from now on
+
+        :param topic_name: the name of the topic
+        :type topic_name: str
+        :return: the topic, whose `messages` queue the consumer drains
+        :rtype: Topic
+        """
+        topic = self.create_topic(topic_name)
+        topic.consumed = True
+        return topic
+
+    def open_session(self, session_id: str) -> asyncio.Queue:
+        if session_id not in self.sessions:
+            self.sessions[session_id] = asyncio.Queue(self.max_session_size)
+        self.touch(session_id)
+        return self.sessions[session_id]
+
+    def touch(self, session_id: str) -> bool:
+        """
+        Mark a session as active now
+
+        :param session_id: the session id
+        :type session_id: str
+        :return: whether the session is open
+        :rtype: bool
+        """
+        if session_id not in self.sessions:
+            return False
+        self.last_seen[session_id] = time.monotonic()
+        return True
+
+    def close_session(self, session_id: str):
+        self.sessions.pop(session_id, None)
+        self.last_seen.pop(session_id, None)
+        for topic in self.topics.values():
+            if session_id in topic.subscribers:
+                topic.subscribers.remove(session_id)
+
+    def expire_sessions(self, ttl: float, active: Iterable[str] = ()) -> List[str]:
+        """
+        Close the sessions that have not been active for `ttl` seconds
+
+        :param ttl: the time to live of an inactive session in seconds
+        :type ttl: float
+        :param active: (optional) the sessions to keep regardless, e.g. those with open streams
+        :type active: Iterable[str]
+        :return: the ids of the closed sessions
+        :rtype: List[str]
+        """
+        active = set(active)
+        deadline = time.monotonic() - ttl
+        expired = [
+            session_id
+            for session_id, last_seen in self.last_seen.items()
+            if last_seen < deadline and session_id not in active
+        ]
+        for session_id in expired:
+            self.close_session(session_id)
+        return expired
+
     def subscribe(self, topic_name: str, session_id: str):
         topic = self.create_topic(topic_name)
         if session_id not in topic.subscribers:
@@ -35,12 +126,42 @@ class MessageBroker:
 
     async def publish(self, message: Message):
         topic = self.create_topic(message.topic)
-        await topic.messages.put(message)
+        if topic.consumed:
+            await topic.messages.put(message)
+        topic.num_published += 1
         for session_id in topic.subscribers:
-            if session_id in self.sessions:
-                await self.sessions[session_id].put(message)
+            queue = self.sessions.get(session_id)
+            if queue is None:
+                continue
+            if queue.full():
+                # a session that does not keep up must not stall the publishers
+                queue.get_nowait()
+                self.num_dropped += 1
+            queue.put_nowait(message)
 
     async def consume(self, session_id: str):
-        if session_id not in self.sessions:
-            self.sessions[session_id] = asyncio.Queue()
-        return await self.sessions[session_id].get()
+        queue = self.open_session(session_id)
+        return await queue.get()
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Queue depths of the broker
+
+        :return: the depth and capacity of each topic and the number of messages published to it,
+                 the number of sessions, the total depth of their queues,
+                 and the number of session messages dropped
+        :rtype: Dict[str, Any]
+        """
+        return {
+            "topics": {
+                name: {
+                    "depth": topic.messages.qsize(),
+                    "maxsize": topic.messages.maxsize,
+                    "published": topic.num_published,
+                }
+                for name, topic in self.topics.items()
+            },
+            "sessions": len(self.sessions),
+            "session_depth": sum(queue.qsize() for queue in self.sessions.values()),
+            "dropped": self.num_dropped,
+        }
@@ -0,0 +1,272 @@
+import asyncio
+import functools
+import itertools
+import json
+import logging
+import weakref
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Hashable, List, Optional
+
+from ..query import RankedQuery
+from .message_queue import Message, MessageBroker
+
+logger = logging.getLogger(__name__)
+
+
+class BatchScheduler:
+    """
+    Continuous batching scheduler of a model server
+
+    The scheduler consumes the queries published to the broker's query topic by every session
+    and merges them into shared `model.run` calls of at most `max_batch_size` queries,
+    so that concurrent sessions fill the same batches instead of contending for the model.
+    The model's own DynamicBatcher then splits each call by sequence length as usual.
+
+    Only queries that can run in one call are merged: the same run arguments, and for ranked
+    queries the same candidates. The group holding the oldest pending query runs first, and
+    within a group the sessions take turns, one query each, so that a large job of one session
+    cannot starve the other sessions. Every response is sent back to the `reply_to` queue of
+    its query message as a (request_id, response) pair, and the error of a failed batch only
+    to the sessions whose queries fail on their own.
+
+    At most `max_pending` queries are taken off the bounded topic queue ahead of the model,
+    beyond that the publishers wait, which holds back the request streams.
+
+    e.g.
+        scheduler = BatchScheduler(model, broker)
+        scheduler.start()
+        await broker.publish(Message("queries", query, session_id, reply_to=replies,
+                                     metadata={"request_id": 0, "kwargs": {}}))
+        request_id, response = await replies.get()
+    """
+
+    def __init__(
+        self,
+        model: Any,
+        broker: MessageBroker,
+        max_batch_size: int = 64,
+        max_wait_ms: float = 10.0,
+        max_pending: int = 1024,
+        topic: str = "queries",
+    ):
+        """
+        Initialize the scheduler
+
+        :param model: the model (or client) whose `run(queries, **kwargs)` is called on each batch
+        :param broker: the message broker the queries are published to
+        :type broker: MessageBroker
+        :param max_batch_size: (optional) the maximum number of queries per batch, defaults to 64
+        :type max_batch_size: int
+        :param max_wait_ms: (optional) the maximum time to wait for a batch to fill
+                            after its first query arrived, defaults to 10ms
+        :type max_wait_ms: float
+        :param max_pending: (optional) the maximum number of queries waiting for a batch,
+                            defaults to 1024
+        :type max_pending: int
+        :param topic: (optional) the topic to consume the queries from, defaults to "queries"
+        :type topic: str
+        """
+        self.model = model
+        self.broker = broker
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.max_pending = max(max_pending, max_batch_size)
+        self.topic = topic
+        # claimed right away so that no query published before `start` is lost
+        self._queue = broker.consume_topic(topic).messages
+        # batch key -> session id -> pending (sequence number, message)
+        self._pending: Dict[Hashable, "OrderedDict[str, Deque]"] = {}
+        self._num_pending = 0
+        self._sequence = itertools.count()
+        # reply queues of Run calls that ended before all their queries ran
+        self._discarded = weakref.WeakSet()
+        self.num_batches = 0
+        self.num_queries = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _batch_key(message: Message) -> Hashable:
+        """
+        Key of the queries that can run in the same model call
+
+        :param message: the query message
+        :type message: Message
+        :return: the run arguments, and the candidates of ranked queries
+        :rtype: Hashable
+        """
+        kwargs = json.dumps(message.metadata.get("kwargs", {}), sort_keys=True)
+        query = message.content
+        if isinstance(query, RankedQuery):
+            return kwargs, tuple(query.candidates)
+        return kwargs, None
+
+    def _enqueue(self, message: Message):
+        """add a query message to the pending queries of its group and session"""
+        if message.reply_to is not None and message.reply_to in self._discarded:
+            return
+        sessions = self._pending.setdefault(self._batch_key(message), OrderedDict())
+        sessions.setdefault(message.session_id, deque()).append(
+            (next(self._sequence), message)
+        )
+        self._num_pending += 1
+
+    def _next_batch(self) -> List[Message]:
+        """
+        Take the next batch off the pending queries: from the group holding the oldest query,
+        one query per session in turn until the batch is full
+
+        :return: the query messages of the batch
+        :rtype: List[Message]
+        """
+        key = min(
+            self._pending,
+            key=lambda k: min(queue[0][0] for queue in self._pending[k].values()),
+        )
+        sessions = self._pending[key]
+        batch = []
+        while sessions and len(batch) < self.max_batch_size:
+            for session_id in list(sessions):
+                queue = sessions[session_id]
+                batch.append(queue.popleft()[1])
+                if not queue:
+                    del sessions[session_id]
+                else:
+                    # the next batch starts with the sessions that were not served last
+                    sessions.move_to_end(session_id)
+                if len(batch) == self.max_batch_size:
+                    break
+        if not sessions:
+            del self._pending[key]
+        self._num_pending -= len(batch)
+        return batch
+
+    async def _collect(self, queue: asyncio.Queue):
+        """
+        Wait for pending queries: block until a query arrives if there are none,
+        then keep collecting until a batch is full or `max_wait_ms` has passed
+        """
+        loop = asyncio.get_running_loop()
+        if self._num_pending == 0:
+            self._enqueue(await queue.get())
+        deadline = loop.time() + self.max_wait_ms / 1000
+        while self._num_pending < self.max_batch_size:
+            timeout = deadline - loop.time()
+            try:
+                if timeout > 0:
+                    message = await asyncio.wait_for(queue.get(), timeout)
+                else:
+                    message = queue.get_nowait()
+            except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                break
+            self._enqueue(message)
+        # what is already queued competes for the next batch, up to `max_pending` queries
+        while not queue.empty() and self._num_pending < self.max_pending:
+            self._enqueue(queue.get_nowait())
+
+    def discard(self, reply_to: asyncio.Queue):
+        """
+        Drop the pending queries of a Run call that ended early, e.g. because the client disconnected
+
+        :param reply_to: the reply queue of the Run call
+        :type reply_to: asyncio.Queue
+        """
+        self._discarded.add(reply_to)
+        for key in list(self._pending):
+            sessions = self._pending[key]
+            for session_id in list(sessions):
+                queue = sessions[session_id]
+                kept = deque(item for item in queue if item[1].reply_to is not reply_to)
+                self._num_pending -= len(queue) - len(kept)
+                if kept:
+                    sessions[session_id] = kept
+                else:
+                    del sessions[session_id]
+            if not sessions:
+                del self._pending[key]
+
+    def metrics(self) -> Dict[str, int]:
+        """
+        Queue depth of the scheduler
+
+        :return: the number of pending queries, and the number of batches and queries run
+        :rtype: Dict[str, int]
+        """
+        return {
+            "pending": self._num_pending,
+            "batches": self.num_batches,
+            "queries": self.num_queries,
+        }
+
+    async def _run_batch(self, batch: List[Message]):
+        """
+        Run a batch on the model and send every response back to its query's reply queue
+
+        If the merged batch fails, its queries are run again session by session,
+        so that the error only reaches the sessions whose queries fail on their own.
+        """
+        self.num_batches += 1
+        self.num_queries += len(batch)
+        kwargs = batch[0].metadata.get("kwargs", {})
+        sessions = OrderedDict()
+        for message in batch:
+            sessions.setdefault(message.session_id, []).append(message)
+        logger.info(
+            f"Running a batch of {len(batch)} queries from {len(sessions)} sessions"
+        )
+        try:
+            responses = await self._run_queries(batch, kwargs)
+        except Exception as e:
+            logger.error(f"Batch of {len(batch)} queries failed: {e}")
+            if len(sessions) == 1:
+                responses = [e] * len(batch)
+            else:
+                batch, responses = [], []
+                for session_id, messages in sessions.items():
+                    try:
+                        session_responses = await self._run_queries(messages, kwargs)
+                    except Exception as e:
+                        logger.error(
+                            f"{len(messages)} queries of session {session_id} failed: {e}"
+                        )
+                        session_responses = [e] * len(messages)
+                    batch += messages
+                    responses += session_responses
+        for message, response in zip(batch, responses):
+            await message.reply_to.put((message.metadata["request_id"], response))
+
+    async def _run_queries(self, messages: List[Message], kwargs: Dict) -> List:
+        """
+        Run the queries of some messages in one model call
+
+        :param messages: the query messages
+        :type messages: List[Message]
+        :param kwargs: the run arguments
+        :type kwargs: Dict
+        :return: the responses, in the order of the messages
+        :rtype: List
+        """
+        loop = asyncio.get_running_loop()
+        queries = [message.content for message in messages]
+        # the model runs in a worker thread so that queries keep being received
+        responses = await loop.run_in_executor(
+            None, functools.partial(self.model.run, queries, **kwargs)
+        )
+        return responses if isinstance(responses, list) else [responses]
+
+    async def _loop(self):
+        """schedule batches until the scheduler is stopped"""
+        while True:
+            await self._collect(self._queue)
+            if self._num_pending > 0:
+                await self._run_batch(self._next_batch())
+
+    def start(self):
+        """start scheduling on the running event loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._loop())
+
+    def stop(self):
+        """stop scheduling, the pending queries are kept"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
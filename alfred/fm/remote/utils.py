@@ -2,11 +2,20 @@ import io
 import logging
 import socket
 import urllib.request
+import warnings
+from typing import Optional, Union
 
+import numpy as np
 import torch
 
+from .protos import query_pb2
+
 logger = logging.getLogger(__name__)
 
+# protocol version 2 frames tensors as raw buffers (query_pb2.Tensor) instead of torch.save archives,
+# version 3 sends ranked candidates, logits and scores as repeated fields instead of str(logits)
+PROTOCOL_VERSION = 3
+
 
 def get_ip(ipv4=True):
     """
@@ -56,3 +65,56 @@ def bytes_to_tensor(bytes):
         return res
     except Exception as e:
         return None
+
+
+def tensor_to_proto(
+    tensor: Optional[Union[torch.Tensor, np.ndarray]],
+) -> Optional[query_pb2.Tensor]:
+    """
+    Frames a tensor as its raw buffer with its dtype and shape.
+    The buffer is in native byte order, i.e. little-endian on the platforms torch supports.
+
+    :param tensor: The tensor (or numpy array) to frame.
+    :type tensor: Union[torch.Tensor, np.ndarray]
+    :return: The tensor message, None if there is no tensor.
+    :rtype: query_pb2.Tensor
+    """
+    if tensor is None:
+        return None
+    if isinstance(tensor, np.ndarray):
+        tensor = torch.from_numpy(tensor)
+    tensor = tensor.detach().cpu().contiguous()
+    # bfloat16 has no numpy counterpart, its bytes are read through an int16 view
+    data = tensor.view(-1).view(
+        torch.int16 if tensor.dtype == torch.bfloat16 else tensor.dtype
+    )
+    return query_pb2.Tensor(
+        data=data.numpy().tobytes(),
+        dtype=str(tensor.dtype).replace("torch.", ""),
+        shape=tensor.shape,
+    )
+
+
+def proto_to_tensor(message: query_pb2.Tensor) -> torch.Tensor:
+    """
+    Decodes a tensor framed by `tensor_to_proto` without copying its buffer.
+    The tensor is a read-only view of the message's bytes, clone it before writing to it.
+
+    :param message: The tensor message.
+    :type message: query_pb2.Tensor
+    :return: The tensor.
+    :rtype: torch.Tensor
+    """
+    dtype = getattr(torch, message.dtype, None)
+    if not isinstance(dtype, torch.dtype):
+        logger.error(f"Unsupported tensor dtype: {message.dtype}")
+        raise ValueError(f"Unsupported tensor dtype: {message.dtype}")
+    shape = tuple(message.shape)
+    if len(message.data) == 0:
+        return torch.empty(shape, dtype=dtype)
+    with warnings.catch_warnings():
+        # the tensor is a read-only view of the received message on purpose
+        warnings.filterwarnings(
+            "ignore", message="The given buffer is not writable", category=UserWarning
+        )
+        return torch.frombuffer(message.data, dtype=dtype).reshape(shape)
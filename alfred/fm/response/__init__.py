@@ -1,6 +1,8 @@
 import json
 from ast import literal_eval
+from typing import Union
 
+from .codec import decode, is_encoded
 from .completion_response import CompletionResponse
 from .ranked_response import RankedResponse
 from .response import Response
@@ -22,15 +24,19 @@ def from_dict(json_dict: dict) -> Response:
     )
 
 
-def deserialize(json_str: str) -> Response:
+def deserialize(json_str: Union[str, bytes]) -> Response:
     """
-    Deserializes a JSON string into a Response object.
+    Deserializes a binary record (see `Response.to_bytes`) or a JSON string into a Response object.
 
-    :param json_str:  The JSON string to deserialize.
-    :type json_str: str
+    :param json_str:  The binary record or JSON string to deserialize.
+    :type json_str: Union[str, bytes]
     :return: The Response object.
     :rtype: Response
     """
+    if is_encoded(json_str):
+        return decode(json_str)
+    if not isinstance(json_str, str):
+        json_str = bytes(json_str).decode("utf-8")
 
     def dict_clean(it):
         """
@@ -0,0 +1,201 @@
+"""
+Compact binary codec for responses, used by the caches and the gRPC layer.
+
+A record is the magic bytes, a version byte, a response kind byte, and the response's
+(key, value) fields. Every value is prefixed with a one-byte tag. Arrays and tensors are
+stored as their raw buffers with their dtype and shape, and float mappings such as
+scores and logits are stored as their keys followed by a raw float64 buffer.
+Numbers, numpy scalars included, are widened to float64: integers are read back as floats.
+Records never start with "{", so legacy JSON rows can still be told apart and read.
+"""
+
+import ast
+import logging
+import struct
+from typing import Any, Dict, List, Tuple, Union
+
+import numpy as np
+import torch
+
+from .completion_response import CompletionResponse
+from .ranked_response import RankedResponse
+from .response import Response
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"ALF"
+VERSION = 1
+
+KINDS = {CompletionResponse: 0, RankedResponse: 1}
+CLASSES = {kind: cls for cls, kind in KINDS.items()}
+
+NONE, FLOAT, STR, ARRAY, TENSOR, FLOAT_MAP, LITERAL = range(7)
+
+_U8 = struct.Struct("<B")
+_U32 = struct.Struct("<I")
+_F64 = struct.Struct("<d")
+_HEADER = struct.Struct(f"<{len(MAGIC)}sBBB")
+
+
+def _pack_str(value: str, out: List[bytes]):
+    """append a length-prefixed utf-8 string to the output"""
+    value = value.encode("utf-8")
+    out.append(_U32.pack(len(value)))
+    out.append(value)
+
+
+def _unpack_str(data: bytes, pos: int) -> Tuple[str, int]:
+    """read a length-prefixed utf-8 string, returns the string and the next position"""
+    (size,) = _U32.unpack_from(data, pos)
+    pos += _U32.size
+    return str(data[pos : pos + size], "utf-8"), pos + size
+
+
+def _pack_array(array: np.ndarray, out: List[bytes]):
+    """append the dtype, shape and raw buffer of an array to the output"""
+    array = np.ascontiguousarray(array)
+    _pack_str(array.dtype.str, out)
+    out.append(struct.pack(f"<B{array.ndim}Q", array.ndim, *array.shape))
+    out.append(array.tobytes())
+
+
+def _unpack_array(data: bytes, pos: int) -> Tuple[np.ndarray, int]:
+    """read an array written by `_pack_array`, returns the array and the next position"""
+    dtype, pos = _unpack_str(data, pos)
+    dtype = np.dtype(dtype)
+    (ndim,) = _U8.unpack_from(data, pos)
+    shape = struct.unpack_from(f"<{ndim}Q", data, pos + _U8.size)
+    pos += _U8.size + 8 * ndim
+    count = int(np.prod(shape))
+    array = np.frombuffer(data, dtype=dtype, count=count, offset=pos).reshape(shape)
+    return array.copy(), pos + count * dtype.itemsize
+
+
+def _is_number(value: Any) -> bool:
+    """returns whether the value is a Python or numpy real number, booleans excluded"""
+    return isinstance(value, (float, int, np.integer, np.floating)) and not isinstance(
+        value, bool
+    )
+
+
+def _pack_value(value: Any, out: List[bytes]):
+    """append a tagged value to the output"""
+    if value is None:
+        out.append(_U8.pack(NONE))
+    elif _is_number(value):
+        out.append(_U8.pack(FLOAT))
+        out.append(_F64.pack(float(value)))
+    elif isinstance(value, str):
+        out.append(_U8.pack(STR))
+        _pack_str(value, out)
+    elif isinstance(value, torch.Tensor):
+        out.append(_U8.pack(TENSOR))
+        value = value.detach().cpu()
+        if value.dtype == torch.bfloat16:
+            # numpy has no bfloat16
+            value = value.float()
+        _pack_array(value.numpy(), out)
+    elif isinstance(value, np.ndarray):
+        out.append(_U8.pack(ARRAY))
+        _pack_array(value, out)
+    elif (
+        isinstance(value, dict)
+        and all(isinstance(key, str) for key in value.keys())
+        and all(_is_number(v) for v in value.values())
+    ):
+        out.append(_U8.pack(FLOAT_MAP) + _U32.pack(len(value)))
+        for key in value.keys():
+            _pack_str(key, out)
+        out.append(np.fromiter(value.values(), dtype="<f8", count=len(value)).tobytes())
+    else:
+        # anything else is stored as a literal, as the JSON serialization does
+        out.append(_U8.pack(LITERAL))
+        _pack_str(repr(value), out)
+
+
+def _unpack_value(data: bytes, pos: int) -> Tuple[Any, int]:
+    """read a tagged value, returns the value and the next position"""
+    (tag,) = _U8.unpack_from(data, pos)
+    pos += _U8.size
+    if tag == NONE:
+        return None, pos
+    if tag == FLOAT:
+        return _F64.unpack_from(data, pos)[0], pos + _F64.size
+    if tag == STR:
+        return _unpack_str(data, pos)
+    if tag == ARRAY:
+        return _unpack_array(data, pos)
+    if tag == TENSOR:
+        array, pos = _unpack_array(data, pos)
+        return torch.from_numpy(array), pos
+    if tag == FLOAT_MAP:
+        (size,) = _U32.unpack_from(data, pos)
+        pos += _U32.size
+        keys = []
+        for _ in range(size):
+            key, pos = _unpack_str(data, pos)
+            keys.append(key)
+        values = np.frombuffer(data, dtype="<f8", count=size, offset=pos).tolist()
+        return dict(zip(keys, values)), pos + 8 * size
+    if tag == LITERAL:
+        value, pos = _unpack_str(data, pos)
+        try:
+            return ast.literal_eval(value), pos
+        except (SyntaxError, ValueError):
+            return value, pos
+    logger.error(f"Unknown value tag {tag} in response record")
+    raise ValueError(f"Unknown value tag {tag} in response record")
+
+
+def is_encoded(data: Union[bytes, bytearray, memoryview, str]) -> bool:
+    """returns whether the data is a binary response record (and not legacy JSON)"""
+    return not isinstance(data, str) and bytes(data[: len(MAGIC)]) == MAGIC
+
+
+def encode(response: Response) -> bytes:
+    """
+    Encode a response into a compact binary record.
+
+    :param response: The response to encode.
+    :type response: Response
+    :return: The binary record.
+    :rtype: bytes
+    """
+    kind = KINDS.get(type(response))
+    if kind is None:
+        logger.error(f"Response type {type(response)} not supported")
+        raise ValueError(f"Response type {type(response)} not supported")
+    out = [_HEADER.pack(MAGIC, VERSION, kind, len(response))]
+    for key, value in response.items():
+        _pack_str(key, out)
+        _pack_value(value, out)
+    return b"".join(out)
+
+
+def decode(data: Union[bytes, bytearray, memoryview]) -> Response:
+    """
+    Decode a binary record written by `encode` into a response.
+
+    :param data: The binary record.
+    :type data: Union[bytes, bytearray, memoryview]
+    :return: The response.
+    :rtype: Response
+    """
+    magic, version, kind, num_fields = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        logger.error("Data is not a binary response record")
+        raise ValueError("Data is not a binary response record")
+    if version > VERSION or kind not in CLASSES:
+        logger.error(
+            f"Unsupported response record (version {version}, kind {kind}), "
+            f"this version of alfred reads up to version {VERSION}"
+        )
+        raise ValueError(
+            f"Unsupported response record (version {version}, kind {kind})"
+        )
+    pos = _HEADER.size
+    fields: Dict[str, Any] = {}
+    for _ in range(num_fields):
+        key, pos = _unpack_str(data, pos)
+        fields[key], pos = _unpack_value(data, pos)
+    return CLASSES[kind](**fields)
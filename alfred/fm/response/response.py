@@ -28,6 +28,18 @@ class Response(OrderedDict):
         """
         return json.dumps({k: str(v) for k, v in self.items()}, indent=2)
 
+    def to_bytes(self) -> bytes:
+        """
+        Serialize the response to a compact, versioned binary record.
+        Arrays and tensors are kept as raw buffers, unlike in the JSON string.
+
+        :returns: The serialized response as bytes
+        :rtype: bytes
+        """
+        from .codec import encode
+
+        return encode(self)
+
     def __str__(self):
         """
         Get a string representation of the response.
@@ -1,7 +1,11 @@
 import base64
 import gc
 import logging
+import random
+import threading
 from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from typing import List, Union, Optional, Callable
 import io
 
@@ -74,7 +78,9 @@ def reorder_array(
     """
     Recover an array according to a given order index.
 
-    This function reorders the elements in an array according to the order specified by a separate array.
+    This function reorders the elements in an array according to the order specified by a separate array:
+    element `arr[i]` is moved to position `order[i]`, where `order` is a permutation of `range(len(arr))`.
+    The reordering is a single O(n) scatter; lists are gathered through the inverse permutation.
 
     :param arr: The array to be reordered. Can be a NumPy array, PyTorch tensor, or Python list.
     :type arr: Union[np.ndarray, torch.Tensor, list]
@@ -83,7 +89,20 @@ def reorder_array(
     :return: The reordered array. Has the same type as the input `arr`.
     :rtype: Union[np.ndarray, torch.Tensor, list]
     """
-    return [x[0] for x in sorted(list(zip(arr, order)), key=lambda x: x[1])]
+    if isinstance(arr, torch.Tensor):
+        reordered = torch.empty_like(arr)
+        reordered[torch.as_tensor(order, dtype=torch.long, device=arr.device)] = arr
+        return reordered
+
+    order = order.cpu().numpy() if isinstance(order, torch.Tensor) else order
+    if isinstance(arr, np.ndarray):
+        reordered = np.empty_like(arr)
+        reordered[np.asarray(order, dtype=np.int64)] = arr
+        return reordered
+
+    inverse = np.empty(len(arr), dtype=np.int64)
+    inverse[np.asarray(order, dtype=np.int64)] = np.arange(len(arr))
+    return list(map(arr.__getitem__, inverse.tolist()))
 
 
 def tokenize(inst, tokenizer, max_length=512):
@@ -178,18 +197,177 @@ def type_print(string, interval=0.07, newline=False):
         print("")
 
 
-def retry(num_retries=3, wait_time=0.1, exceptions=(Exception,)):
+def is_rate_limit_error(exception: Exception) -> bool:
+    """
+    Check whether an exception raised by an API client signals a rate limit (HTTP 429).
+
+    :param exception: The exception raised by the API client
+    :type exception: Exception
+    :return: True if the request was rejected because of a rate limit
+    :rtype: bool
+    """
+    response = getattr(exception, "response", None)
+    for status in (
+        getattr(exception, "status_code", None),
+        getattr(exception, "code", None),
+        getattr(response, "status_code", None),
+    ):
+        if status == 429:
+            return True
+    name = type(exception).__name__
+    return "RateLimit" in name or name == "ResourceExhausted"
+
+
+def retry_delay(
+    exception: Exception,
+    attempt: int,
+    wait_time: float = 0.1,
+    max_wait_time: float = 60.0,
+) -> float:
+    """
+    Compute how long to wait before retrying a failed API request.
+
+    The Retry-After (or retry-after-ms) header of the response is honored when present,
+    otherwise the delay grows exponentially with the attempt number, with jitter so that
+    concurrent workers do not retry in lockstep.
+
+    :param exception: The exception raised by the failed request
+    :type exception: Exception
+    :param attempt: The number of the failed attempt, starting at 0
+    :type attempt: int
+    :param wait_time: The base wait time in seconds
+    :type wait_time: float
+    :param max_wait_time: The maximum wait time in seconds
+    :type max_wait_time: float
+    :return: The number of seconds to wait
+    :rtype: float
+    """
+    headers = getattr(getattr(exception, "response", None), "headers", None) or {}
+    for header, scale in (("retry-after-ms", 1e-3), ("retry-after", 1.0)):
+        value = headers.get(header)
+        if value is None:
+            continue
+        try:
+            return min(max(float(value) * scale, 0.0), max_wait_time)
+        except ValueError:
+            try:
+                retry_at = parsedate_to_datetime(value)
+            except (TypeError, ValueError):
+                continue
+            delay = (retry_at - datetime.now(timezone.utc)).total_seconds()
+            return min(max(delay, 0.0), max_wait_time)
+    return min(wait_time * 2**attempt, max_wait_time) * random.uniform(0.5, 1.0)
+
+
+class RateLimiter:
+    """
+    Thread-safe token-bucket rate limiter for API-based models.
+
+    Requests and tokens are drawn from two buckets refilled continuously at
+    `requests_per_minute` and `tokens_per_minute`; a limit of None disables that bucket.
+    All workers of a model share one limiter, so a rate-limit response reported through
+    `pause` holds back every worker until the provider accepts requests again.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+    ):
+        """
+        :param requests_per_minute: The maximum number of requests per minute
+        :type requests_per_minute: Optional[float]
+        :param tokens_per_minute: The maximum number of tokens per minute
+        :type tokens_per_minute: Optional[float]
+        """
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = float(requests_per_minute or 0)
+        self._tokens = float(tokens_per_minute or 0)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens: float) -> float:
+        """
+        Refill the buckets and take one request and `tokens` tokens from them if available.
+        Must be called with the lock held.
+
+        :param tokens: The number of tokens the request is expected to use
+        :type tokens: float
+        :return: 0 if the request was admitted, otherwise the number of seconds to wait
+        :rtype: float
+        """
+        now = time.monotonic()
+        elapsed, self._updated = now - self._updated, now
+        if self._paused_until > now:
+            return self._paused_until - now
+
+        wait = 0.0
+        if self.requests_per_minute:
+            rate = self.requests_per_minute / 60
+            self._requests = min(
+                self._requests + elapsed * rate, float(self.requests_per_minute)
+            )
+            wait = max(wait, (1 - self._requests) / rate)
+        if self.tokens_per_minute:
+            rate = self.tokens_per_minute / 60
+            tokens = min(tokens, self.tokens_per_minute)
+            self._tokens = min(
+                self._tokens + elapsed * rate, float(self.tokens_per_minute)
+            )
+            wait = max(wait, (tokens - self._tokens) / rate)
+        if wait > 0:
+            return wait
+
+        self._requests -= 1
+        self._tokens -= tokens
+        return 0.0
+
+    def acquire(self, tokens: float = 0):
+        """
+        Block until one request using `tokens` tokens can be sent within the limits.
+
+        :param tokens: The number of tokens the request is expected to use
+        :type tokens: float
+        """
+        while True:
+            with self._lock:
+                wait = self._reserve(tokens)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """
+        Hold back all requests for `seconds` seconds, e.g. after a rate-limit response.
+
+        :param seconds: The number of seconds to pause for
+        :type seconds: float
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+def retry(num_retries=3, wait_time=0.1, exceptions=(Exception,), max_wait_time=60.0):
     """
     A decorator to retry a function call if it raises an exception.
 
     Useful for running API-based models that may fail due to network/server issues.
+    Retries back off exponentially with jitter from `wait_time`, or wait as long as the
+    Retry-After header of the failed response asks for.
+    If the decorated method belongs to a model with a `rate_limiter`, rate-limit errors
+    are raised right away and retried by the model's `_rate_limited_call` instead, which
+    pauses the shared limiter so that all workers back off together.
 
     :param num_retries: The number of retries
     :type num_retries: int
-    :param wait_time: The time to wait between retries
+    :param wait_time: The base time to wait between retries
     :type wait_time: float
     :param exceptions: The exceptions to catch
     :type exceptions: Tuple[Exception]
+    :param max_wait_time: The maximum time to wait between retries
+    :type max_wait_time: float
     :return: The decorated function
     :rtype: Callable
     """
@@ -201,8 +379,12 @@ def retry(num_retries=3, wait_time=0.1, exceptions=(Exception,)):
                 try:
                     result = func(*args, **kwargs)
                 except exceptions as e:
+                    limiter = getattr(args[0], "rate_limiter", None) if args else None
+                    if isinstance(limiter, RateLimiter) and is_rate_limit_error(e):
+                        # left to the rate-limited call of the model, which pauses all workers
+                        raise e
                     if i < num_retries:
-                        time.sleep(wait_time)
+                        time.sleep(retry_delay(e, i, wait_time, max_wait_time))
                         continue
                     else:
                         raise e
@@ -338,6 +520,7 @@ class DynamicBatcher:
         :type max_batch_size: int
         """
         self.len_sorted_idx = None
+        self.batch_sizes = None
         self.queries = queries
         self.max_batch_size = max_batch_size
 
@@ -420,19 +603,23 @@ class DynamicBatcher:
         :rtype: List of responses
         """
 
+        if self.len_sorted_idx is None:
+            raise ValueError("Batching has not been performed yet")
         if len(inst) != len(self.len_sorted_idx):
-            if offset:
-                _inst = np.empty([len(inst)])
-                for idx, i in enumerate(
+            if offset is not None:
+                # a contiguous run of responses starting at position `offset` of the batched order,
+                # returned in the relative order of their original indices (ranked responses are not merged)
+                original_idx = np.asarray(
                     self.len_sorted_idx[offset : offset + len(inst)]
-                ):
-                    _inst[idx] = inst[i]
-                return list(_inst)
+                )
+                if len(original_idx) != len(inst):
+                    raise ValueError(
+                        f"Responses at offset {offset} exceed the sorted index of length {len(self.len_sorted_idx)}"
+                    )
+                return list(map(inst.__getitem__, np.argsort(original_idx).tolist()))
             raise ValueError(
                 f"Length of inst {len(inst)} does not match length of sorted index {len(self.len_sorted_idx)}"
             )
-        if self.len_sorted_idx is None:
-            raise ValueError("Batching has not been performed yet")
 
         reordered_inst = reorder_array(inst, self.len_sorted_idx)
 
@@ -499,6 +686,7 @@ class DynamicBatcher:
         )
 
         self.len_sorted_idx = inst_len_sorted_idx
+        self.batch_sizes = []
 
         curr_batch = []
         curr_max = -1
@@ -511,6 +699,7 @@ class DynamicBatcher:
             curr_max = max(curr_max, inst_len)
             new_sz = curr_max * curr_max * curr_batch_sz
             if new_sz >= self.limit_size or curr_batch_sz >= self.max_batch_size:
+                self.batch_sizes.append(len(curr_batch))
                 batches.append(_process_batch(curr_batch))
                 curr_batch = [curr_inst]
                 curr_max = inst_len
@@ -519,6 +708,7 @@ class DynamicBatcher:
                 curr_batch.append(curr_inst)
                 curr_batch_sz += 1
 
+        self.batch_sizes.append(len(curr_batch))
         batches.append(_process_batch(curr_batch))
 
         clear_cuda_cache()
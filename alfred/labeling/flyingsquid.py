@@ -1,4 +1,7 @@
+from typing import Union
+
 import numpy as np
+from scipy import sparse
 
 from .labelmodel import LabelModel
 
@@ -19,6 +22,7 @@ class FlyingSquid(LabelModel):
         super().__init__(trainable=True)
         self.model = FSLM(num_lfs)
 
-    def label(self, votes: np.ndarray) -> np.ndarray:
+    def label(self, votes: Union[np.ndarray, sparse.spmatrix]) -> np.ndarray:
+        votes = self._to_dense(votes)
         self.model.fit(votes)
         return self.model.predict(votes).flatten()
@@ -1,5 +1,8 @@
 import abc
-from typing import Optional, Dict
+from typing import Optional, Dict, Union
+
+import numpy as np
+from scipy import sparse
 
 
 class LabelModel:
@@ -24,6 +27,20 @@ class LabelModel:
         self._trainable = trainable
         self._trained = False
 
+    @staticmethod
+    def _to_dense(votes: Union[np.ndarray, sparse.spmatrix]) -> np.ndarray:
+        """
+        Densify a sparse vote matrix, for backing libraries that only take dense votes
+
+        :param votes: dense or sparse (e.g. CSR) vote matrix
+        :type votes: Union[np.ndarray, sparse.spmatrix]
+        :return: the dense vote matrix
+        :rtype: np.ndarray
+        """
+        if sparse.issparse(votes):
+            return votes.toarray()
+        return np.asarray(votes)
+
     @abc.abstractmethod
     def label(self, votes):
         pass
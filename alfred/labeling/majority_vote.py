@@ -1,5 +1,7 @@
+from typing import Iterator, Optional, Sequence, Tuple, Union
+
 import numpy as np
-from scipy import stats
+from scipy import sparse
 
 from .labelmodel import LabelModel
 
@@ -7,12 +9,176 @@ from .labelmodel import LabelModel
 class MajorityVote(LabelModel):
     """
     LabelModel class to perform majority vote on the responses
+
+    Votes are counted with a (weighted) bincount over chunks of rows, so the vote matrix
+    may be a dense array, a memory-mapped array with more rows than memory or a sparse (CSR) matrix.
+    Classes are 1-indexed and the abstention vote is not counted.
     """
 
-    def __init__(self):
-        """Constructor"""
+    TIE_BREAKS = ("smallest", "random", "abstain")
+
+    def __init__(
+        self,
+        num_classes: Optional[int] = None,
+        weights: Optional[Sequence[float]] = None,
+        abstention: int = 0,
+        tie_break: str = "smallest",
+        seed: Optional[int] = None,
+        chunk_size: int = 65536,
+    ):
+        """
+        Constructor
+
+        :param num_classes: (optional) number of classes, inferred from the largest vote if not given
+        :type num_classes: int
+        :param weights: (optional) one weight per labeling function (column), defaults to 1 for all
+        :type weights: Sequence[float]
+        :param abstention: (optional) the abstention vote, defaults to 0
+        :type abstention: int
+        :param tie_break: (optional) how ties are broken, one of
+                            "smallest": the smallest tied class (default)
+                            "random": uniformly among the tied classes
+                            "abstain": return the abstention vote
+        :type tie_break: str
+        :param seed: (optional) seed for random tie-breaking, random ties differ across calls if None
+        :type seed: int
+        :param chunk_size: (optional) number of rows voted at once, defaults to 65536
+        :type chunk_size: int
+        """
+        if tie_break not in self.TIE_BREAKS:
+            raise ValueError(
+                f"Unsupported tie_break: {tie_break}, choose from {self.TIE_BREAKS}"
+            )
         super().__init__()
+        self.num_classes = num_classes
+        self.weights = None if weights is None else np.asarray(weights, dtype=float)
+        self.abstention = abstention
+        self.tie_break = tie_break
+        self.seed = seed
+        self.chunk_size = chunk_size
+
+    def _chunks(
+        self, votes: Union[np.ndarray, sparse.spmatrix]
+    ) -> Iterator[Tuple[int, int, Union[np.ndarray, sparse.csr_matrix]]]:
+        """
+        Iterate over (start, end, chunk) row chunks of the vote matrix,
+        only one chunk of a memory-mapped vote matrix is read into memory at a time
+
+        :param votes: dense, memory-mapped or sparse vote matrix
+        :type votes: Union[np.ndarray, sparse.spmatrix]
+        :return: an iterator over the chunks
+        :rtype: Iterator[Tuple[int, int, Union[np.ndarray, sparse.csr_matrix]]]
+        """
+        if sparse.issparse(votes):
+            if self.abstention != 0:
+                raise ValueError("Sparse vote matrices require an abstention of 0")
+            votes = sparse.csr_matrix(votes)
+        for start in range(0, votes.shape[0], self.chunk_size):
+            end = min(start + self.chunk_size, votes.shape[0])
+            chunk = votes[start:end]
+            yield start, end, chunk if sparse.issparse(chunk) else np.asarray(chunk)
+
+    def _infer_num_classes(self, votes: Union[np.ndarray, sparse.spmatrix]) -> int:
+        """returns the number of classes, i.e. the largest vote, with a pass over the vote matrix"""
+        num_classes = 0
+        for _, _, chunk in self._chunks(votes):
+            if chunk.shape[0] > 0 and chunk.shape[1] > 0:
+                num_classes = max(num_classes, int(chunk.max()))
+        return num_classes
+
+    def _count(
+        self, chunk: Union[np.ndarray, sparse.csr_matrix], num_classes: int
+    ) -> np.ndarray:
+        """
+        (Weighted) vote counts of a chunk of rows
+
+        :param chunk: a chunk of the vote matrix
+        :type chunk: Union[np.ndarray, sparse.csr_matrix]
+        :param num_classes: number of classes
+        :type num_classes: int
+        :return: (n_rows, num_classes) vote counts
+        :rtype: np.ndarray
+        """
+        n_rows, n_cols = chunk.shape
+        if sparse.issparse(chunk):
+            codes = chunk.data.astype(np.int64)
+            rows = np.repeat(np.arange(n_rows), np.diff(chunk.indptr))
+            weights = None if self.weights is None else self.weights[chunk.indices]
+        else:
+            codes = chunk.astype(np.int64)
+            if self.abstention != 0:
+                # 0 is not a class, abstentions are counted as 0 instead
+                abstained = codes == self.abstention
+                codes[codes == 0] = -1
+                codes[abstained] = 0
+            rows = np.arange(n_rows)[:, None]
+            weights = (
+                None
+                if self.weights is None
+                else np.broadcast_to(self.weights, chunk.shape).ravel()
+            )
+        if codes.size > 0 and (codes.min() < 0 or codes.max() > num_classes):
+            raise ValueError(
+                f"Votes must be the abstention {self.abstention} or classes in [1, {num_classes}]"
+            )
+        # the abstentions are counted in an extra first column which is dropped
+        counts = np.bincount(
+            (rows * (num_classes + 1) + codes).ravel(),
+            weights=weights,
+            minlength=n_rows * (num_classes + 1),
+        )
+        return counts.reshape(n_rows, num_classes + 1)[:, 1:]
+
+    def label(
+        self,
+        votes: Union[np.ndarray, sparse.spmatrix],
+        return_distribution: bool = False,
+    ) -> Union[np.ndarray, Tuple[np.ndarray, np.ndarray]]:
+        """
+        Majority vote of each row, rows where every labeling function abstains get the abstention vote
+
+        :param votes: (n, m) dense, memory-mapped or sparse vote matrix
+        :type votes: Union[np.ndarray, sparse.spmatrix]
+        :param return_distribution: (optional) also return the (n, num_classes) label distributions,
+                                    i.e. the normalized (weighted) vote counts, uniform for rows without votes
+        :type return_distribution: bool
+        :return: the hard labels, and the label distributions if requested
+        :rtype: Union[np.ndarray, Tuple[np.ndarray, np.ndarray]]
+        """
+        n_rows, n_cols = votes.shape
+        weights = self.weights
+        if weights is not None and len(weights) != n_cols:
+            raise ValueError(
+                f"Got {len(weights)} weights for {n_cols} labeling functions"
+            )
+        num_classes = self.num_classes or self._infer_num_classes(votes)
+        rng = np.random.default_rng(self.seed)
+
+        labels = np.full(n_rows, self.abstention, dtype=np.int64)
+        distribution = np.empty((n_rows, num_classes)) if return_distribution else None
+        if num_classes == 0:
+            return (labels, distribution) if return_distribution else labels
+
+        for start, end, chunk in self._chunks(votes):
+            counts = self._count(chunk, num_classes)
+            max_counts = counts.max(axis=1, keepdims=True)
+            voted = max_counts[:, 0] > 0
+            ties = counts == max_counts
+            if self.tie_break == "random":
+                chunk_labels = np.argmax(ties * rng.random(ties.shape), axis=1) + 1
+            else:
+                chunk_labels = np.argmax(ties, axis=1) + 1
+                if self.tie_break == "abstain":
+                    voted &= ties.sum(axis=1) == 1
+            labels[start:end][voted] = chunk_labels[voted]
+
+            if return_distribution:
+                totals = counts.sum(axis=1, keepdims=True)
+                distribution[start:end] = np.divide(
+                    counts,
+                    totals,
+                    out=np.full(counts.shape, 1 / num_classes),
+                    where=totals > 0,
+                )
 
-    def label(self, votes: np.ndarray) -> np.ndarray:
-        """returns the majority vote for each response row"""
-        return stats.mode(votes, axis=1)[0].flatten()
+        return (labels, distribution) if return_distribution else labels
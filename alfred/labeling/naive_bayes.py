@@ -1,4 +1,7 @@
+from typing import Union
+
 import numpy as np
+from scipy import sparse
 
 from .labelmodel import LabelModel
 
@@ -23,16 +26,17 @@ class NaiveBayes(LabelModel):
             num_lfs=num_lfs,
         )
 
-    def label(self, votes: np.ndarray) -> np.ndarray:
+    def label(self, votes: Union[np.ndarray, sparse.spmatrix]) -> np.ndarray:
         """
         Label the responses using the label model.
         Similar to standard PWS practice, abstention = 0 (i.e. classes are 1-indexed)
-
+        Sparse vote matrices are densified since every vote, abstentions included, is shifted by 1.
 
         :param votes: The votes from the labelers.
-        :type votes: np.ndarray
+        :type votes: Union[np.ndarray, sparse.spmatrix]
         :return: The predicted probabilistic labels.
         :rtype: np.ndarray
         """
-        self.model.estimate_label_model(votes + 1)
-        return self.model.get_label_distribution(votes + 1)
+        votes = self._to_dense(votes) + 1
+        self.model.estimate_label_model(votes)
+        return self.model.get_label_distribution(votes)
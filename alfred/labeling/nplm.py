@@ -1,5 +1,8 @@
+from typing import Union
+
 import numpy as np
 import torch
+from scipy import sparse
 
 from .labelmodel import LabelModel
 
@@ -30,16 +33,17 @@ class NPLM(LabelModel):
             device=device,
         )
 
-    def label(self, votes: np.ndarray) -> np.ndarray:
+    def label(self, votes: Union[np.ndarray, sparse.spmatrix]) -> np.ndarray:
         """
         Label the responses using the label model.
         Similar to standard PWS practice, abstention = 0 (i.e. classes are 1-indexed)
-
+        Sparse vote matrices are densified since every vote, abstentions included, is shifted by 1.
 
         :param votes: The votes from the labelers.
-        :type votes: np.ndarray
+        :type votes: Union[np.ndarray, sparse.spmatrix]
         :return: The predicted probabilistic labels.
         :rtype: np.ndarray
         """
-        self.model.estimate_label_model(votes + 1)
-        return self.model.get_label_distribution(votes + 1)
+        votes = self._to_dense(votes) + 1
+        self.model.estimate_label_model(votes)
+        return self.model.get_label_distribution(votes)
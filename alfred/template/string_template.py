@@ -1,9 +1,11 @@
 import json
 import logging
 import re
-from typing import Dict, Any, Optional, Iterable, List, Union
+from typing import Dict, Any, Optional, Iterable, Iterator, List, Tuple, Union
 
 import numpy as np
+import pyarrow
+import pyarrow.compute as pc
 import torch
 
 from alfred.fm.query import Query, CompletionQuery, RankedQuery
@@ -11,6 +13,9 @@ from alfred.template.template import Template
 
 logger = logging.getLogger(__name__)
 
+# example values that are inserted by position instead of by keyword
+SEQUENCE_TYPES = (list, np.ndarray, torch.Tensor)
+
 
 class StringTemplate(Template):
     """
@@ -92,6 +97,7 @@ class StringTemplate(Template):
         self._answer_candidates = None
 
         self._keywords = re.findall(r"\[\[(.*?)\]\]", template)
+        self._segments, self._slots = self._compile(template)
 
         if answer_choices:
             if isinstance(answer_choices, str):
@@ -119,6 +125,126 @@ class StringTemplate(Template):
         self._reference = promptsource_template["reference"]
         self._metadata = promptsource_template["metadata"]
         self._answer_choices = promptsource_template["answer_choices"]
+        self._keywords = re.findall(r"\[\[(.*?)\]\]", self._template)
+        self._segments, self._slots = self._compile(self._template)
+
+    @staticmethod
+    def _compile(template: str) -> Tuple[List[str], List[Tuple[int, str]]]:
+        """
+        Compile the template into a segment list of literal chunks and [[keyword]] placeholders,
+        along with the (segment index, keyword) of every placeholder slot
+
+        e.g. "Does the [[animal]] have stripes?" compiles into
+            ["Does the ", "[[animal]]", " have stripes?"], [(1, "animal")]
+
+        :param template: template string
+        :type template: str
+        :return: the segments and the slots
+        :rtype: Tuple[List[str], List[Tuple[int, str]]]
+        """
+        segments = re.split(r"(\[\[.*?\]\])", template)
+        slots = [(idx, segments[idx][2:-2]) for idx in range(1, len(segments), 2)]
+        return segments, slots
+
+    def render(self, example: Dict, key_translator: Optional[Dict] = None) -> str:
+        """
+        Render the prompt of an example with a single join over the compiled segments.
+        Keywords without a string value in the example are left as is.
+
+        :param example: an example in format of dictionary
+        :type example: Dict
+        :param key_translator: (optional) translation of the example keys to template keywords
+        :type key_translator: Dict
+        :return: the rendered prompt
+        :rtype: str
+        """
+        translated = {}
+        for key, value in example.items():
+            if key_translator:
+                key = key_translator.get(key, key)
+            # keywords are matched by their string form, e.g. [[0]] for the key 0,
+            # and the first key translated to a keyword fills it
+            translated.setdefault(str(key), value)
+        example = translated
+        segments = self._segments.copy()
+        for idx, keyword in self._slots:
+            value = example.get(keyword)
+            if isinstance(value, str):
+                segments[idx] = value
+        return "".join(segments)
+
+    def render_table(
+        self,
+        dataset: Union[pyarrow.Table, pyarrow.RecordBatch, Any],
+        key_translator: Optional[Dict] = None,
+    ) -> pyarrow.ChunkedArray:
+        """
+        Render the prompts of a whole arrow table (or IterableArrowDataset/BufferedArrowDataset) column-wise,
+        joining the compiled segments and the keyword columns with pyarrow compute kernels,
+        without creating a Python object per row.
+
+        As in `apply`, only string columns fill their keywords, other keywords (missing or non-string columns,
+        null values) are left as is.
+
+        :param dataset: an arrow table, record batch, or a dataset backed by an arrow table
+        :type dataset: Union[pyarrow.Table, pyarrow.RecordBatch, IterableArrowDataset, BufferedArrowDataset]
+        :param key_translator: (optional) translation of the column names to template keywords
+        :type key_translator: Dict
+        :return: the rendered prompts, one per row
+        :rtype: pyarrow.ChunkedArray
+        """
+        table = dataset
+        if not isinstance(table, (pyarrow.Table, pyarrow.RecordBatch)):
+            table = dataset.data() if callable(dataset.data) else dataset.data
+        if isinstance(table, pyarrow.RecordBatch):
+            table = pyarrow.Table.from_batches([table])
+
+        columns = {}
+        for name in table.column_names:
+            keyword = key_translator.get(name, name) if key_translator else name
+            columns.setdefault(keyword, name)
+
+        def _is_string(name):
+            return name is not None and (
+                pyarrow.types.is_string(table.schema.field(name).type)
+                or pyarrow.types.is_large_string(table.schema.field(name).type)
+            )
+
+        keyword_columns = {
+            keyword: table[columns[keyword]]
+            for _, keyword in self._slots
+            if _is_string(columns.get(keyword))
+        }
+        string_type = (
+            pyarrow.large_string()
+            if any(
+                pyarrow.types.is_large_string(column.type)
+                for column in keyword_columns.values()
+            )
+            else pyarrow.string()
+        )
+        if len(keyword_columns) == 0:
+            return pyarrow.chunked_array(
+                [pyarrow.array([self.render({})] * table.num_rows, type=string_type)],
+                type=string_type,
+            )
+
+        strings = [
+            pyarrow.scalar(segment, type=string_type) for segment in self._segments
+        ]
+        for idx, keyword in self._slots:
+            if keyword in keyword_columns:
+                strings[idx] = pc.fill_null(
+                    keyword_columns[keyword].cast(string_type), strings[idx]
+                )
+        strings = [
+            string
+            for string in strings
+            if not isinstance(string, pyarrow.Scalar) or len(string.as_py()) > 0
+        ]
+        return pc.binary_join_element_wise(
+            *strings, pyarrow.scalar("", type=string_type)
+        )
 
     def apply(
         self, example: Union[Dict, List[Dict]], **kawrgs
@@ -140,23 +266,11 @@ class StringTemplate(Template):
             else:
                 raise ValueError(f"Unsupported example type: {type(example)}")
 
-        if "key_translator" in kawrgs:
-            key_translator = kawrgs["key_translator"]
-        else:
-            key_translator = None
+        key_translator = kawrgs.get("key_translator")
+        prompt = self.render(example, key_translator)
 
-        prompt = self._template
         for key, value in example.items():
-            if isinstance(value, str):
-                if key_translator:
-                    try:
-                        k = key_translator[key]
-                    except KeyError:
-                        k = key
-                else:
-                    k = key
-                prompt = prompt.replace(f"[[{str(k)}]]", value)
-            elif type(value) in [list, np.ndarray, torch.Tensor]:
+            if type(value) in SEQUENCE_TYPES:
                 if isinstance(key, int):
                     if key_translator:
                         try:
@@ -207,6 +321,25 @@ class StringTemplate(Template):
         """
         return [self.apply(example, **kwargs) for example in dataset]
 
+    def iter_dataset(
+        self,
+        dataset: Iterable[Dict],
+        **kwargs: Any,
+    ) -> Iterator[Query]:
+        """
+        Apply the template to a dataset lazily, yielding one query at a time
+        instead of materializing the list of queries as `apply_to_dataset` does
+
+        :param dataset: a dataset in format of a iterable of dictionary
+        :type dataset: Iterable[Dict]
+        :param kwargs: Additional arguments to pass to apply
+        :type kwargs: Any
+        :return: an iterator of query objects
+        :rtype: Iterator[Query]
+        """
+        for example in dataset:
+            yield self.apply(example, **kwargs)
+
     def get_answer_choices_list(self) -> List[str]:
         """
         Get answer choices list
@@ -1 +1,2 @@
+from .vote_matrix import VoteMatrixBuilder
 from .voter import Voter
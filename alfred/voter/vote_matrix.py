@@ -0,0 +1,237 @@
+import array
+import logging
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Union
+
+import numpy as np
+import scipy.sparse
+
+from alfred.fm.query import Query, RankedQuery
+from alfred.template.template import Template
+from alfred.voter.voter import Voter
+
+logger = logging.getLogger(__name__)
+
+
+class VoteMatrixBuilder:
+    """
+    VoteMatrixBuilder turns a dataset and a set of templates/voters into the
+    (n_examples, n_templates) vote matrix consumed by the label models in `alfred.labeling`.
+
+    Identical rendered queries are only sent once, even across templates, and the unique queries
+    of all templates are run by the client in a single call per kind of query (ranked or completion)
+    so the model can batch them together.
+    Each voter then votes once per unique response it owns.
+
+    e.g.
+        builder = VoteMatrixBuilder(client, templates, voters)
+        votes = builder.build(dataset)
+        labels = MajorityVote()(votes)
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        templates: List[Template],
+        voters: Union[Voter, List[Voter]],
+        abstention: int = 0,
+        dtype: Union[str, np.dtype] = np.int32,
+    ):
+        """
+        Initialize a vote matrix builder
+
+        :param client: the client (or anything exposing `run(queries, **kwargs)`) to run the queries with
+        :type client: alfred.client.Client
+        :param templates: the templates, one column of the vote matrix each
+        :type templates: List[Template]
+        :param voters: one voter per template, or a single voter shared by all templates
+        :type voters: Union[Voter, List[Voter]]
+        :param abstention: (optional) the vote for responses that match no label, defaults to 0
+        :type abstention: int
+        :param dtype: (optional) dtype of the vote matrix, defaults to np.int32
+        :type dtype: Union[str, np.dtype]
+        """
+        if isinstance(voters, Voter):
+            voters = [voters] * len(templates)
+        if len(voters) != len(templates):
+            logger.error(
+                f"Got {len(voters)} voters for {len(templates)} templates, expected one voter per template"
+            )
+            raise ValueError(
+                f"Got {len(voters)} voters for {len(templates)} templates, expected one voter per template"
+            )
+        self.client = client
+        self.templates = templates
+        self.voters = voters
+        self.abstention = abstention
+        self.dtype = np.dtype(dtype)
+
+    @staticmethod
+    def _query_key(query: Union[Query, str]) -> Hashable:
+        """
+        Key identifying queries that produce the same response
+
+        :param query: the rendered query
+        :type query: Union[Query, str]
+        :return: the prompt, and the candidates for ranked queries
+        :rtype: Hashable
+        """
+        if isinstance(query, RankedQuery):
+            return query.prompt, tuple(query.candidates)
+        if isinstance(query, Query):
+            return query.load()[0], None
+        return query, None
+
+    def render(self, dataset: Iterable[Dict], **kwargs: Any):
+        """
+        Apply every template to every example and dedupe the rendered queries
+
+        :param dataset: a dataset in format of an iterable of dictionary
+        :type dataset: Iterable[Dict]
+        :param kwargs: additional arguments to pass to the templates' apply (e.g. key_translator)
+        :type kwargs: Any
+        :return: the unique queries and the (n_examples, n_templates) index of each cell's query in them
+        :rtype: Tuple[List[Query], np.ndarray]
+        """
+        queries, query_ids = [], {}
+        # flat, row-major index into `queries`, kept compact for large datasets
+        query_index = array.array("q")
+        for example in dataset:
+            for template in self.templates:
+                query = template.apply(example, **kwargs)
+                key = self._query_key(query)
+                query_id = query_ids.get(key)
+                if query_id is None:
+                    query_id = query_ids[key] = len(queries)
+                    queries.append(query)
+                query_index.append(query_id)
+        query_index = np.frombuffer(query_index, dtype=np.int64).reshape(
+            -1, len(self.templates)
+        )
+        logger.info(
+            f"Rendered {query_index.size} queries, {len(queries)} of them unique"
+        )
+        return queries, query_index
+
+    def build(
+        self,
+        dataset: Iterable[Dict],
+        memmap_path: Optional[str] = None,
+        sparse: bool = False,
+        template_kwargs: Optional[Dict] = None,
+        **kwargs: Any,
+    ) -> Union[np.ndarray, scipy.sparse.csr_matrix]:
+        """
+        Build the vote matrix of a dataset
+
+        :param dataset: a dataset in format of an iterable of dictionary
+        :type dataset: Iterable[Dict]
+        :param memmap_path: (optional) write the vote matrix to this .npy file and return it memory-mapped
+        :type memmap_path: str
+        :param sparse: (optional) return a CSR matrix in np.int8 that only stores the non-abstaining votes,
+                       requires an abstention of 0
+        :type sparse: bool
+        :param template_kwargs: (optional) additional arguments to pass to the templates' apply
+        :type template_kwargs: Dict
+        :param kwargs: additional keyword arguments to pass to the client's run (e.g. batch_size)
+        :type kwargs: Any
+        :return: the (n_examples, n_templates) vote matrix
+        :rtype: Union[np.ndarray, scipy.sparse.csr_matrix]
+        """
+        if sparse and (memmap_path is not None or self.abstention != 0):
+            logger.error(
+                "Sparse vote matrices require an abstention of 0 and no memmap"
+            )
+            raise ValueError(
+                "Sparse vote matrices require an abstention of 0 and no memmap"
+            )
+
+        queries, query_index = self.render(dataset, **(template_kwargs or {}))
+
+        responses = self._run(queries, **kwargs)
+
+        if sparse:
+            return self._build_sparse(responses, query_index)
+
+        if memmap_path is not None:
+            votes = np.lib.format.open_memmap(
+                memmap_path, mode="w+", dtype=self.dtype, shape=query_index.shape
+            )
+        else:
+            votes = np.empty(query_index.shape, dtype=self.dtype)
+
+        for template_idx, voter in enumerate(self.voters):
+            column = query_index[:, template_idx]
+            unique_ids, inverse = np.unique(column, return_inverse=True)
+            unique_votes = voter.vote(
+                [responses[query_id] for query_id in unique_ids],
+                abstention=self.abstention,
+            )
+            votes[:, template_idx] = unique_votes[inverse]
+
+        if memmap_path is not None:
+            votes.flush()
+        return votes
+
+    def _run(self, queries: List[Query], **kwargs: Any) -> List:
+        """
+        Run the unique queries, one client call per kind of query
+
+        The model picks scoring or generation from the first query of a call,
+        so ranked and completion queries are run separately.
+
+        :param queries: the unique queries
+        :type queries: List[Query]
+        :param kwargs: additional keyword arguments to pass to the client's run
+        :type kwargs: Any
+        :return: the responses, in the order of the queries
+        :rtype: List
+        """
+        groups = {}
+        for query_id, query in enumerate(queries):
+            groups.setdefault(isinstance(query, RankedQuery), []).append(query_id)
+        responses = [None] * len(queries)
+        for query_ids in groups.values():
+            group_responses = self.client.run(
+                [queries[query_id] for query_id in query_ids], **kwargs
+            )
+            for query_id, response in zip(query_ids, group_responses):
+                responses[query_id] = response
+        return responses
+
+    def _build_sparse(
+        self, responses: List, query_index: np.ndarray
+    ) -> scipy.sparse.csr_matrix:
+        """
+        Vote column by column and only keep the non-abstaining votes
+
+        :param responses: the responses of the unique queries
+        :type responses: List
+        :param query_index: the (n_examples, n_templates) index of each cell's query in the responses
+        :type query_index: np.ndarray
+        :return: the sparse vote matrix in np.int8
+        :rtype: scipy.sparse.csr_matrix
+        """
+        rows, cols, data = [], [], []
+        for template_idx, voter in enumerate(self.voters):
+            unique_ids, inverse = np.unique(
+                query_index[:, template_idx], return_inverse=True
+            )
+            unique_votes = voter.vote(
+                [responses[query_id] for query_id in unique_ids], sparse=True
+            )
+            column = unique_votes.toarray()[:, 0][inverse]
+            nonzero = np.flatnonzero(column)
+            rows.append(nonzero)
+            cols.append(np.full(len(nonzero), template_idx))
+            data.append(column[nonzero])
+        return scipy.sparse.csr_matrix(
+            (np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))),
+            shape=query_index.shape,
+            dtype=np.int8,
+        )
+
+    def __call__(
+        self, dataset: Iterable[Dict], **kwargs: Any
+    ) -> Union[np.ndarray, scipy.sparse.csr_matrix]:
+        """functional style of build"""
+        return self.build(dataset, **kwargs)
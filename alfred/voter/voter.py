@@ -1,8 +1,10 @@
+import itertools
 import logging
+import operator
 from typing import Dict, Callable, Union, List, Any, Iterable, Optional, Tuple
 
 import numpy as np
-from tqdm.auto import tqdm
+from scipy import sparse
 
 from alfred.fm.response.completion_response import CompletionResponse
 from alfred.fm.response.ranked_response import RankedResponse
@@ -68,6 +70,10 @@ class Voter:
 
         *NOTE* on partial labels:
 
+        *NOTE* on sparse votes: with `sparse=True` the votes are returned as a (n, 1) scipy CSC matrix
+        in np.int8 where abstentions are not stored, this requires an abstention of 0.
+        Columns of several voters can be stacked with `scipy.sparse.hstack(columns, format="csr")`.
+
         :param responses: list of response objects
         :type responses: Union[Iterable[str], str, Iterable[Response], Response]
         :param matching_function: (optional) function to match responses against answer choices, defaulting to exact match
@@ -76,8 +82,11 @@ class Voter:
         :param label_map: (optional) label maps that maps responses content to labels
                            label_map specified here will overide the label_map initialized in the template
         :type label_map: Dict
+        :param kwargs: "abstention" for the vote of unmatched responses (default 0),
+                       "sparse" to return a sparse (n, 1) CSC matrix (default False)
+        :type kwargs: Any
         :return: numpy ndarray of votes in np.int8
-        :rtype: np.ndarray
+        :rtype: Union[np.ndarray, sparse.csc_matrix]
         """
         label_map = self._label_map if label_map is None else label_map
         matching_function = (
@@ -91,45 +100,166 @@ class Voter:
             logger.warning("No answer label map found, voting will not be done")
             raise ValueError("No answer label map found, voting will not be done")
 
-        no_tqdm = kwargs.get("no_tqdm", True)
         abstention = kwargs.get("abstention", 0)
-
+        if kwargs.get("sparse", False) and abstention != 0:
+            logger.error("Sparse votes require an abstention of 0")
+            raise ValueError("Sparse votes require an abstention of 0")
         votes = np.ones(len(responses)) * abstention
-        for idx, response in enumerate(tqdm(responses, disable=no_tqdm)):
+
+        # the vote of every distinct response text is only matched once
+        vote_table = {}
+
+        def _vote(response: str) -> float:
+            if response not in vote_table:
+                vote_table[response] = self._match(
+                    response, label_map, matching_function, abstention
+                )
+            return vote_table[response]
+
+        ranked_idx, texts, text_idx = [], [], []
+        if self._calibration is not None and all(
+            type(response) == RankedResponse for response in responses
+        ):
+            # calibrated ranked responses only, skip the per-response dispatch
+            ranked_idx = range(len(responses))
+            responses_iter = ()
+        else:
+            responses_iter = enumerate(responses)
+        for idx, response in responses_iter:
             if type(response) == CompletionResponse:
-                response = response.prediction
+                texts.append(response.prediction)
             elif type(response) == RankedResponse:
-                if self._calibration:
-                    scores = list(response.logits.values())
-                    labels = list(response.logits.keys())
-                    if type(self._calibration) == tuple:
-                        weights, biases = self._calibration
-                        weights, biases = np.array(weights), np.array(biases)
-                        calibrated_scores = weights @ np.array(scores) + biases
-                    elif type(self._calibration) in [list, np.ndarray]:
-                        calibrated_scores = np.array(scores) @ self._calibration
-                    response = labels[np.argmax(calibrated_scores)]
-                else:
-                    response = response.prediction
+                if self._calibration is not None:
+                    ranked_idx.append(idx)
+                    continue
+                texts.append(response.prediction)
             elif isinstance(response, str):
-                pass
+                texts.append(response)
             else:
                 logger.error(f"Unsupported response type: {type(response)}")
                 raise ValueError(f"Unsupported response type: {type(response)}")
+            text_idx.append(idx)
+
+        if len(texts) > 0:
+            votes[text_idx] = np.fromiter(
+                map(_vote, texts), dtype=votes.dtype, count=len(texts)
+            )
 
-            if isinstance(label_map, dict):
-                for k_idx, key in enumerate(label_map.keys()):
-                    if matching_function(response, key):
-                        votes[idx] = (
-                            label_map[key]
-                            if isinstance(label_map[key], int)
-                            else k_idx + 1
-                        )
+        if len(ranked_idx) > 0:
+            if len(ranked_idx) == len(responses):
+                ranked_idx = slice(None)
+                ranked_responses = responses
             else:
-                if matching_function(response, label_map):
-                    votes[idx] = 1
+                ranked_responses = [responses[idx] for idx in ranked_idx]
+            labels = list(ranked_responses[0].logits.keys())
+            scores = self._stack_logits(ranked_responses, labels)
+            label_votes = np.array(
+                [_vote(label) for label in labels], dtype=votes.dtype
+            )
+            votes[ranked_idx] = label_votes[np.argmax(self._calibrate(scores), axis=1)]
+
+        if kwargs.get("sparse", False):
+            return self.sparsify(votes.reshape(-1, 1), format="csc")
         return votes
 
+    @staticmethod
+    def sparsify(votes: np.ndarray, format: str = "csr") -> sparse.spmatrix:
+        """
+        Convert a dense (n, m) vote matrix with abstention 0 to a sparse matrix in np.int8,
+        only the non-abstaining votes are stored
+
+        :param votes: the dense vote matrix
+        :type votes: np.ndarray
+        :param format: (optional) the sparse format, "csr" (default) for vote matrices or "csc" for single columns
+        :type format: str
+        :return: the sparse vote matrix
+        :rtype: sparse.spmatrix
+        """
+        votes = np.asarray(votes)
+        if votes.size > 0 and (
+            votes.min() < np.iinfo(np.int8).min or votes.max() > np.iinfo(np.int8).max
+        ):
+            logger.error("Votes out of the np.int8 range cannot be stored sparsely")
+            raise ValueError("Votes out of the np.int8 range cannot be stored sparsely")
+        return sparse.coo_matrix(votes.astype(np.int8, copy=False)).asformat(format)
+
+    @staticmethod
+    def _match(
+        response: str,
+        label_map: Union[Dict, Any],
+        matching_function: Callable,
+        abstention: float = 0,
+    ) -> float:
+        """
+        Match a single response text against the label map
+
+        :param response: the response text
+        :type response: str
+        :param label_map: label maps that maps responses content to labels
+        :type label_map: Union[Dict, Any]
+        :param matching_function: function to match responses against answer choices
+        :type matching_function: Callable
+        :param abstention: the vote for responses that match no label
+        :type abstention: float
+        :return: the vote, the last matching label wins
+        :rtype: float
+        """
+        vote = abstention
+        if isinstance(label_map, dict):
+            for k_idx, key in enumerate(label_map.keys()):
+                if matching_function(response, key):
+                    vote = (
+                        label_map[key] if isinstance(label_map[key], int) else k_idx + 1
+                    )
+        elif matching_function(response, label_map):
+            vote = 1
+        return vote
+
+    @staticmethod
+    def _stack_logits(responses: List[RankedResponse], labels: List) -> np.ndarray:
+        """
+        Stack the logits of ranked responses into one (n, k) array, with columns in the order of `labels`
+
+        :param responses: ranked responses sharing the same candidates
+        :type responses: List[RankedResponse]
+        :param labels: the candidates
+        :type labels: List
+        :return: the logits matrix
+        :rtype: np.ndarray
+        """
+        if len(labels) == 1:
+            return np.fromiter(
+                (response.logits[labels[0]] for response in responses),
+                dtype=np.float64,
+                count=len(responses),
+            ).reshape(-1, 1)
+        return np.fromiter(
+            itertools.chain.from_iterable(
+                map(
+                    operator.itemgetter(*labels),
+                    map(operator.attrgetter("logits"), responses),
+                )
+            ),
+            dtype=np.float64,
+            count=len(responses) * len(labels),
+        ).reshape(len(responses), len(labels))
+
+    def _calibrate(self, scores: np.ndarray) -> np.ndarray:
+        """
+        Apply the calibration to a (n, k) matrix of logits
+
+        :param scores: the logits matrix
+        :type scores: np.ndarray
+        :return: the calibrated scores
+        :rtype: np.ndarray
+        """
+        if type(self._calibration) == tuple:
+            weights, biases = self._calibration
+            return scores @ np.asarray(weights, dtype=np.float64).T + np.asarray(
+                biases, dtype=np.float64
+            )
+        return scores @ np.asarray(self._calibration, dtype=np.float64)
+
     def set_calibration(
         self,
         weights: Union[List[float], np.ndarray],
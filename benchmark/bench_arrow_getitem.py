@@ -0,0 +1,55 @@
+"""
+Benchmark random row access on an IterableArrowDataset of 1M rows in 2048-row chunks:
+the previous `to_pandas().iloc` lookup vs the chunk-offset index, for single rows and batched `take`.
+
+Usage:
+    >>> python benchmark/bench_arrow_getitem.py
+"""
+
+import random
+import time
+
+import pyarrow
+
+from alfred.data import IterableArrowDataset
+
+
+def bench(n: int):
+    random.seed(0)
+    table = pyarrow.Table.from_batches(
+        pyarrow.table(
+            {
+                "uid": [str(i) for i in range(n)],
+                "text": [f"example number {i}" for i in range(n)],
+                "label": [i % 4 for i in range(n)],
+            }
+        ).to_batches(max_chunksize=2048)
+    )
+    dataset = IterableArrowDataset(table)
+    indices = [random.randrange(n) for _ in range(10_000)]
+
+    start = time.perf_counter()
+    for idx in indices[:5]:
+        table.to_pandas().iloc[idx]
+    pandas_time = (time.perf_counter() - start) / 5
+
+    start = time.perf_counter()
+    for idx in indices:
+        dataset[idx]
+    index_time = (time.perf_counter() - start) / len(indices)
+
+    start = time.perf_counter()
+    rows = dataset.take(indices)
+    take_time = (time.perf_counter() - start) / len(indices)
+    assert rows[0] == dataset[indices[0]]
+
+    print(
+        f"n={n:>8d} chunks={table.column(0).num_chunks}  "
+        f"to_pandas().iloc={pandas_time * 1e3:8.1f}ms/row  "
+        f"__getitem__={index_time * 1e6:6.1f}us/row  "
+        f"take(10k)={take_time * 1e6:5.2f}us/row"
+    )
+
+
+if __name__ == "__main__":
+    bench(1_000_000)
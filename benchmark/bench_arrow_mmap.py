@@ -0,0 +1,102 @@
+"""
+Benchmark opening an Arrow IPC file with BufferedArrowDataset: reading the whole file into a buffer
+(the previous way to build the dataset) vs memory-mapping it, then random row access and a projected,
+columnar template render over the memory-mapped file.
+
+Usage:
+    >>> python benchmark/bench_arrow_mmap.py [n_rows]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+import pyarrow
+
+from alfred.data import BufferedArrowDataset
+from alfred.template import StringTemplate
+
+WORDS = "the a movie review was great terrible plot actor scene film story".split()
+
+
+def rss_mib() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def write_dataset(path: str, n: int, chunk_size: int = 100_000):
+    random.seed(0)
+    schema = pyarrow.schema(
+        [
+            ("id", pyarrow.int64()),
+            ("text", pyarrow.string()),
+            ("title", pyarrow.string()),
+        ]
+    )
+    with pyarrow.ipc.new_file(path, schema) as writer:
+        for start in range(0, n, chunk_size):
+            size = min(chunk_size, n - start)
+            writer.write_batch(
+                pyarrow.record_batch(
+                    [
+                        pyarrow.array(range(start, start + size)),
+                        pyarrow.array(
+                            [" ".join(random.choices(WORDS, k=60)) for _ in range(size)]
+                        ),
+                        pyarrow.array(
+                            [" ".join(random.choices(WORDS, k=4)) for _ in range(size)]
+                        ),
+                    ],
+                    schema=schema,
+                )
+            )
+
+
+def bench(n: int):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "dataset.arrow")
+        write_dataset(path, n)
+        print(f"n={n:>9d}  file {os.path.getsize(path) / 2**20:8.1f} MiB")
+
+        base = rss_mib()
+        start = time.perf_counter()
+        dataset = BufferedArrowDataset(path)
+        print(
+            f"  memory-mapped:      open {time.perf_counter() - start:6.4f}s  "
+            f"resident memory +{rss_mib() - base:8.1f} MiB"
+        )
+
+        start = time.perf_counter()
+        prompts = StringTemplate("Title: [[title]]. Is this a review?").render_table(
+            dataset.select(["title"])
+        )
+        print(
+            f"  projected render_table of {len(prompts)} prompts: "
+            f"{time.perf_counter() - start:6.2f}s  resident memory +{rss_mib() - base:8.1f} MiB"
+        )
+        uids = random.sample(range(n), 10_000)
+        start = time.perf_counter()
+        for uid in uids:
+            dataset[uid]
+        print(
+            f"  random __getitem__: {(time.perf_counter() - start) / len(uids) * 1e6:6.1f}us/row  "
+            f"resident memory +{rss_mib() - base:8.1f} MiB (mapped pages read ahead)"
+        )
+
+        del dataset, prompts
+
+        base = rss_mib()
+        start = time.perf_counter()
+        with open(path, "rb") as f:
+            buffered = BufferedArrowDataset(pyarrow.py_buffer(f.read()))
+        print(
+            f"  read into a buffer: open {time.perf_counter() - start:6.2f}s  "
+            f"resident memory +{rss_mib() - base:8.1f} MiB"
+        )
+        del buffered
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000)
@@ -0,0 +1,156 @@
+"""
+Benchmark concurrent sessions on one gRPCServer whose model runs one batch at a time, with a fixed
+per-batch overhead plus per-query cost: every Run batching its own queries (the previous behaviour,
+reimplemented below) vs the BatchScheduler merging the queries of all sessions.
+
+Usage:
+    >>> python benchmark/bench_batch_scheduler.py
+"""
+
+import asyncio
+import functools
+import json
+import threading
+import time
+
+from alfred.fm.remote.grpc_client import gRPCClient
+from alfred.fm.remote.grpc_server import gRPCServer
+from alfred.fm.remote.protos import query_pb2
+from alfred.fm.response import CompletionResponse
+
+BATCH_OVERHEAD_S = 0.02
+QUERY_COST_S = 0.001
+UPLOAD_INTERVAL_S = 0.002
+
+
+class SlowModel:
+    def __init__(self):
+        # one accelerator: batches run one after the other
+        self.lock = threading.Lock()
+        self.num_batches = 0
+
+    def run(self, queries, **kwargs):
+        with self.lock:
+            self.num_batches += 1
+            time.sleep(BATCH_OVERHEAD_S + QUERY_COST_S * len(queries))
+        return [CompletionResponse(query.prompt) for query in queries]
+
+
+class PerSessionServer(gRPCServer):
+    """previous gRPCServer.Run: micro-batches of the queries of one Run call"""
+
+    async def Run(self, request_iterator, context):
+        requests = asyncio.Queue()
+        kwargs = {}
+
+        async def _receive():
+            try:
+                async for request in request_iterator:
+                    if request.kwargs:
+                        kwargs.update(json.loads(request.kwargs))
+                    await requests.put(
+                        (request.request_id, self._parse_run_request(request))
+                    )
+            finally:
+                await requests.put(None)
+
+        receiver = asyncio.ensure_future(_receive())
+        loop = asyncio.get_running_loop()
+        done = False
+        while not done:
+            request = await requests.get()
+            if request is None:
+                break
+            batch = [request]
+            deadline = loop.time() + self.max_wait_ms / 1000
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                try:
+                    if timeout > 0:
+                        request = await asyncio.wait_for(requests.get(), timeout)
+                    else:
+                        request = requests.get_nowait()
+                except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                    break
+                if request is None:
+                    done = True
+                    break
+                batch.append(request)
+            request_ids, instances = zip(*batch)
+            responses = await loop.run_in_executor(
+                None, functools.partial(self.model.run, list(instances), **kwargs)
+            )
+            for request_id, response in zip(request_ids, responses):
+                message = self._to_run_response(response)
+                message.request_id = request_id
+                yield message
+        await receiver
+
+
+def start_server(server_class, model, port):
+    def server_starter():
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        server_class(model=model, port=port)
+
+    threading.Thread(target=server_starter, daemon=True).start()
+
+
+def session(port: int, n: int, latencies: list):
+    client = gRPCClient("localhost", port)
+    client.handshake()
+    sent = {}
+
+    def requests():
+        for request_id in range(n):
+            time.sleep(UPLOAD_INTERVAL_S)
+            sent[request_id] = time.perf_counter()
+            yield query_pb2.RunRequest(
+                message=f"query {request_id}", request_id=request_id
+            )
+
+    for response in client.stub.Run(
+        requests(), metadata=(("session_id", client.session_id),)
+    ):
+        latencies.append(time.perf_counter() - sent[response.request_id])
+    client.close()
+
+
+def bench(port: int, model: SlowModel, sessions: int, n: int):
+    latencies = []
+    threads = [
+        threading.Thread(target=session, args=(port, n, latencies))
+        for _ in range(sessions)
+    ]
+    model.num_batches = 0
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    total = time.perf_counter() - start
+    assert len(latencies) == sessions * n
+    latencies.sort()
+    return total, model.num_batches, latencies[len(latencies) // 2], latencies[-1]
+
+
+if __name__ == "__main__":
+    n = 200
+    settings = {
+        "per session": (PerSessionServer, SlowModel(), 10740),
+        "scheduler": (gRPCServer, SlowModel(), 10741),
+    }
+    for server_class, model, port in settings.values():
+        start_server(server_class, model, port)
+    time.sleep(1)
+    print(
+        f"{n} queries/session, upload every {UPLOAD_INTERVAL_S * 1e3:.0f}ms, model "
+        f"{BATCH_OVERHEAD_S * 1e3:.0f}ms/batch + {QUERY_COST_S * 1e3:.0f}ms/query"
+    )
+    for sessions in [1, 4, 16]:
+        print(f"sessions={sessions}")
+        for name, (_, model, port) in settings.items():
+            total, batches, p50, p_max = bench(port, model, sessions, n)
+            print(
+                f"  {name:<12s} total={total:6.2f}s  batches={batches:5d}  "
+                f"latency p50={p50 * 1e3:7.1f}ms max={p_max * 1e3:7.1f}ms"
+            )
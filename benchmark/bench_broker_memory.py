@@ -0,0 +1,95 @@
+"""
+Benchmark the memory a long-lived gRPCServer retains under steady load: rounds of short-lived
+sessions that each run and encode a few queries, reporting the messages and sessions the broker
+still holds and the resident memory of the process after every round.
+
+Usage:
+    >>> python benchmark/bench_broker_memory.py
+"""
+
+import asyncio
+import gc
+import inspect
+import threading
+import time
+
+import torch
+
+from alfred.fm.query import CompletionQuery
+from alfred.fm.remote.grpc_client import gRPCClient
+from alfred.fm.remote.grpc_server import gRPCServer
+from alfred.fm.response import CompletionResponse
+
+PORT = 10750
+SESSION_TTL_S = 1.0
+
+
+class EchoModel:
+    def run(self, queries, **kwargs):
+        return [CompletionResponse(query.prompt) for query in queries]
+
+    def encode(self, texts, reduction=None, **kwargs):
+        return [torch.zeros(8) for _ in texts]
+
+
+class RecordedServer(gRPCServer):
+    instances = []
+
+    def __init__(self, *args, **kwargs):
+        RecordedServer.instances.append(self)
+        super().__init__(*args, **kwargs)
+
+
+def start_server():
+    kwargs = {}
+    if "session_ttl_s" in inspect.signature(gRPCServer.__init__).parameters:
+        kwargs["session_ttl_s"] = SESSION_TTL_S
+
+    def server_starter():
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        RecordedServer(model=EchoModel(), port=PORT, **kwargs)
+
+    threading.Thread(target=server_starter, daemon=True).start()
+    time.sleep(1)
+    return kwargs
+
+
+def rss_mib():
+    gc.collect()
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * 4096 / 2**20
+
+
+def retained(server):
+    broker = server.broker
+    topic_messages = sum(topic.messages.qsize() for topic in broker.topics.values())
+    session_messages = sum(queue.qsize() for queue in broker.sessions.values())
+    return topic_messages, session_messages, len(broker.sessions)
+
+
+def round_of_sessions(sessions: int, queries: int):
+    prompts = [f"query {i} " + "x" * 200 for i in range(queries)]
+    for _ in range(sessions):
+        client = gRPCClient("localhost", PORT)
+        client.handshake()
+        client.run([CompletionQuery(prompt) for prompt in prompts])
+        client.encode(prompts[:10])
+        client.close()
+
+
+if __name__ == "__main__":
+    kwargs = start_server()
+    server = RecordedServer.instances[0]
+    sessions, queries = 100, 100
+    print(f"{sessions} sessions/round x {queries} queries + 10 encodings, {kwargs}")
+    start_rss = rss_mib()
+    for i in range(5):
+        round_of_sessions(sessions, queries)
+        # idle sessions expire
+        time.sleep(2 * SESSION_TTL_S + 0.5)
+        topic_messages, session_messages, open_sessions = retained(server)
+        print(
+            f"  round {i + 1}: topic messages={topic_messages:6d}  "
+            f"session messages={session_messages:6d}  sessions={open_sessions:4d}  "
+            f"rss=+{rss_mib() - start_rss:6.1f}MiB"
+        )
@@ -0,0 +1,41 @@
+"""
+Benchmark cache probing in Cache.cached_query: per-row `read` vs chunked `read_batch`.
+
+Usage:
+    >>> python benchmark/bench_cache_lookup.py
+"""
+
+import os
+import tempfile
+import time
+
+from alfred.client.cache import SQLiteCache
+
+
+def bench(n: int, hit_ratio: float = 0.5):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = SQLiteCache(cache_location=os.path.join(tmp_dir, "bench.sqlite3"))
+        prompts = [f"CompletionQuery(prompt=example prompt number {i})" for i in range(n)]
+        n_cached = int(n * hit_ratio)
+        cache.write_batch(prompts[:n_cached], ["{}"] * n_cached, metadata="{}")
+
+        start = time.perf_counter()
+        per_row = [cache.read(prompt, "{}") for prompt in prompts]
+        per_row_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        batched = cache.read_chunked(prompts, "{}")
+        batched_time = time.perf_counter() - start
+
+        assert per_row == batched
+        hits = sum(response is not None for response in batched)
+        print(
+            f"n={n:>8d}  hit ratio={hits / n:.2f}  "
+            f"per-row={per_row_time:8.3f}s  batched={batched_time:8.3f}s  "
+            f"speedup={per_row_time / batched_time:6.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    for n in [1_000, 10_000, 100_000, 500_000]:
+        bench(n)
@@ -0,0 +1,51 @@
+"""
+Benchmark cache write throughput: per-row `write` (one commit per row) vs the write-behind buffer.
+
+Usage:
+    >>> python benchmark/bench_cache_write.py
+"""
+
+import os
+import tempfile
+import time
+
+from alfred.client.cache import SQLiteCache
+
+
+def bench(n: int, disk_backed: bool):
+    prompts = [f"CompletionQuery(prompt=example prompt number {i})" for i in range(n)]
+    responses = [f'{{"prediction": "response {i}"}}' for i in range(n)]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # today's behavior: commit after every row
+        cache = SQLiteCache(
+            cache_location=os.path.join(tmp_dir, "per_row.sqlite3"),
+            disk_backed=disk_backed,
+        )
+        start = time.perf_counter()
+        for prompt, response in zip(prompts, responses):
+            cache.write(prompt, response, "{}")
+        cache.save()
+        per_row_rate = n / (time.perf_counter() - start)
+
+        cache = SQLiteCache(
+            cache_location=os.path.join(tmp_dir, "buffered.sqlite3"),
+            disk_backed=disk_backed,
+        )
+        start = time.perf_counter()
+        for prompt, response in zip(prompts, responses):
+            cache.buffered_write([prompt], [response], "{}")
+        cache.save()
+        buffered_rate = n / (time.perf_counter() - start)
+
+    print(
+        f"n={n:>7d}  {'disk-backed' if disk_backed else 'in-memory  '}  "
+        f"per-row={per_row_rate:10.0f} rows/s  buffered={buffered_rate:10.0f} rows/s  "
+        f"speedup={buffered_rate / per_row_rate:6.1f}x"
+    )
+
+
+if __name__ == "__main__":
+    for disk_backed in [False, True]:
+        for n in [1_000, 10_000, 100_000]:
+            bench(n, disk_backed)
@@ -0,0 +1,76 @@
+"""
+Benchmark gRPCServer.Run with a model of fixed per-batch overhead plus per-query cost, while the
+client uploads its queries at a steady rate: one batch after the whole stream has arrived
+(the previous behaviour, emulated with an unbounded batch and wait) vs streaming micro-batches.
+
+Usage:
+    >>> python benchmark/bench_grpc_streaming.py
+"""
+
+import asyncio
+import threading
+import time
+
+from alfred.fm.remote.grpc_client import gRPCClient
+from alfred.fm.remote.grpc_server import gRPCServer
+from alfred.fm.remote.protos import query_pb2
+from alfred.fm.response import CompletionResponse
+
+BATCH_OVERHEAD_S = 0.02
+QUERY_COST_S = 0.001
+UPLOAD_INTERVAL_S = 0.001
+
+
+class SlowModel:
+    def run(self, queries, **kwargs):
+        time.sleep(BATCH_OVERHEAD_S + QUERY_COST_S * len(queries))
+        return [CompletionResponse(query.prompt) for query in queries]
+
+
+def start_server(port, **kwargs):
+    def server_starter():
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        gRPCServer(model=SlowModel(), port=port, **kwargs)
+
+    threading.Thread(target=server_starter, daemon=True).start()
+
+
+def bench(port: int, n: int):
+    client = gRPCClient("localhost", port)
+    client.handshake()
+
+    def requests():
+        for request_id in range(n):
+            time.sleep(UPLOAD_INTERVAL_S)
+            yield query_pb2.RunRequest(
+                message=f"query {request_id}", request_id=request_id
+            )
+
+    start = time.perf_counter()
+    first = None
+    received = 0
+    for _ in client.stub.Run(requests(), metadata=(("session_id", client.session_id),)):
+        first = first or time.perf_counter() - start
+        received += 1
+    total = time.perf_counter() - start
+    assert received == n
+    client.close()
+    return first, total
+
+
+if __name__ == "__main__":
+    n = 1000
+    settings = {
+        "whole stream": dict(max_batch_size=10**9, max_wait_ms=float("inf")),
+        "micro-batches": dict(max_batch_size=64, max_wait_ms=10.0),
+    }
+    for port, (name, kwargs) in enumerate(settings.items(), start=10730):
+        start_server(port, **kwargs)
+    time.sleep(1)
+    print(
+        f"n={n}, upload every {UPLOAD_INTERVAL_S * 1e3:.0f}ms, model "
+        f"{BATCH_OVERHEAD_S * 1e3:.0f}ms/batch + {QUERY_COST_S * 1e3:.0f}ms/query"
+    )
+    for port, name in enumerate(settings, start=10730):
+        first, total = bench(port, n)
+        print(f"  {name:<14s} first response={first:6.3f}s  total={total:6.3f}s")
@@ -0,0 +1,109 @@
+"""
+Benchmark RankedQuery scoring on CPU: one forward pass per (prompt, candidate) pair
+vs prefix-shared scoring from the prompt KV cache (HuggingFaceModel(prefix_sharing=True)).
+
+A small randomly initialized GPT-2 is built locally by default, pass a HuggingFace model
+string (e.g. gpt2) as the first argument to benchmark a pretrained model instead.
+
+Usage:
+    >>> python benchmark/bench_prefix_scoring.py [model_string]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+import torch
+from tokenizers import ByteLevelBPETokenizer
+from transformers import GPT2Config, GPT2LMHeadModel, GPT2TokenizerFast
+
+from alfred.fm.huggingface import HuggingFaceModel
+from alfred.fm.query import RankedQuery
+
+WORDS = (
+    "the a movie review was great terrible plot actor scene film story good bad".split()
+)
+CANDIDATES = [
+    "positive",
+    "negative",
+    "neutral",
+    "mixed",
+    "unclear",
+    "very positive",
+    "very negative",
+    "sarcastic",
+    "enthusiastic",
+    "disappointed",
+]
+
+
+def save_small_gpt2(path: str):
+    corpus = [" ".join(random.choices(WORDS, k=64)) for _ in range(200)] + CANDIDATES
+    bpe = ByteLevelBPETokenizer()
+    bpe.train_from_iterator(corpus, vocab_size=1000, min_frequency=1)
+    tokenizer = GPT2TokenizerFast(tokenizer_object=bpe._tokenizer)
+    tokenizer.eos_token = tokenizer.pad_token = tokenizer.convert_ids_to_tokens(0)
+    model = GPT2LMHeadModel(
+        GPT2Config(
+            vocab_size=len(tokenizer),
+            n_positions=1024,
+            n_embd=256,
+            n_layer=4,
+            n_head=4,
+            bos_token_id=0,
+            eos_token_id=0,
+        )
+    )
+    model.save_pretrained(path)
+    tokenizer.save_pretrained(path)
+
+
+def bench(model: HuggingFaceModel, n: int, prompt_words: int):
+    queries = [
+        RankedQuery(" ".join(random.choices(WORDS, k=prompt_words)), CANDIDATES)
+        for _ in range(n)
+    ]
+    prompt_tokens = sum(
+        len(model.tokenizer(query.prompt, add_special_tokens=False).input_ids)
+        for query in queries
+    )
+    candidate_tokens = n * sum(
+        len(model.tokenizer(candidate).input_ids) for candidate in CANDIDATES
+    )
+
+    model.prefix_sharing = False
+    start = time.perf_counter()
+    pairwise = model.score(queries, batch_size=64, no_tqdm=True)
+    pairwise_time = time.perf_counter() - start
+
+    model.prefix_sharing = True
+    start = time.perf_counter()
+    shared = model.score(queries, batch_size=64, no_tqdm=True)
+    shared_time = time.perf_counter() - start
+
+    agreement = sum(a.prediction == b.prediction for a, b in zip(pairwise, shared)) / n
+    print(
+        f"n={n:>4d} prompt~{prompt_tokens // n:>4d} tok  "
+        f"pairwise: {prompt_tokens * len(CANDIDATES) + candidate_tokens:>8d} tok "
+        f"{pairwise_time:7.2f}s  "
+        f"prefix-shared: {prompt_tokens + candidate_tokens:>8d} tok {shared_time:7.2f}s  "
+        f"speedup={pairwise_time / shared_time:5.1f}x  agreement={agreement:.2f}"
+    )
+
+
+if __name__ == "__main__":
+    random.seed(0)
+    torch.manual_seed(0)
+    torch.set_num_threads(os.cpu_count() or 1)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if len(sys.argv) > 1:
+            model_string = sys.argv[1]
+        else:
+            os.chdir(tmp_dir)
+            model_string = "small/gpt2"
+            save_small_gpt2(model_string)
+        model = HuggingFaceModel(model_string, dtype="fp32")
+        for prompt_words in [32, 128, 256]:
+            bench(model, n=64, prompt_words=prompt_words)
@@ -0,0 +1,87 @@
+"""
+Benchmark ranked RunResponses on the wire: the previous `str(logits)` field parsed with
+`ast.literal_eval` and a per-response softmax (protocol version 1) vs candidates, logits and scores
+as packed arrays built into RankedResponses together (protocol version 3).
+
+Usage:
+    >>> python benchmark/bench_ranked_wire.py
+"""
+
+import ast
+import gc
+import time
+
+import torch
+import torch.nn.functional as F
+
+from alfred.fm.remote.grpc_client import gRPCClient
+from alfred.fm.remote.grpc_server import gRPCServer
+from alfred.fm.remote.protos import query_pb2
+from alfred.fm.response import RankedResponse
+
+
+def timeit(fn, *args):
+    gc.collect()
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def encode(responses, protocol_version):
+    return [
+        gRPCServer._to_run_response(response, protocol_version).SerializeToString()
+        for response in responses
+    ]
+
+
+def decode_v1(data):
+    # previous gRPCClient._run for ranked responses
+    output = []
+    for message in data:
+        response = query_pb2.RunResponse.FromString(message)
+        logits = ast.literal_eval(response.logit)
+        candidates = list(logits.keys())
+        probabilities = F.softmax(torch.tensor(list(logits.values())), dim=0)
+        scores = {
+            candidate: prob.item() for candidate, prob in zip(candidates, probabilities)
+        }
+        output.append(RankedResponse(response.message, scores=scores, logits=logits))
+    return output
+
+
+def decode_v3(data):
+    return gRPCClient._build_ranked_responses(
+        [query_pb2.RunResponse.FromString(message) for message in data]
+    )
+
+
+def bench(n: int, k: int):
+    candidates = [f"candidate {i}" for i in range(k)]
+    responses = []
+    for logits in torch.randn(n, k):
+        scores = F.softmax(logits, dim=0)
+        responses.append(
+            RankedResponse(
+                candidates[int(torch.argmax(logits))],
+                scores=dict(zip(candidates, scores.tolist())),
+                logits=dict(zip(candidates, logits.tolist())),
+            )
+        )
+    print(f"n={n}, {k} candidates")
+    for name, protocol_version, decode in [
+        ("str+literal_eval", 1, decode_v1),
+        ("packed arrays", 3, decode_v3),
+    ]:
+        encode_time, data = timeit(encode, responses, protocol_version)
+        decode_time, decoded = timeit(decode, data)
+        assert [r.prediction for r in decoded] == [r.prediction for r in responses]
+        size = sum(len(message) for message in data) / n
+        print(
+            f"  {name:<17s} server={encode_time / n * 1e6:7.1f}us  "
+            f"client={decode_time / n * 1e6:7.1f}us  size={size:7.0f}B/response"
+        )
+
+
+if __name__ == "__main__":
+    bench(20_000, 4)
+    bench(2_000, 100)
@@ -0,0 +1,54 @@
+"""
+Benchmark `reorder_array`: the previous zip-and-sort implementation vs the O(n) index scatter,
+for Python lists, NumPy arrays and tensors of 1e5 to 1e7 elements.
+
+Usage:
+    >>> python benchmark/bench_reorder.py
+"""
+
+import time
+
+import numpy as np
+import torch
+
+from alfred.fm.utils import reorder_array
+
+
+def sorted_reorder_array(arr, order):
+    # previous implementation, kept for comparison
+    return [x[0] for x in sorted(list(zip(arr, order)), key=lambda x: x[1])]
+
+
+def timeit(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def bench(n: int):
+    # a length sort as produced by DynamicBatcher
+    order = torch.sort(torch.randint(0, 512, (n,)), descending=True)[1]
+    inputs = {
+        "list": [f"response {i}" for i in range(n)],
+        "numpy": np.random.rand(n).astype(np.float32),
+        "tensor": torch.rand(n),
+    }
+    for kind, arr in inputs.items():
+        scatter_time, reordered = timeit(reorder_array, arr, order)
+        if kind == "tensor" and n > 1_000_000:
+            # sorting 1e7 0-d tensors takes minutes and several GB
+            print(
+                f"n={n:>9d}  {kind:<6s}  sorted=   skipped  scatter={scatter_time:8.4f}s"
+            )
+            continue
+        sorted_time, expected = timeit(sorted_reorder_array, arr, order.tolist())
+        assert all(a == b for a, b in zip(list(reordered[:1000]), expected[:1000]))
+        print(
+            f"n={n:>9d}  {kind:<6s}  sorted={sorted_time:8.3f}s  "
+            f"scatter={scatter_time:8.4f}s  speedup={sorted_time / scatter_time:7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    for n in [100_000, 1_000_000, 10_000_000]:
+        bench(n)
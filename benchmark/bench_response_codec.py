@@ -0,0 +1,98 @@
+"""
+Benchmark response serialization: the JSON string (`Response.serialize`) vs the binary record
+(`Response.to_bytes`) for the cache, and the previous gRPC RunResponse fields
+(str logits, torch.save embeddings) vs the binary record on the wire.
+
+Usage:
+    >>> python benchmark/bench_response_codec.py
+"""
+
+import ast
+import gc
+import time
+
+import torch
+
+from alfred.fm.remote.protos import query_pb2
+from alfred.fm.remote.utils import bytes_to_tensor, tensor_to_bytes
+from alfred.fm.response import RankedResponse, deserialize
+
+CANDIDATES = ["positive", "negative", "neutral", "mixed"]
+
+
+def timeit(fn, items):
+    gc.collect()
+    start = time.perf_counter()
+    result = [fn(item) for item in items]
+    return time.perf_counter() - start, result
+
+
+def legacy_wire_encode(response):
+    return query_pb2.RunResponse(
+        message=response.prediction,
+        ranked=True,
+        logit=str(response.logits),
+        embedding=tensor_to_bytes(response.embeddings),
+    ).SerializeToString()
+
+
+def legacy_wire_decode(data):
+    response = query_pb2.RunResponse.FromString(data)
+    return ast.literal_eval(response.logit), bytes_to_tensor(response.embedding)
+
+
+def wire_encode(response):
+    return query_pb2.RunResponse(
+        message=response.prediction,
+        ranked=True,
+        success=True,
+        response=response.to_bytes(),
+    ).SerializeToString()
+
+
+def wire_decode(data):
+    return deserialize(query_pb2.RunResponse.FromString(data).response)
+
+
+def report(name, n, encode_time, decode_time, records):
+    size = sum(len(record) for record in records)
+    print(
+        f"  {name:<14s} encode={encode_time / n * 1e6:7.1f}us  "
+        f"decode={decode_time / n * 1e6:7.1f}us  size={size / n:8.1f}B/response"
+    )
+
+
+def bench(n: int, dim: int):
+    responses = []
+    for logits in torch.randn(n, len(CANDIDATES)):
+        scores = torch.softmax(logits, dim=0)
+        responses.append(
+            RankedResponse(
+                CANDIDATES[int(torch.argmax(logits))],
+                scores=dict(zip(CANDIDATES, scores.tolist())),
+                logits=dict(zip(CANDIDATES, logits.tolist())),
+                embeddings=torch.randn(dim) if dim else None,
+            )
+        )
+    print(f"n={n}, {len(CANDIDATES)} candidates, embedding dim={dim}")
+
+    # note that the JSON string of a tensor is its truncated repr, so it does not round-trip
+    json_time, json_records = timeit(lambda r: r.serialize(), responses)
+    json_decode_time, _ = timeit(deserialize, json_records)
+    report("cache json", n, json_time, json_decode_time, json_records)
+    bin_time, bin_records = timeit(lambda r: r.to_bytes(), responses)
+    bin_decode_time, _ = timeit(deserialize, bin_records)
+    report("cache binary", n, bin_time, bin_decode_time, bin_records)
+
+    if dim:
+        legacy_time, legacy_records = timeit(legacy_wire_encode, responses)
+        legacy_decode_time, _ = timeit(legacy_wire_decode, legacy_records)
+        report("wire legacy", n, legacy_time, legacy_decode_time, legacy_records)
+        wire_time, wire_records = timeit(wire_encode, responses)
+        wire_decode_time, _ = timeit(wire_decode, wire_records)
+        report("wire binary", n, wire_time, wire_decode_time, wire_records)
+
+
+if __name__ == "__main__":
+    bench(20_000, 0)
+    bench(20_000, 768)
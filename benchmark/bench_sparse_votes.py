@@ -0,0 +1,64 @@
+"""
+Benchmark the memory of vote matrices: the dense float64 matrix stacked from `Voter.vote`
+vs the sparse CSR int8 matrix, and the time of `MajorityVote` on both.
+
+Usage:
+    >>> python benchmark/bench_sparse_votes.py
+"""
+
+import time
+
+import numpy as np
+from scipy import sparse
+
+from alfred.labeling import MajorityVote
+from alfred.voter import Voter
+
+N_CLASSES = 4
+
+
+def csr_nbytes(votes) -> int:
+    return votes.data.nbytes + votes.indices.nbytes + votes.indptr.nbytes
+
+
+def bench(n: int, n_lfs: int, coverage: float):
+    rng = np.random.default_rng(0)
+    label_map = {str(label): label for label in range(1, N_CLASSES + 1)}
+    voter = Voter(label_map)
+
+    dense = np.empty((n, n_lfs))
+    columns = []
+    for lf in range(n_lfs):
+        # every labeling function votes on a random `coverage` fraction of the examples
+        responses = np.where(
+            rng.random(n) < coverage, rng.integers(1, N_CLASSES + 1, n), 0
+        ).astype("U1")
+        dense[:, lf] = voter.vote(responses)
+        columns.append(voter.vote(responses, sparse=True))
+    sparse_votes = sparse.hstack(columns, format="csr")
+    del columns
+
+    label_model = MajorityVote()
+    start = time.perf_counter()
+    dense_labels = label_model(dense)
+    dense_time = time.perf_counter() - start
+    start = time.perf_counter()
+    sparse_labels = label_model(sparse_votes)
+    sparse_time = time.perf_counter() - start
+    assert np.array_equal(dense_labels, sparse_labels)
+
+    print(
+        f"n={n:>7d} lfs={n_lfs:>4d} coverage={coverage:4.2f}  "
+        f"dense float64: {dense.nbytes / 2**20:7.1f} MiB  "
+        f"csr int8: {csr_nbytes(sparse_votes) / 2**20:6.1f} MiB  "
+        f"majority vote: dense {dense_time:6.2f}s sparse {sparse_time:6.2f}s"
+    )
+
+
+if __name__ == "__main__":
+    for n, n_lfs, coverage in [
+        (100_000, 50, 0.1),
+        (100_000, 200, 0.05),
+        (1_000_000, 100, 0.02),
+    ]:
+        bench(n, n_lfs, coverage)
@@ -0,0 +1,72 @@
+"""
+Benchmark embedding framing in the gRPC protocol at 4096 dimensions: the previous
+`torch.save` / `torch.load` archives (protocol version 1) vs raw buffers with dtype and shape
+decoded with `torch.frombuffer` (protocol version 2), including the EncodeResponse (de)serialization.
+
+Usage:
+    >>> python benchmark/bench_tensor_framing.py
+"""
+
+import gc
+import time
+
+import torch
+
+from alfred.fm.remote.protos import query_pb2
+from alfred.fm.remote.utils import (
+    bytes_to_tensor,
+    proto_to_tensor,
+    tensor_to_bytes,
+    tensor_to_proto,
+)
+
+
+def timeit(fn, items):
+    gc.collect()
+    start = time.perf_counter()
+    result = [fn(item) for item in items]
+    return time.perf_counter() - start, result
+
+
+def encode_v1(tensor):
+    return query_pb2.EncodeResponse(
+        success=True, embedding=tensor_to_bytes(tensor)
+    ).SerializeToString()
+
+
+def decode_v1(data):
+    return bytes_to_tensor(query_pb2.EncodeResponse.FromString(data).embedding)
+
+
+def encode_v2(tensor):
+    return query_pb2.EncodeResponse(
+        success=True, tensor=tensor_to_proto(tensor)
+    ).SerializeToString()
+
+
+def decode_v2(data):
+    return proto_to_tensor(query_pb2.EncodeResponse.FromString(data).tensor)
+
+
+def bench(n: int, dim: int, dtype: torch.dtype):
+    # separate tensors, as a view would make torch.save write the whole storage
+    tensors = [torch.randn(dim).to(dtype) for _ in range(n)]
+    raw_size = tensors[0].numel() * tensors[0].element_size()
+    print(f"n={n}, dim={dim}, {dtype} ({raw_size} B raw)")
+    for name, encode, decode in [
+        ("torch.save", encode_v1, decode_v1),
+        ("raw framing", encode_v2, decode_v2),
+    ]:
+        encode_time, messages = timeit(encode, tensors)
+        decode_time, decoded = timeit(decode, messages)
+        assert all(torch.equal(a, b) for a, b in zip(decoded, tensors))
+        size = sum(len(message) for message in messages) / n
+        print(
+            f"  {name:<12s} encode={n / encode_time:9.0f}/s  decode={n / decode_time:9.0f}/s  "
+            f"size={size:8.0f}B (+{size - raw_size:.0f}B)"
+        )
+
+
+if __name__ == "__main__":
+    bench(5_000, 4096, torch.float32)
+    bench(5_000, 4096, torch.bfloat16)
@@ -0,0 +1,63 @@
+"""
+Benchmark `Voter.vote` over calibrated RankedResponses: the previous per-response loop
+vs the batched (n, k) logits path.
+
+Usage:
+    >>> python benchmark/bench_voter.py
+"""
+
+import time
+
+import numpy as np
+
+from alfred.fm.response import RankedResponse
+from alfred.voter import Voter
+
+LABELS = ["positive", "negative", "neutral", "mixed"]
+
+
+def loop_vote(voter, responses, label_map):
+    # previous implementation of Voter.vote for calibrated ranked responses
+    weights, biases = voter._calibration
+    votes = np.zeros(len(responses))
+    for idx, response in enumerate(responses):
+        scores = list(response.logits.values())
+        labels = list(response.logits.keys())
+        calibrated_scores = np.array(weights) @ np.array(scores) + np.array(biases)
+        prediction = labels[np.argmax(calibrated_scores)]
+        for k_idx, key in enumerate(label_map.keys()):
+            if prediction == key:
+                votes[idx] = label_map[key]
+    return votes
+
+
+def bench(n: int):
+    rng = np.random.default_rng(0)
+    responses = [
+        RankedResponse(LABELS[0], scores={}, logits=dict(zip(LABELS, row)))
+        for row in rng.normal(size=(n, len(LABELS))).tolist()
+    ]
+    label_map = {label: idx + 1 for idx, label in enumerate(LABELS)}
+    voter = Voter(label_map)
+    voter.set_calibration(
+        np.diag(rng.uniform(0.5, 1.5, len(LABELS))), rng.normal(size=len(LABELS))
+    )
+
+    start = time.perf_counter()
+    loop_votes = loop_vote(voter, responses, label_map)
+    loop_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    votes = voter.vote(responses)
+    batched_time = time.perf_counter() - start
+
+    assert np.array_equal(votes, loop_votes)
+    print(
+        f"n={n:>8d}  loop={loop_time:8.3f}s  batched={batched_time:7.3f}s  "
+        f"speedup={loop_time / batched_time:6.1f}x"
+    )
+
+
+if __name__ == "__main__":
+    for n in [10_000, 100_000, 1_000_000]:
+        bench(n)
@@ -0,0 +1,76 @@
+"""
+Benchmark loading a WRENCH split: the previous `json.load` of the whole file vs the
+streaming parse into an Arrow cache (first load) and the memory-mapped cache (later loads).
+
+Usage:
+    >>> python benchmark/bench_wrench_load.py
+"""
+
+import gc
+import json
+import os
+import tempfile
+import time
+
+from alfred.data.wrench import WrenchBenchmarkDataset
+
+
+def rss_mib() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def timeit(fn, *args, **kwargs):
+    gc.collect()
+    rss = rss_mib()
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - start, rss_mib() - rss, result
+
+
+def json_load(path):
+    # what the previous constructor started with
+    with open(path) as f:
+        return json.load(f)
+
+
+def bench(n: int):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.makedirs(os.path.join(tmp_dir, "toy"))
+        path = os.path.join(tmp_dir, "toy", "train.json")
+        with open(path, "w") as f:
+            json.dump(
+                {
+                    str(uid): {
+                        "data": {"text": f"review number {uid} " * 8, "id": uid},
+                        "label": uid % 2,
+                        "weak_labels": [-1, 0, 1, -1, 1],
+                    }
+                    for uid in range(n)
+                },
+                f,
+            )
+        size = os.path.getsize(path) / 2**20
+        cache_dir = os.path.join(tmp_dir, "cache")
+        kwargs = dict(local_path=tmp_dir, cache_dir=cache_dir)
+
+        cold_time, cold_rss, dataset = timeit(WrenchBenchmarkDataset, "toy", **kwargs)
+        del dataset
+        cached_time, cached_rss, dataset = timeit(
+            WrenchBenchmarkDataset, "toy", **kwargs
+        )
+        assert len(dataset) == n
+        del dataset
+        json_time, json_rss, raw_data = timeit(json_load, path)
+        del raw_data
+
+        print(
+            f"n={n:>8d} ({size:6.1f} MiB)  json.load={json_time:7.3f}s (+{json_rss:6.1f} MiB)  "
+            f"stream+cache={cold_time:7.3f}s (+{cold_rss:6.1f} MiB)  "
+            f"cached={cached_time:7.4f}s (+{cached_rss:5.1f} MiB)"
+        )
+
+
+if __name__ == "__main__":
+    for n in [10_000, 100_000, 1_000_000]:
+        bench(n)
@@ -0,0 +1,150 @@
+import threading
+import time
+import unittest
+
+from alfred.fm.model import APIAccessFoundationModel
+from alfred.fm.query import CompletionQuery, RankedQuery
+from alfred.fm.response import CompletionResponse, RankedResponse
+from alfred.fm.utils import RateLimiter, is_rate_limit_error, retry, retry_delay
+
+
+class RateLimitError(Exception):
+    def __init__(self, retry_after):
+        self.status_code = 429
+        self.response = type("Response", (), {"headers": {"retry-after": retry_after}})
+
+
+class SlowAPIModel(APIAccessFoundationModel):
+    max_concurrency = 4
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.rate_limited = set()
+        super().__init__("slow-api")
+
+    def _query(self, query, **kwargs):
+        if query in self.rate_limited:
+            self.rate_limited.remove(query)
+            raise RateLimitError("0.05")
+        with self.lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        # later queries finish first to make sure the output is not in completion order
+        time.sleep(0.01 * (1 + int(query.split()[-1]) % 3))
+        with self.lock:
+            self.in_flight -= 1
+        return query.upper()
+
+    def _generate_batch(self, batch_instance, **kwargs):
+        predictions = self._concurrent_map(self._query, batch_instance, **kwargs)
+        return [CompletionResponse(prediction=prediction) for prediction in predictions]
+
+    def _score_batch(self, batch_instance, **kwargs):
+        predictions = self._concurrent_map(
+            self._query, [query.prompt for query in batch_instance], **kwargs
+        )
+        return [
+            RankedResponse(prediction=prediction, scores={})
+            for prediction in predictions
+        ]
+
+
+class TestAPIAccessFoundationModel(unittest.TestCase):
+    def setUp(self):
+        self.model = SlowAPIModel()
+
+    def test_generate_keeps_order(self):
+        queries = [f"query {i}" for i in range(20)]
+        responses = self.model.run(queries, batch_size=7, no_tqdm=True)
+        self.assertEqual(
+            [response.prediction for response in responses],
+            [query.upper() for query in queries],
+        )
+        self.assertEqual(self.model.peak_in_flight, 4)
+
+    def test_completion_and_ranked_queries(self):
+        responses = self.model.run(
+            [CompletionQuery(f"query {i}") for i in range(5)], no_tqdm=True
+        )
+        self.assertEqual(responses[3].prediction, "QUERY 3")
+
+        responses = self.model.run(
+            [RankedQuery(f"query {i}", candidates=["a", "b"]) for i in range(5)],
+            no_tqdm=True,
+        )
+        self.assertIsInstance(responses[0], RankedResponse)
+        self.assertEqual(responses[4].prediction, "QUERY 4")
+
+    def test_sequential_fallback(self):
+        self.model.max_concurrency = 1
+        self.model.run([f"query {i}" for i in range(6)], no_tqdm=True)
+        self.assertEqual(self.model.peak_in_flight, 1)
+
+    def test_rate_limited_retry(self):
+        self.model.rate_limited = {"query 1", "query 2"}
+        start = time.monotonic()
+        responses = self.model.run([f"query {i}" for i in range(4)], no_tqdm=True)
+        self.assertGreaterEqual(time.monotonic() - start, 0.05)
+        self.assertEqual(responses[2].prediction, "QUERY 2")
+        self.assertFalse(self.model.rate_limited)
+
+    def test_shared_rate_limiter(self):
+        self.model.rate_limiter = RateLimiter(requests_per_minute=600)
+        self.model.rate_limiter._requests = 0
+        start = time.monotonic()
+        self.model.run([f"query {i}" for i in range(3)], no_tqdm=True)
+        self.assertGreaterEqual(time.monotonic() - start, 0.25)
+
+    def test_retried_in_one_place(self):
+        attempts = []
+
+        @retry(num_retries=3, wait_time=0.001)
+        def _query(model, query, error):
+            attempts.append(query)
+            raise error
+
+        self.model.max_retries = 2
+        with self.assertRaises(RateLimitError):
+            self.model._rate_limited_call(
+                lambda query: _query(self.model, query, RateLimitError("0")), "query"
+            )
+        # the retries of the decorator are not multiplied by those of the model
+        self.assertEqual(len(attempts), 3)
+
+        attempts.clear()
+        with self.assertRaises(ValueError):
+            self.model._rate_limited_call(
+                lambda query: _query(self.model, query, ValueError()), "query"
+            )
+        self.assertEqual(len(attempts), 4)
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_token_bucket(self):
+        limiter = RateLimiter(requests_per_minute=6000, tokens_per_minute=600)
+        limiter.acquire(tokens=600)
+        start = time.monotonic()
+        limiter.acquire(tokens=3)
+        self.assertGreaterEqual(time.monotonic() - start, 0.29)
+
+    def test_pause(self):
+        limiter = RateLimiter()
+        limiter.pause(0.1)
+        start = time.monotonic()
+        limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+    def test_retry_delay(self):
+        self.assertTrue(is_rate_limit_error(RateLimitError("1")))
+        self.assertFalse(is_rate_limit_error(ValueError()))
+        self.assertEqual(retry_delay(RateLimitError("1.5"), attempt=0), 1.5)
+        for attempt in range(8):
+            delay = retry_delay(ValueError(), attempt, wait_time=0.1, max_wait_time=5)
+            self.assertLessEqual(delay, min(0.1 * 2**attempt, 5))
+            self.assertGreaterEqual(delay, min(0.1 * 2**attempt, 5) / 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,11 @@
 import unittest
 
-from alfred.fm.utils import DynamicBatcher
+import numpy as np
+import torch
+
+from alfred.fm.dummy import DummyModel
+from alfred.fm.query import RankedQuery
+from alfred.fm.utils import DynamicBatcher, reorder_array
 
 # from torch import cuda
 
@@ -52,6 +57,38 @@ class TestDynamicBatcher(unittest.TestCase):
             for (x, y) in zip(reordered_inst, ["query 2", "query 1", "query 3"])
         ]
 
+    def test_reorder_offset(self):
+        queries = ["a", "bbbb", "cc", "ddd"]
+        batcher = DynamicBatcher(queries, max_batch_size=2)
+        batcher.batch()
+        self.assertEqual(batcher.len_sorted_idx.tolist(), [1, 3, 2, 0])
+
+        # responses for sorted positions 1 and 2, i.e. queries 3 and 2
+        self.assertEqual(
+            batcher.reorder(["response ddd", "response cc"], offset=1),
+            ["response cc", "response ddd"],
+        )
+        with self.assertRaises(ValueError):
+            batcher.reorder(["x", "y"], offset=3)
+
+    def test_reorder_array(self):
+        order = [2, 0, 3, 1]
+        expected = ["c", "a", "d", "b"]
+        self.assertEqual(reorder_array(["a", "b", "c", "d"], [1, 3, 0, 2]), expected)
+        self.assertEqual(
+            reorder_array(["a", "b", "c", "d"], torch.tensor([1, 3, 0, 2])), expected
+        )
+        np.testing.assert_array_equal(
+            reorder_array(np.array([10.0, 20.0, 30.0, 40.0]), np.array(order)),
+            [20.0, 40.0, 10.0, 30.0],
+        )
+        self.assertTrue(
+            torch.equal(
+                reorder_array(torch.tensor([[1], [2], [3], [4]]), order),
+                torch.tensor([[2], [4], [1], [3]]),
+            )
+        )
+
     def test_simple_batch(self):
         queries = ["query1", "query2", "query3", "query4", "query5"]
 
@@ -67,3 +104,60 @@ class TestDynamicBatcher(unittest.TestCase):
         # Figure out how to simulate low GPU memory
         queries = ["query1", "query2", "query3", "query4", "query5"]
         pass
+
+
+class FlakyDummyModel(DummyModel):
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+
+    def _generate_batch(self, batch_instance, **kwargs):
+        self.batches.append(len(batch_instance))
+        if len(self.batches) == 2:
+            raise RuntimeError("CUDA out of memory")
+        return super()._generate_batch(batch_instance, **kwargs)
+
+    def _score_batch(self, batch_instance, **kwargs):
+        return [
+            {
+                "logit": float(len(candidate)),
+                "candidate": candidate,
+                "hidden_state": None,
+            }
+            for _, candidate in batch_instance
+        ]
+
+
+class TestStreaming(unittest.TestCase):
+    def setUp(self):
+        self.model = DummyModel()
+        self.queries = [f"query {'x' * (i % 4)} {i}" for i in range(10)]
+
+    def test_stream(self):
+        streamed = list(self.model.stream(self.queries, batch_size=3, no_tqdm=True))
+        self.assertEqual(sorted(idx for idx, _ in streamed), list(range(10)))
+        self.assertNotEqual([idx for idx, _ in streamed], list(range(10)))
+        for idx, response in streamed:
+            self.assertEqual(response.prediction, self.queries[idx])
+
+        responses = self.model.forward(self.queries, batch_size=3, no_tqdm=True)
+        self.assertEqual([r.prediction for r in responses], self.queries)
+
+    def test_stream_ranked(self):
+        model = FlakyDummyModel()
+        queries = [RankedQuery(query, ["a", "bbb", "cc"]) for query in self.queries]
+        streamed = list(model.stream(queries, batch_size=4, no_tqdm=True))
+        self.assertEqual(sorted(idx for idx, _ in streamed), list(range(10)))
+        self.assertTrue(all(response.prediction == "bbb" for _, response in streamed))
+
+    def test_stream_out_of_memory(self):
+        model = FlakyDummyModel()
+        streamed = list(
+            model.stream(
+                self.queries, batch_policy="static", batch_size=4, no_tqdm=True
+            )
+        )
+        self.assertEqual(model.batches, [4, 4, 3, 3])
+        self.assertEqual(sorted(idx for idx, _ in streamed), list(range(10)))
+        for idx, response in streamed:
+            self.assertEqual(response.prediction, self.queries[idx])
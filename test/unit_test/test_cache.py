@@ -0,0 +1,254 @@
+import gc
+import os
+import sqlite3
+import tempfile
+import unittest
+import weakref
+
+from alfred.client.cache import SQLiteCache
+from alfred.client.cache.cache import read_manifest
+from alfred.fm.query import CompletionQuery
+from alfred.fm.response import CompletionResponse
+
+
+class TestSQLiteCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_location = os.path.join(self.tmp_dir.name, "test.sqlite3")
+        self.cache = SQLiteCache(cache_location=self.cache_location)
+        self.model_calls = []
+
+        def model_run(queries, **kwargs):
+            queries = queries if isinstance(queries, list) else [queries]
+            self.model_calls.append(len(queries))
+            return [CompletionResponse(query.prompt) for query in queries]
+
+        self.cached_run = self.cache.cached_query(model_run)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_read_batch(self):
+        self.cache.write_batch(["a", "b"], ["response a", "response b"], "{}")
+        self.assertEqual(
+            self.cache.read_batch(["b", "c", "a", "a"], "{}"),
+            ["response b", None, "response a", "response a"],
+        )
+        self.assertEqual(self.cache.read_batch(["a"], "{'x': 1}"), [None])
+
+    def test_digest_keyed_reads(self):
+        self.cache.write("a", "response a", "{}")
+        self.cache.write("a", "response a'", "{'x': 1}")
+        self.assertEqual(self.cache.read("a", "{}"), "response a")
+        self.assertEqual(self.cache.read("a", "{'x': 1}"), "response a'")
+        self.assertEqual(len(self.cache.read_by_prompt("a")), 2)
+        self.assertEqual(
+            self.cache.read_by_prompts_and_metadata(["a", "b"], "{}"),
+            [("a", "{}", "response a")],
+        )
+        plan = self.cache.cache_db.execute(
+            "EXPLAIN QUERY PLAN SELECT response FROM prompt_cache WHERE key = ?",
+            (b"",),
+        ).fetchall()
+        self.assertIn("USING INDEX", plan[0][-1])
+
+    def test_legacy_migration(self):
+        legacy_location = os.path.join(self.tmp_dir.name, "legacy.sqlite3")
+        con = sqlite3.connect(legacy_location)
+        con.execute(
+            "CREATE TABLE prompt_cache (prompt text, metadata text, response text, "
+            "PRIMARY KEY (prompt, metadata));"
+        )
+        con.executemany(
+            "INSERT INTO prompt_cache VALUES (?, ?, ?)",
+            [("a", "{}", "response a"), ("b", None, "response b")],
+        )
+        con.commit()
+        con.close()
+
+        cache = SQLiteCache(cache_location=legacy_location)
+        self.assertEqual(
+            cache.read_batch(["a", "b", "c"], "{}"), ["response a", "response b", None]
+        )
+        self.assertEqual(cache.cache_db.execute("PRAGMA user_version").fetchone()[0], 2)
+
+        cache.save()
+        cache = SQLiteCache(cache_location=legacy_location)
+        self.assertEqual(cache.read("a", "{}"), "response a")
+
+    def test_disk_backed(self):
+        disk_location = os.path.join(self.tmp_dir.name, "disk", "cache.sqlite3")
+        cache = SQLiteCache(cache_location=disk_location, disk_backed=True)
+        other = SQLiteCache(cache_location=disk_location, disk_backed=True)
+        self.assertEqual(
+            cache.cache_db.execute("PRAGMA journal_mode").fetchone()[0], "wal"
+        )
+
+        cache.write_batch(["a", "b"], ["response a", "response b"], "{}")
+        self.assertEqual(cache.read("a", "{}"), "response a")
+        self.assertEqual(
+            other.read_batch(["a", "b"], "{}"), ["response a", "response b"]
+        )
+
+        # rows written in a transaction only become visible once it ends
+        with cache.transaction():
+            cache.write("c", "response c", "{}")
+            self.assertEqual(other.read("c", "{}"), None)
+        self.assertEqual(other.read("c", "{}"), "response c")
+
+    def test_disk_backed_shared_file(self):
+        disk_location = os.path.join(self.tmp_dir.name, "shared.sqlite3")
+        cache = SQLiteCache(cache_location=disk_location, disk_backed=True)
+        other = SQLiteCache(cache_location=disk_location, disk_backed=True)
+        # fail fast instead of waiting for the 30s busy timeout if a write lock is left behind
+        other.cache_db.execute("PRAGMA busy_timeout = 100")
+        cache.cache_db.execute("PRAGMA busy_timeout = 100")
+
+        cache.write("a", "response a", "{}")
+        other.write("b", "response b", "{}")
+        cache.write_batch(["c", "d"], ["response c", "response d"], "{}")
+        other.write_batch(["e"], ["response e"], "{}")
+        for reader in (cache, other):
+            self.assertEqual(
+                reader.read_batch(["a", "b", "c", "d", "e"], "{}"),
+                [f"response {key}" for key in "abcde"],
+            )
+
+    def test_buffered_write(self):
+        self.cache.write_buffer_size = 3
+        self.cache.write_buffer_interval_ms = 60_000
+        self.cache.buffered_write(["a", "b"], ["response a", "response b"], "{}")
+        self.assertEqual(self.cache.read_batch(["a", "b"], "{}"), [None, None])
+        self.assertEqual(
+            self.cache.read_chunked(["a", "b", "c"], "{}"),
+            ["response a", "response b", None],
+        )
+
+        # the other readers flush the buffer
+        self.assertEqual(self.cache.read("a", "{}"), "response a")
+        self.assertEqual(len(self.cache.read_by_prompt("b")), 1)
+        self.assertEqual(
+            self.cache.read_batch(["a", "b"], "{}"), ["response a", "response b"]
+        )
+
+        self.cache.buffered_write(["c", "d"], ["response c", "response d"], "{}")
+        self.assertEqual(self.cache.read_batch(["c", "d"], "{}"), [None, None])
+        self.cache.buffered_write(["e"], ["response e"], "{}")
+        self.assertEqual(
+            self.cache.read_batch(["c", "d", "e"], "{}"),
+            ["response c", "response d", "response e"],
+        )
+
+        self.cache.buffered_write(["f"], ["response f"], "{}")
+        self.assertEqual(len(self.cache.to_pandas()), 6)
+        self.cache.buffered_write(["d"], ["response d"], "{}")
+        self.cache.save()
+        self.assertEqual(
+            SQLiteCache(cache_location=self.cache_location).read("d", "{}"),
+            "response d",
+        )
+
+    def test_buffered_cache_is_not_kept_alive(self):
+        cache = SQLiteCache(cache_location=self.cache_location)
+        cache.buffered_write(["a"], ["response a"], "{}")
+        ref = weakref.ref(cache)
+        del cache
+        gc.collect()
+        self.assertIsNone(ref())
+
+    def test_flush_closed_connection(self):
+        self.cache.buffered_write(["a"], ["response a"], "{}")
+        self.cache.cache_db.close()
+        with self.assertLogs("alfred.client.cache.sqlite", "WARNING") as logs:
+            self.cache.flush()
+        self.assertIn("Dropped 1 buffered cache writes", logs.output[0])
+        # nothing left to drop
+        self.cache.flush()
+
+    def test_transaction_rollback(self):
+        with self.assertRaises(RuntimeError):
+            with self.cache.transaction():
+                self.cache.write("a", "response a", "{}")
+                raise RuntimeError
+        self.assertIsNone(self.cache.read("a", "{}"))
+
+    def test_cached_query(self):
+        queries = [CompletionQuery(f"query {i}") for i in range(10)]
+        responses = self.cached_run(queries[:6])
+        self.assertEqual(self.model_calls, [6])
+        self.assertEqual(self.cache.last_hit_ratio, 0.0)
+
+        responses = self.cached_run(queries)
+        self.assertEqual(self.model_calls, [6, 4])
+        self.assertAlmostEqual(self.cache.last_hit_ratio, 0.6)
+        self.assertEqual(
+            [response.prediction for response in responses],
+            [query.prompt for query in queries],
+        )
+
+    def test_binary_responses(self):
+        query = CompletionQuery("query")
+        self.cached_run([query])
+        (record,) = self.cache.read_chunked([query.serialize()], "{}")
+        self.assertIsInstance(record, bytes)
+
+        # rows written as JSON by older versions are still served
+        self.cache.flush()
+        self.cache.write(
+            query.serialize(), CompletionResponse("legacy").serialize(), "{}"
+        )
+        self.cache.save()
+        cache = SQLiteCache(cache_location=self.cache_location)
+        responses = cache.cached_query(lambda queries, **kwargs: [])([query])
+        self.assertEqual(responses[0].prediction, "legacy")
+
+    def test_cached_query_chunked(self):
+        self.cache.lookup_chunk_size = 3
+        queries = [CompletionQuery(f"query {i}") for i in range(10)]
+        self.cached_run(queries[::2])
+        responses = self.cached_run(queries)
+        self.assertEqual(self.model_calls, [5, 5])
+        self.assertEqual(
+            [response.prediction for response in responses],
+            [query.prompt for query in queries],
+        )
+
+    def test_resumable_query(self):
+        queries = [CompletionQuery(f"query {i}") for i in range(10)]
+        fail_at = [3]
+
+        def flaky_run(queries, **kwargs):
+            self.model_calls.append(len(queries))
+            if len(self.model_calls) == fail_at[0]:
+                raise RuntimeError("preempted")
+            return [CompletionResponse(query.prompt) for query in queries]
+
+        resumable_run = self.cache.resumable_query(flaky_run, checkpoint_size=3)
+        with self.assertRaises(RuntimeError):
+            resumable_run(queries)
+        manifest = read_manifest(f"{self.cache_location}.manifest.json")
+        self.assertEqual(manifest["status"], "failed")
+        self.assertEqual(manifest["completed"], 6)
+        self.assertEqual(manifest["chunks_completed"], 2)
+
+        # the completed chunks survive the failed run
+        cache = SQLiteCache(cache_location=self.cache_location)
+        self.assertEqual(
+            cache.read_chunked([q.serialize() for q in queries], "{}").count(None), 4
+        )
+
+        fail_at[0] = -1
+        responses = resumable_run(queries)
+        self.assertEqual(self.model_calls, [3, 3, 3, 3, 1])
+        self.assertEqual(
+            [response.prediction for response in responses],
+            [query.prompt for query in queries],
+        )
+        manifest = read_manifest(f"{self.cache_location}.manifest.json")
+        self.assertEqual(manifest["status"], "done")
+        self.assertEqual(manifest["attempt"], 2)
+        self.assertEqual((manifest["cached"], manifest["completed"]), (6, 10))
+
+
+if __name__ == "__main__":
+    unittest.main()
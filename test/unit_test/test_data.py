@@ -1,6 +1,14 @@
+import json
+import os
+import tempfile
 import unittest
+from unittest import mock
 
-from alfred.data import from_csv
+import pyarrow
+
+from alfred.data import BufferedArrowDataset, IterableArrowDataset, from_csv
+from alfred.data.wrench import WrenchBenchmarkDataset, iter_json_items
+from alfred.template import StringTemplate
 
 
 class TestDataset(unittest.TestCase):
@@ -23,5 +31,197 @@ class TestDataset(unittest.TestCase):
             self.assertEqual(len(row), 5)
 
 
+class TestIterableArrowDataset(unittest.TestCase):
+    def test_random_access(self):
+        table = pyarrow.concat_tables(
+            [
+                pyarrow.table({"id": list(range(start, start + 7))})
+                for start in range(0, 35, 7)
+            ]
+        )
+        dataset = IterableArrowDataset(table)
+        self.assertEqual(dataset[0], {"id": 0})
+        self.assertEqual(dataset[15], {"id": 15})
+        self.assertEqual(dataset[-1], {"id": 34})
+        with self.assertRaises(IndexError):
+            dataset[35]
+
+        indices = [34, 0, 8, 8, 21, 6]
+        self.assertEqual(dataset.take(indices), [{"id": i} for i in indices])
+        self.assertEqual(dataset[indices], dataset.take(indices))
+        self.assertEqual(list(dataset[5:9]), [{"id": i} for i in range(5, 9)])
+        self.assertEqual(dataset[::10], [{"id": i} for i in range(0, 35, 10)])
+
+
+class TestWrenchBenchmarkDataset(unittest.TestCase):
+    def test_local_dataset(self):
+        raw_data = {
+            str(uid): {
+                "data": {"text": f"text {uid}", "entity": uid, "spans": [0, 1]},
+                "label": uid % 2,
+                "weak_labels": [-1, uid % 2],
+            }
+            for uid in range(5)
+        }
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            os.makedirs(os.path.join(tmp_dir, "toy"))
+            with open(os.path.join(tmp_dir, "toy", "test.json"), "w") as f:
+                json.dump(raw_data, f)
+            dataset = WrenchBenchmarkDataset(
+                "toy", split="test", local_path=tmp_dir, cache_dir=tmp_dir
+            )
+
+        self.assertEqual(dataset.shape, (5, 4))
+        self.assertFalse(hasattr(dataset, "data_list"))
+        self.assertEqual(
+            dataset[3], {"uid": "3", "text": "text 3", "entity": 3, "label": 1}
+        )
+        self.assertEqual(getattr(dataset, "2")["text"], "text 2")
+        self.assertEqual(
+            [row["entity"] for row in dataset.take_uids(["4", "0"])], [4, 0]
+        )
+        self.assertEqual(dataset.labels, [0, 1, 0, 1, 0])
+
+    def test_iter_json_items(self):
+        raw_data = {
+            f"uid {i}": {"data": {"text": "x" * i, "score": i / 7}, "label": -i}
+            for i in range(50)
+        }
+        raw_data["empty"] = {"data": {"nested": [{}, []]}, "label": 1e-20}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "split.json")
+            with open(path, "w") as f:
+                json.dump(raw_data, f, indent=2)
+            # tiny chunks split keys, strings and numbers across reads
+            for chunk_size in [1, 7, 1 << 20]:
+                self.assertEqual(
+                    dict(iter_json_items(path, chunk_size=chunk_size)), raw_data
+                )
+
+            with open(path, "w") as f:
+                f.write(" { } ")
+            self.assertEqual(list(iter_json_items(path)), [])
+
+    def test_arrow_cache(self):
+        raw_data = {
+            str(uid): {"data": {"text": f"text {uid}"}, "label": uid % 3}
+            for uid in range(20)
+        }
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            os.makedirs(os.path.join(tmp_dir, "toy"))
+            path = os.path.join(tmp_dir, "toy", "train.json")
+            with open(path, "w") as f:
+                json.dump(raw_data, f)
+            cache_dir = os.path.join(tmp_dir, "cache")
+
+            dataset = WrenchBenchmarkDataset(
+                "toy", local_path=tmp_dir, cache_dir=cache_dir, batch_size=8
+            )
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+            self.assertEqual(dataset.uids, list(raw_data))
+            self.assertEqual(dataset[19], {"uid": "19", "text": "text 19", "label": 1})
+
+            # the second load memory-maps the cache
+            cached = WrenchBenchmarkDataset(
+                "toy", local_path=tmp_dir, cache_dir=cache_dir, batch_size=8
+            )
+            self.assertTrue(cached.data().equals(dataset.data()))
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+            # a copy of the split with the same name, size and mtime gets its own cache
+            copy_dir = os.path.join(tmp_dir, "copy")
+            os.makedirs(os.path.join(copy_dir, "toy"))
+            copy_path = os.path.join(copy_dir, "toy", "train.json")
+            with open(copy_path, "w") as f:
+                json.dump(dict(reversed(list(raw_data.items()))), f)
+            os.utime(
+                copy_path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns)
+            )
+            copy = WrenchBenchmarkDataset(
+                "toy", local_path=copy_dir, cache_dir=cache_dir
+            )
+            self.assertEqual(len(os.listdir(cache_dir)), 2)
+            self.assertEqual(copy.uids, list(reversed(list(raw_data))))
+
+            # modifying the split invalidates its cache, which is replaced
+            raw_data["20"] = {"data": {"text": "text 20"}, "label": 2}
+            with open(path, "w") as f:
+                json.dump(raw_data, f)
+            os.utime(path, ns=(0, 0))
+            updated = WrenchBenchmarkDataset(
+                "toy", local_path=tmp_dir, cache_dir=cache_dir
+            )
+            self.assertEqual(len(os.listdir(cache_dir)), 2)
+            self.assertEqual(updated.uid2label["20"], 2)
+
+            # so does a new cache version
+            with mock.patch("alfred.data.wrench.ARROW_CACHE_VERSION", 2):
+                WrenchBenchmarkDataset("toy", local_path=tmp_dir, cache_dir=cache_dir)
+            self.assertEqual(len(os.listdir(cache_dir)), 2)
+            self.assertEqual(
+                sum("_v2_" in file_name for file_name in os.listdir(cache_dir)), 1
+            )
+
+            uncached = WrenchBenchmarkDataset(
+                "toy", local_path=tmp_dir, use_cache=False
+            )
+            self.assertTrue(uncached.data().equals(updated.data()))
+
+
+class TestBufferedArrowDataset(unittest.TestCase):
+    def setUp(self):
+        self.table = pyarrow.table(
+            {
+                "id": list(range(10)),
+                "text": [f"text {i}" for i in range(10)],
+                "label": [i % 2 for i in range(10)],
+            }
+        )
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "dataset.arrow")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_memory_mapped_round_trip(self):
+        BufferedArrowDataset(self.table).save_to_disk(self.path)
+        dataset = BufferedArrowDataset(self.path)
+        self.assertEqual(dataset.shape, (10, 3))
+        self.assertTrue(dataset.data().equals(self.table))
+        self.assertEqual(list(dataset), self.table.to_pylist())
+
+        loaded = BufferedArrowDataset(self.table.slice(0, 0)).load_from_disk(self.path)
+        self.assertTrue(loaded.data().equals(self.table))
+
+        # IPC stream buffers are still supported
+        sink = pyarrow.BufferOutputStream()
+        with pyarrow.ipc.new_stream(sink, self.table.schema) as writer:
+            writer.write_table(self.table)
+        self.assertTrue(BufferedArrowDataset(sink.getvalue()).data().equals(self.table))
+
+    def test_getitem_and_projection(self):
+        BufferedArrowDataset(self.table).save_to_disk(self.path)
+        dataset = BufferedArrowDataset(self.path, columns=["text"])
+        self.assertEqual(dataset.column_names, ["text"])
+        self.assertEqual(dataset[3], {"text": "text 3"})
+        self.assertEqual(dataset[-1], {"text": "text 9"})
+        with self.assertRaises(IndexError):
+            dataset[10]
+
+        sliced = dataset[2:5]
+        self.assertIsInstance(sliced, BufferedArrowDataset)
+        self.assertEqual(list(sliced), [{"text": f"text {i}"} for i in range(2, 5)])
+        self.assertEqual(
+            [row["text"] for row in dataset[::4]], ["text 0", "text 4", "text 8"]
+        )
+
+        projected = BufferedArrowDataset(self.path).select(["label"])
+        self.assertEqual(projected.shape, (10, 1))
+        self.assertEqual(
+            StringTemplate("[[text]]?").render_table(dataset[:2]).to_pylist(),
+            ["text 0?", "text 1?"],
+        )
+
+
 if __name__ == "__main__":
     unittest.main()
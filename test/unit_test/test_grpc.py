@@ -2,11 +2,21 @@ import threading
 import time
 import unittest
 import asyncio
+import importlib
+import warnings
 
+import grpc
+import numpy as np
+import torch
+
+import alfred.fm.remote.utils
 from alfred.client import Client
 from alfred.fm.query import CompletionQuery
 from alfred.fm.remote.grpc_server import gRPCServer
 from alfred.fm.remote.grpc_client import gRPCClient
+from alfred.fm.remote.protos import query_pb2
+from alfred.fm.remote.utils import PROTOCOL_VERSION, proto_to_tensor, tensor_to_proto
+from alfred.fm.response import CompletionResponse, RankedResponse
 
 
 class TestGRPCServer(unittest.TestCase):
@@ -55,9 +65,247 @@ class TestGRPCServer(unittest.TestCase):
         for i, response in enumerate(responses):
             self.assertEqual(response.prediction, f"Query {i + 1}")
 
+    def test_encode(self):
+        embeddings = self.client.encode(["Query 1", "Query 2"])
+        self.assertEqual(self.client.protocol_version, PROTOCOL_VERSION)
+        self.assertEqual(len(embeddings), 2)
+        self.assertTrue(torch.equal(embeddings[0], torch.zeros([512])))
+
     def tearDown(self):
         self.client.close()
 
 
+class RecordingModel:
+    def __init__(self):
+        self.batch_sizes = []
+
+    def run(self, queries, **kwargs):
+        self.batch_sizes.append(len(queries))
+        return [CompletionResponse(query.prompt.upper()) for query in queries]
+
+    def encode(self, texts, reduction=None, **kwargs):
+        return [torch.zeros(4) for _ in texts]
+
+
+class TestGRPCMicroBatching(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.port = 10712
+        cls.model = RecordingModel()
+
+        def server_starter():
+            asyncio.set_event_loop(asyncio.new_event_loop())
+            gRPCServer(model=cls.model, port=cls.port, max_batch_size=16)
+
+        threading.Thread(target=server_starter, daemon=True).start()
+        time.sleep(1)
+
+    def setUp(self):
+        self.model.batch_sizes.clear()
+        self.client = gRPCClient("localhost", self.port)
+        self.client.handshake()
+
+    def test_micro_batches(self):
+        queries = [CompletionQuery(prompt=f"query {i}") for i in range(200)]
+        responses = self.client.run(queries)
+        self.assertEqual(
+            [response.prediction for response in responses],
+            [f"QUERY {i}" for i in range(200)],
+        )
+        self.assertEqual(sum(self.model.batch_sizes), 200)
+        self.assertLessEqual(max(self.model.batch_sizes), 16)
+
+    def test_order_without_request_ids(self):
+        # the scheduler batches queries by candidate set, so these run out of order
+        requests = [
+            query_pb2.RunRequest(message="q0", candidate="a|||b"),
+            query_pb2.RunRequest(message="q1", candidate="x|||y"),
+            query_pb2.RunRequest(message="q2", candidate="a|||b"),
+            query_pb2.RunRequest(message="q3"),
+            query_pb2.RunRequest(message="q4", candidate="x|||y"),
+        ]
+        metadata = (("session_id", self.client.session_id),)
+        # clients without request ids get their responses in submission order
+        responses = list(self.client.stub.Run(iter(requests), metadata=metadata))
+        self.assertEqual([r.message for r in responses], ["Q0", "Q1", "Q2", "Q3", "Q4"])
+        self.assertLess(len(self.model.batch_sizes), 5)
+
+        # clients with request ids get each batch as soon as it finishes
+        for request_id, request in enumerate(requests):
+            request.request_id = request_id
+        responses = list(self.client.stub.Run(iter(requests), metadata=metadata))
+        self.assertEqual(
+            sorted((r.request_id, r.message) for r in responses),
+            [(i, f"Q{i}") for i in range(5)],
+        )
+
+    def test_streams_before_requests_end(self):
+        first_response = threading.Event()
+
+        def requests():
+            yield query_pb2.RunRequest(message="first", request_id=0)
+            first_response.wait(timeout=10)
+            yield query_pb2.RunRequest(message="second", request_id=1)
+
+        start = time.perf_counter()
+        stream = self.client.stub.Run(
+            requests(), metadata=(("session_id", self.client.session_id),)
+        )
+        response = next(stream)
+        # the first response arrives while the client is still holding back its second request
+        self.assertLess(time.perf_counter() - start, 5)
+        first_response.set()
+        self.assertEqual(response.request_id, 0)
+        self.assertEqual([r.request_id for r in stream], [1])
+        self.assertEqual(self.model.batch_sizes, [1, 1])
+
+    def tearDown(self):
+        self.client.close()
+
+
+class RecordedServer(gRPCServer):
+    # the server blocks in __init__, keeps a handle on it to read its state
+    instances = []
+
+    def __init__(self, *args, **kwargs):
+        RecordedServer.instances.append(self)
+        super().__init__(*args, **kwargs)
+
+
+class TestGRPCSessions(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.port = 10713
+
+        def server_starter():
+            asyncio.set_event_loop(asyncio.new_event_loop())
+            RecordedServer(model=RecordingModel(), port=cls.port, session_ttl_s=0.5)
+
+        threading.Thread(target=server_starter, daemon=True).start()
+        time.sleep(1)
+
+    def test_session_expires(self):
+        client = gRPCClient("localhost", self.port)
+        client.handshake()
+        responses = client.run([CompletionQuery(prompt="query")] * 10)
+        self.assertEqual(len(responses), 10)
+        self.assertEqual(len(client.encode(["text"] * 5)), 5)
+        server = RecordedServer.instances[0]
+        metrics = server.metrics()
+        self.assertEqual(metrics["streams"], 0)
+        self.assertEqual(metrics["scheduler"]["pending"], 0)
+        self.assertEqual(metrics["broker"]["topics"]["queries"]["depth"], 0)
+        # nothing is left behind in the session queue
+        self.assertEqual(metrics["broker"]["session_depth"], 0)
+        self.assertEqual(metrics["broker"]["dropped"], 0)
+
+        time.sleep(1.5)
+        expired_session_id = client.session_id
+        self.assertNotIn(expired_session_id, server.broker.sessions)
+        self.assertNotIn(expired_session_id, server.protocol_versions)
+        with self.assertRaises(grpc.RpcError) as error:
+            list(
+                client.stub.Run(
+                    iter([query_pb2.RunRequest(message="query")]),
+                    metadata=(("session_id", expired_session_id),),
+                )
+            )
+        self.assertEqual(error.exception.code(), grpc.StatusCode.UNAUTHENTICATED)
+
+        # the client opens a new session and retries
+        responses = client.run(CompletionQuery(prompt=f"q{i}") for i in range(3))
+        self.assertEqual([r.prediction for r in responses], ["Q0", "Q1", "Q2"])
+        self.assertNotEqual(client.session_id, expired_session_id)
+        time.sleep(1.5)
+        self.assertEqual(len(client.encode(["text"])), 1)
+        client.close()
+
+
+class TestTensorFraming(unittest.TestCase):
+    def test_round_trip(self):
+        for tensor in [
+            torch.randn(4096),
+            torch.randn(3, 5).to(torch.float16),
+            torch.randn(2, 7).to(torch.bfloat16),
+            torch.arange(12).reshape(3, 4)[:, 1:],
+            torch.tensor(1.5),
+            torch.empty(0, 8),
+        ]:
+            message = query_pb2.Tensor.FromString(
+                tensor_to_proto(tensor).SerializeToString()
+            )
+            decoded = proto_to_tensor(message)
+            self.assertEqual(decoded.dtype, tensor.dtype)
+            self.assertTrue(torch.equal(decoded, tensor))
+
+        array = np.arange(6, dtype=np.float32).reshape(2, 3)
+        self.assertTrue(
+            torch.equal(
+                proto_to_tensor(tensor_to_proto(array)), torch.from_numpy(array)
+            )
+        )
+        self.assertIsNone(tensor_to_proto(None))
+        # the non-writable buffer warning is only silenced inside proto_to_tensor,
+        # importing the module leaves the process-wide filters alone
+        with warnings.catch_warnings():
+            importlib.reload(alfred.fm.remote.utils)
+            self.assertFalse(
+                any("not writable" in str(f[1]) for f in warnings.filters if f[1])
+            )
+        with self.assertRaises(ValueError):
+            proto_to_tensor(query_pb2.Tensor(data=b"", dtype="nn"))
+
+    def test_run_response(self):
+        response = RankedResponse(
+            "a", scores={"a": 0.9, "b": 0.1}, logits={"a": 2.0, "b": -0.2}
+        )
+        response["embeddings"] = torch.randn(16)
+        message = gRPCServer._to_run_response(response)
+        self.assertEqual(message.embedding_tensor.shape, [16])
+        self.assertTrue(
+            torch.equal(proto_to_tensor(message.embedding_tensor), response.embeddings)
+        )
+
+        # protocol version 3 sends the candidates, logits and scores as packed arrays
+        self.assertEqual(list(message.candidates), ["a", "b"])
+        self.assertFalse(message.HasField("response"))
+        message = gRPCServer._to_run_response(response, protocol_version=2)
+        self.assertEqual(len(message.candidates), 0)
+        self.assertTrue(message.HasField("response"))
+
+        # clients before protocol version 2 get the previous fields
+        message = gRPCServer._to_run_response(response, protocol_version=1)
+        self.assertFalse(message.HasField("response"))
+        self.assertEqual(message.logit, str(response.logits))
+
+    def test_build_ranked_responses(self):
+        responses = [
+            RankedResponse(
+                "b", scores={"a": 0.25, "b": 0.75}, logits={"a": -1.0, "b": 0.1}
+            ),
+            # without matching scores, the client computes the softmax of the logits
+            RankedResponse("z", scores={}, logits={"x": 0.0, "y": 1.0, "z": 3.0}),
+            RankedResponse("c", scores={"c": 1.0}, logits={"c": 5.0}),
+        ]
+        messages = [
+            query_pb2.RunResponse.FromString(
+                gRPCServer._to_run_response(response).SerializeToString()
+            )
+            for response in responses
+        ]
+        built = gRPCClient._build_ranked_responses(messages)
+        self.assertEqual([r.prediction for r in built], ["b", "z", "c"])
+        for response, built_response in zip(responses, built):
+            self.assertEqual(built_response.logits, response.logits)
+        self.assertEqual(built[0].scores, responses[0].scores)
+        self.assertEqual(built[2].scores, {"c": 1.0})
+        probabilities = torch.softmax(torch.tensor([0.0, 1.0, 3.0]), dim=0)
+        np.testing.assert_allclose(
+            list(built[1].scores.values()), probabilities.numpy(), rtol=1e-6
+        )
+        self.assertEqual(list(built[1].scores), ["x", "y", "z"])
+        self.assertEqual(gRPCClient._build_ranked_responses([]), [])
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,87 @@
+import os
+import tempfile
+import unittest
+
+import torch
+from tokenizers import ByteLevelBPETokenizer
+from transformers import GPT2Config, GPT2LMHeadModel, GPT2TokenizerFast
+
+from alfred.fm.huggingface import HuggingFaceModel
+from alfred.fm.query import RankedQuery
+
+CORPUS = [
+    "Is the review positive or negative? The movie was great.",
+    "Which topic does this article belong to? Sports, politics or science.",
+    "The answer is yes, no or maybe.",
+]
+
+
+def save_tiny_gpt2(path):
+    bpe = ByteLevelBPETokenizer()
+    bpe.train_from_iterator(CORPUS, vocab_size=300, min_frequency=1)
+    tokenizer = GPT2TokenizerFast(tokenizer_object=bpe._tokenizer)
+    tokenizer.eos_token = tokenizer.pad_token = tokenizer.convert_ids_to_tokens(0)
+    torch.manual_seed(0)
+    model = GPT2LMHeadModel(
+        GPT2Config(
+            vocab_size=len(tokenizer),
+            n_positions=128,
+            n_embd=32,
+            n_layer=2,
+            n_head=2,
+            bos_token_id=0,
+            eos_token_id=0,
+        )
+    )
+    model.save_pretrained(path)
+    tokenizer.save_pretrained(path)
+
+
+class TestPrefixSharedScoring(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        cls.cwd = os.getcwd()
+        os.chdir(cls.tmp_dir.name)
+        save_tiny_gpt2(os.path.join("tiny", "gpt2"))
+        cls.model = HuggingFaceModel("tiny/gpt2", dtype="fp32", prefix_sharing=True)
+
+    @classmethod
+    def tearDownClass(cls):
+        os.chdir(cls.cwd)
+        cls.tmp_dir.cleanup()
+
+    def reference_logit(self, prompt, candidate):
+        tokenizer, model = self.model.tokenizer, self.model.model
+        prompt_ids = tokenizer(prompt, add_special_tokens=False).input_ids
+        candidate_ids = tokenizer(candidate).input_ids
+        input_ids = torch.tensor([prompt_ids + candidate_ids])
+        with torch.no_grad():
+            log_probs = torch.log_softmax(model(input_ids=input_ids).logits, dim=-1)
+        return sum(
+            log_probs[0, len(prompt_ids) + i - 1, token].item()
+            for i, token in enumerate(candidate_ids)
+        )
+
+    def test_matches_full_forward(self):
+        queries = [
+            RankedQuery("The movie was great. Is the review", ["positive", "negative"]),
+            RankedQuery("Sports", ["positive", "negative"]),
+            RankedQuery("The answer is", [" yes", " no", " maybe so"]),
+        ]
+        responses = self.model.run(queries, batch_size=4, no_tqdm=True)
+        for query, response in zip(queries, responses):
+            for candidate in query.candidates:
+                self.assertAlmostEqual(
+                    response.logits[candidate],
+                    self.reference_logit(query.prompt, candidate),
+                    places=4,
+                )
+            self.assertAlmostEqual(sum(response.scores.values()), 1.0, places=5)
+            self.assertEqual(
+                response.prediction, max(response.scores, key=response.scores.get)
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
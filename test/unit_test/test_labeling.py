@@ -0,0 +1,98 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from scipy import sparse
+
+from alfred.labeling import MajorityVote
+
+
+class TestMajorityVote(unittest.TestCase):
+    def test_label(self):
+        votes = np.array(
+            [
+                [1, 0, 0, 2, 2],
+                [0, 0, 0, 0, 0],
+                [3, 3, 1, 0, 0],
+                [1, 2, 0, 0, 0],
+            ],
+            dtype=np.int8,
+        )
+        label_model = MajorityVote(tie_break="smallest")
+        # abstentions are not counted
+        np.testing.assert_array_equal(label_model(votes), [2, 0, 3, 1])
+
+        labels, distribution = label_model.label(votes, return_distribution=True)
+        np.testing.assert_array_equal(labels, [2, 0, 3, 1])
+        np.testing.assert_allclose(
+            distribution,
+            [
+                [1 / 3, 2 / 3, 0],
+                [1 / 3, 1 / 3, 1 / 3],
+                [1 / 3, 0, 2 / 3],
+                [1 / 2, 1 / 2, 0],
+            ],
+        )
+
+        label_model = MajorityVote(tie_break="abstain")
+        np.testing.assert_array_equal(label_model(votes), [2, 0, 3, 0])
+
+        label_model = MajorityVote(weights=[3, 1, 1, 1, 1], tie_break="smallest")
+        np.testing.assert_array_equal(label_model(votes), [1, 0, 3, 1])
+
+        label_model = MajorityVote(abstention=-1, tie_break="smallest")
+        np.testing.assert_array_equal(
+            label_model(np.where(votes, votes, -1)), [2, -1, 3, 1]
+        )
+
+        with self.assertRaises(ValueError):
+            MajorityVote(abstention=-1)(votes)
+        with self.assertRaises(ValueError):
+            MajorityVote(weights=[1, 1])(votes)
+        with self.assertRaises(ValueError):
+            MajorityVote(num_classes=2)(votes)
+
+    def test_random_tie_break(self):
+        votes = np.tile(np.array([[1, 2, 3, 0]], dtype=np.int8), (1000, 1))
+        labels = MajorityVote(tie_break="random", seed=0)(votes)
+        self.assertEqual(set(labels), {1, 2, 3})
+        np.testing.assert_array_equal(
+            labels, MajorityVote(tie_break="random", seed=0)(votes)
+        )
+
+    def test_default_is_deterministic(self):
+        votes = np.array([[1, 2], [2, 1], [1, 1]])
+        label_model = MajorityVote()
+        # ties go to the smallest class, as with the previous scipy.stats.mode vote
+        for _ in range(10):
+            np.testing.assert_array_equal(label_model.label(votes), [1, 1, 1])
+
+    def test_chunked_sparse_and_memmap(self):
+        rng = np.random.default_rng(0)
+        votes = rng.integers(1, 5, size=(1000, 9)).astype(np.int8)
+        votes[rng.random(votes.shape) < 0.7] = 0
+        weights = rng.random(9)
+        labels, distribution = MajorityVote(weights=weights).label(
+            votes, return_distribution=True
+        )
+
+        label_model = MajorityVote(weights=weights, chunk_size=64)
+        for chunked_votes in [votes, sparse.csr_matrix(votes)]:
+            _, chunked_distribution = label_model.label(
+                chunked_votes, return_distribution=True
+            )
+            np.testing.assert_allclose(chunked_distribution, distribution)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "votes.npy")
+            np.save(path, votes)
+            memmap_votes = np.load(path, mmap_mode="r")
+            np.testing.assert_array_equal(
+                MajorityVote(weights=weights)(memmap_votes), labels
+            )
+            del memmap_votes
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import asyncio
+import unittest
+
+from alfred.fm.remote.message_queue import Message, MessageBroker
+
+
+class TestMessageBroker(unittest.TestCase):
+    def test_backpressure(self):
+        async def run():
+            broker = MessageBroker(max_topic_size=2)
+            # without a consumer, a topic holds no messages
+            for i in range(10):
+                await broker.publish(Message("unconsumed", i, "a"))
+            self.assertEqual(broker.topics["unconsumed"].messages.qsize(), 0)
+
+            topic = broker.consume_topic("queries")
+            for i in range(2):
+                await broker.publish(Message("queries", i, "a"))
+            # the full topic holds the publisher back until the consumer catches up
+            publisher = asyncio.ensure_future(
+                broker.publish(Message("queries", 2, "a"))
+            )
+            await asyncio.sleep(0.05)
+            self.assertFalse(publisher.done())
+            self.assertEqual((await topic.messages.get()).content, 0)
+            await asyncio.wait_for(publisher, 1)
+            return broker.metrics()
+
+        metrics = asyncio.run(run())
+        self.assertEqual(
+            metrics["topics"]["queries"], {"depth": 2, "maxsize": 2, "published": 3}
+        )
+        self.assertEqual(metrics["topics"]["unconsumed"]["published"], 10)
+
+    def test_sessions(self):
+        async def run():
+            broker = MessageBroker(max_session_size=3)
+            broker.open_session("a")
+            broker.open_session("b")
+            broker.subscribe("responses", "a")
+            broker.subscribe("responses", "b")
+            for i in range(5):
+                await broker.publish(Message("responses", i, "a"))
+            # a session queue keeps the newest messages
+            self.assertEqual(
+                [(await broker.consume("a")).content for _ in range(3)], [2, 3, 4]
+            )
+            self.assertEqual(broker.metrics()["session_depth"], 3)
+            self.assertEqual(broker.num_dropped, 4)
+
+            broker.last_seen["a"] -= 10
+            broker.last_seen["b"] -= 10
+            self.assertEqual(broker.expire_sessions(5, active=["b"]), ["a"])
+            self.assertFalse(broker.touch("a"))
+            self.assertEqual(broker.topics["responses"].subscribers, ["b"])
+            # activity restarts the time to live
+            self.assertTrue(broker.touch("b"))
+            self.assertEqual(broker.expire_sessions(5), [])
+            return broker.metrics()
+
+        metrics = asyncio.run(run())
+        self.assertEqual(metrics["sessions"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,8 @@
 import unittest
 
+import numpy as np
+import torch
+
 from alfred.fm.response import (
     Response,
     CompletionResponse,
@@ -89,6 +92,63 @@ class TestResponse(unittest.TestCase):
         print(type(deserialize(ranked_response.serialize()).scores))
         self.assertTrue(deserialize(ranked_response.serialize()) == ranked_response)
 
+    def test_binary_serialization(self):
+        embedding = torch.randn(2, 8)
+        ranked_response = RankedResponse(
+            "b",
+            scores={"a": 0.25, "b": 0.75},
+            logits={"a": -1.5, "b": 0.1},
+            embeddings=embedding,
+        )
+        record = ranked_response.to_bytes()
+        self.assertIsInstance(record, bytes)
+        self.assertLess(len(record), len(ranked_response.serialize()))
+
+        decoded = deserialize(record)
+        self.assertIsInstance(decoded, RankedResponse)
+        self.assertEqual(decoded.prediction, "b")
+        self.assertEqual(decoded.scores, ranked_response.scores)
+        self.assertEqual(decoded.logits, ranked_response.logits)
+        self.assertTrue(torch.equal(decoded.embeddings, embedding))
+
+        completion_response = CompletionResponse(
+            "text", score=0.5, embedding=np.arange(6, dtype=np.float16).reshape(2, 3)
+        )
+        decoded = deserialize(completion_response.to_bytes())
+        self.assertEqual(decoded.prediction, "text")
+        self.assertEqual(decoded.score, 0.5)
+        self.assertEqual(decoded.embedding.dtype, np.float16)
+        np.testing.assert_array_equal(decoded.embedding, completion_response.embedding)
+
+        # JSON strings (and JSON stored as bytes) are still read
+        completion_response = CompletionResponse("text")
+        self.assertTrue(
+            deserialize(completion_response.to_bytes()) == completion_response
+        )
+        self.assertTrue(
+            deserialize(completion_response.serialize().encode()) == completion_response
+        )
+
+        # numpy scalars are stored as numbers, and numbers are widened to float64
+        ranked_response = RankedResponse(
+            "a", scores={"a": np.float32(0.7), "b": 0.3}, logits={"a": np.int64(2)}
+        )
+        decoded = deserialize(ranked_response.to_bytes())
+        self.assertIsInstance(decoded.scores, dict)
+        self.assertAlmostEqual(decoded.scores["a"], 0.7, places=6)
+        self.assertEqual(decoded.scores["b"], 0.3)
+        self.assertEqual(decoded.logits, {"a": 2.0})
+        completion_response = CompletionResponse("text")
+        for value in [np.float32(0.5), np.int64(3), 3]:
+            completion_response["score"] = value
+            decoded = deserialize(completion_response.to_bytes())
+            self.assertIsInstance(decoded.score, float)
+            self.assertEqual(decoded.score, float(value))
+
+        # records from a newer version are rejected
+        with self.assertRaises(ValueError):
+            deserialize(record[:3] + bytes([record[3] + 1]) + record[4:])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,191 @@
+import asyncio
+import unittest
+
+from alfred.fm.query import CompletionQuery, RankedQuery
+from alfred.fm.remote.message_queue import Message, MessageBroker
+from alfred.fm.remote.scheduler import BatchScheduler
+from alfred.fm.response import CompletionResponse
+
+
+class RecordingModel:
+    def __init__(self):
+        self.batches = []
+
+    def run(self, queries, **kwargs):
+        self.batches.append([query.prompt for query in queries])
+        if any(query.prompt == "fail" for query in queries):
+            raise RuntimeError("model failed")
+        return [CompletionResponse(query.prompt.upper()) for query in queries]
+
+
+def query_message(prompt, session_id, request_id, reply_to=None, **kwargs):
+    return Message(
+        "queries",
+        CompletionQuery(prompt),
+        session_id,
+        reply_to=reply_to,
+        metadata={"request_id": request_id, "kwargs": kwargs},
+    )
+
+
+class TestBatchScheduler(unittest.TestCase):
+    def test_fair_batches(self):
+        scheduler = BatchScheduler(RecordingModel(), MessageBroker(), max_batch_size=8)
+        for i in range(20):
+            scheduler._enqueue(query_message(f"a{i}", "a", i))
+        for i in range(3):
+            scheduler._enqueue(query_message(f"b{i}", "b", i))
+
+        # the sessions take turns although session a queued its queries first
+        batch = scheduler._next_batch()
+        self.assertEqual(
+            [m.content.prompt for m in batch],
+            ["a0", "b0", "a1", "b1", "a2", "b2", "a3", "a4"],
+        )
+        self.assertEqual([m.metadata["request_id"] for m in batch[:2]], [0, 0])
+        self.assertEqual(len(scheduler._next_batch()), 8)
+        self.assertEqual(len(scheduler._next_batch()), 7)
+        self.assertEqual(scheduler._num_pending, 0)
+        self.assertEqual(scheduler._pending, {})
+
+    def test_batch_groups(self):
+        scheduler = BatchScheduler(RecordingModel(), MessageBroker())
+        scheduler._enqueue(query_message("c0", "a", 0))
+        scheduler._enqueue(
+            Message(
+                "queries",
+                RankedQuery("r0", candidates=["x", "y"]),
+                "a",
+                metadata={"request_id": 1},
+            )
+        )
+        scheduler._enqueue(query_message("c1", "b", 0, temperature=0.5))
+        scheduler._enqueue(query_message("c2", "b", 1))
+
+        # queries only share a model call with the same arguments and candidates,
+        # and the group of the oldest query runs first
+        self.assertEqual(
+            [m.content.prompt for m in scheduler._next_batch()], ["c0", "c2"]
+        )
+        self.assertEqual([m.content.prompt for m in scheduler._next_batch()], ["r0"])
+        self.assertEqual([m.content.prompt for m in scheduler._next_batch()], ["c1"])
+
+    def test_discard(self):
+        scheduler = BatchScheduler(RecordingModel(), MessageBroker())
+        replies = {"a": asyncio.Queue(), "b": asyncio.Queue()}
+        for i in range(3):
+            for session_id in replies:
+                scheduler._enqueue(
+                    query_message(
+                        f"{session_id}{i}", session_id, i, replies[session_id]
+                    )
+                )
+        scheduler.discard(replies["a"])
+        self.assertEqual(scheduler._num_pending, 3)
+        # queries of the ended Run call that are still on the topic are dropped as well
+        scheduler._enqueue(query_message("a3", "a", 3, replies["a"]))
+        self.assertEqual(
+            [m.content.prompt for m in scheduler._next_batch()], ["b0", "b1", "b2"]
+        )
+        self.assertEqual(scheduler._pending, {})
+
+    def test_max_pending(self):
+        async def run():
+            broker = MessageBroker()
+            scheduler = BatchScheduler(
+                RecordingModel(), broker, max_batch_size=4, max_pending=6
+            )
+            queue = broker.topics["queries"].messages
+            for i in range(10):
+                await broker.publish(query_message(f"a{i}", "a", i))
+            await scheduler._collect(queue)
+            return scheduler.metrics(), queue.qsize()
+
+        metrics, depth = asyncio.run(run())
+        self.assertEqual(metrics["pending"], 6)
+        self.assertEqual(depth, 4)
+
+    def test_routes_responses(self):
+        model = RecordingModel()
+
+        async def run():
+            broker = MessageBroker()
+            scheduler = BatchScheduler(model, broker, max_batch_size=8)
+            replies = {"a": asyncio.Queue(), "b": asyncio.Queue()}
+            for session_id, n in [("a", 6), ("b", 4)]:
+                for i in range(n):
+                    await broker.publish(
+                        query_message(
+                            f"{session_id}{i}", session_id, i, replies[session_id]
+                        )
+                    )
+            await broker.publish(
+                query_message("fail", "b", 4, replies["b"], temperature=0.0)
+            )
+            scheduler.start()
+            received = {}
+            for session_id, n in [("a", 6), ("b", 5)]:
+                received[session_id] = [
+                    await replies[session_id].get() for _ in range(n)
+                ]
+            scheduler.stop()
+            return received, scheduler.metrics()
+
+        received, metrics = asyncio.run(run())
+        # both sessions share the first model call
+        self.assertEqual(
+            model.batches[0], ["a0", "b0", "a1", "b1", "a2", "b2", "a3", "b3"]
+        )
+        self.assertEqual(
+            [(i, r.prediction) for i, r in received["a"]],
+            [(i, f"A{i}") for i in range(6)],
+        )
+        self.assertEqual(
+            [(i, r.prediction) for i, r in received["b"][:4]],
+            [(i, f"B{i}") for i in range(4)],
+        )
+        # a failed batch sends the error to each of its queries, the others are unaffected
+        request_id, error = received["b"][4]
+        self.assertEqual(request_id, 4)
+        self.assertIsInstance(error, RuntimeError)
+        self.assertEqual(metrics, {"pending": 0, "batches": 3, "queries": 11})
+
+    def test_failed_batch_isolates_sessions(self):
+        model = RecordingModel()
+
+        async def run():
+            broker = MessageBroker()
+            scheduler = BatchScheduler(model, broker, max_batch_size=8)
+            replies = {"a": asyncio.Queue(), "b": asyncio.Queue()}
+            for prompt, session_id, request_id in [
+                ("a0", "a", 0),
+                ("fail", "b", 0),
+                ("a1", "a", 1),
+                ("b1", "b", 1),
+            ]:
+                await broker.publish(
+                    query_message(prompt, session_id, request_id, replies[session_id])
+                )
+            scheduler.start()
+            received = {
+                session_id: [await replies[session_id].get() for _ in range(2)]
+                for session_id in replies
+            }
+            scheduler.stop()
+            return received
+
+        received = asyncio.run(run())
+        # the merged batch fails and is run again session by session
+        self.assertEqual(
+            model.batches, [["a0", "fail", "a1", "b1"], ["a0", "a1"], ["fail", "b1"]]
+        )
+        self.assertEqual(
+            [(i, r.prediction) for i, r in received["a"]], [(0, "A0"), (1, "A1")]
+        )
+        self.assertEqual([i for i, _ in received["b"]], [0, 1])
+        for _, error in received["b"]:
+            self.assertIsInstance(error, RuntimeError)
+
+
+if __name__ == "__main__":
+    unittest.main()
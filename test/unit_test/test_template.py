@@ -1,5 +1,9 @@
 import unittest
 
+import pyarrow
+
+from alfred.client import Client
+from alfred.data import IterableArrowDataset
 from alfred.fm.query import CompletionQuery, RankedQuery
 from alfred.template import StringTemplate
 
@@ -38,3 +42,77 @@ class TestTemplate(unittest.TestCase):
         self.assertIsInstance(query, RankedQuery)
         self.assertEqual(query.prompt, "This is a Test data.")
         self.assertEqual(query.candidates, ["Yes", "No"])
+
+    def test_string_template_compiled_render(self):
+        template = StringTemplate("[[a]] and [[b]], [[a]] again, [[c]] stays")
+        query = template.apply({"a": "x", "b": "y", "c": 1})
+        self.assertEqual(query.prompt, "x and y, x again, [[c]] stays")
+
+        query = template.apply({"first": "x", "b": "y"}, key_translator={"first": "a"})
+        self.assertEqual(query.prompt, "x and y, x again, [[c]] stays")
+
+        # keywords match keys by their string form
+        int_template = StringTemplate("[[0]] or [[1]]")
+        self.assertEqual(int_template.apply({0: "x", 1: "y"}).prompt, "x or y")
+        query = int_template.apply({"a": "x", 1: "y"}, key_translator={"a": 0})
+        self.assertEqual(query.prompt, "x or y")
+
+        # values are inserted verbatim, placeholders in them are not rendered
+        query = template.apply({"a": "[[b]]", "b": "y"})
+        self.assertEqual(query.prompt, "[[b]] and y, [[b]] again, [[c]] stays")
+
+        template.from_promptsource(
+            {
+                "template": "Is [[a]] true?",
+                "id": None,
+                "name": None,
+                "reference": None,
+                "metadata": None,
+                "answer_choices": None,
+            }
+        )
+        self.assertEqual(template.apply({"a": "x"}).prompt, "Is x true?")
+        self.assertEqual(template.keywords, ["a"])
+
+    def test_string_template_apply_to_dataset(self):
+        template = StringTemplate("This is a [[data]].")
+        dataset = [{"data": str(idx)} for idx in range(3)]
+        prompts = ["This is a 0.", "This is a 1.", "This is a 2."]
+        queries = template.apply_to_dataset(dataset)
+        self.assertIsInstance(queries, list)
+        self.assertEqual([query.prompt for query in queries], prompts)
+
+        queries = template.iter_dataset(iter(dataset))
+        self.assertNotIsInstance(queries, list)
+        self.assertEqual([query.prompt for query in queries], prompts)
+
+    def test_string_template_render_table(self):
+        table = pyarrow.table(
+            {
+                "text": ["a", None, "c"],
+                "entity": pyarrow.array(["x", "y", "z"], pyarrow.large_string()),
+                "label": [1, 2, 3],
+            }
+        )
+        template = StringTemplate("[[text]] about [[e]] ([[label]]), [[text]]!")
+        prompts = template.render_table(
+            IterableArrowDataset(table), key_translator={"entity": "e"}
+        )
+        self.assertEqual(
+            prompts.to_pylist(),
+            [
+                template.apply(row, key_translator={"entity": "e"}).prompt
+                for row in table.to_pylist()
+            ],
+        )
+        self.assertEqual(prompts[1].as_py(), "[[text]] about y ([[label]]), [[text]]!")
+
+        template = StringTemplate("No keyword [[missing]]")
+        self.assertEqual(
+            template.render_table(table).to_pylist(), ["No keyword [[missing]]"] * 3
+        )
+
+        responses = Client(model_type="dummy").run(
+            StringTemplate("[[text]]!").render_table(table.slice(0, 1))
+        )
+        self.assertEqual([response.prediction for response in responses], ["a!"])
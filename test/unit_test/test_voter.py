@@ -1,8 +1,14 @@
+import os
+import tempfile
 import unittest
 
+import numpy as np
+
+from alfred.fm.query import RankedQuery
 from alfred.fm.response import CompletionResponse, RankedResponse
 from alfred.template import StringTemplate
-from alfred.voter import Voter
+from alfred.client import Client
+from alfred.voter import VoteMatrixBuilder, Voter
 
 
 class TestVoter(unittest.TestCase):
@@ -55,6 +61,136 @@ class TestVoter(unittest.TestCase):
         self.assertEqual(len(votes), 1)
         self.assertEqual(votes[0], 2)
 
+    def test_batched_vote(self):
+        template_voter = Voter(label_map={"Yes": 1, "No": 2, "Maybe": 3})
+        rng = np.random.default_rng(0)
+        logits = rng.normal(size=(100, 3))
+        responses = [
+            RankedResponse(
+                "Yes",
+                logits=dict(zip(["Yes", "No", "Maybe"], row)),
+                scores={},
+            )
+            for row in logits
+        ] + [CompletionResponse("No"), "Maybe", "maybe"]
+
+        votes = template_voter.vote(responses)
+        self.assertTrue(np.all(votes[:100] == 1))
+        self.assertEqual(list(votes[100:]), [2, 3, 0])
+
+        weights, biases = np.diag([1.0, 2.0, 0.5]), np.array([0.0, 0.1, -0.1])
+        template_voter.set_calibration(weights, biases)
+        votes = template_voter.vote(responses)
+        expected = np.argmax(logits @ weights.T + biases, axis=1) + 1
+        np.testing.assert_array_equal(votes[:100], expected)
+        self.assertEqual(list(votes[100:]), [2, 3, 0])
+
+        template_voter = Voter(
+            label_map={"Yes": 1, "No": 2, "Maybe": 3}, calibration=weights
+        )
+        np.testing.assert_array_equal(
+            template_voter.vote(responses[:100]),
+            np.argmax(logits @ weights, axis=1) + 1,
+        )
+
+    def test_sparse_vote(self):
+        template_voter = Voter(label_map={"Yes": 1, "No": 2})
+        responses = ["Yes", "Maybe", "No", "Maybe"]
+        votes = template_voter.vote(responses, sparse=True)
+        self.assertEqual(votes.shape, (4, 1))
+        self.assertEqual(votes.dtype, np.int8)
+        self.assertEqual(votes.nnz, 2)
+        np.testing.assert_array_equal(votes.toarray()[:, 0], [1, 0, 2, 0])
+
+        with self.assertRaises(ValueError):
+            template_voter.vote(responses, sparse=True, abstention=-1)
+        with self.assertRaises(ValueError):
+            Voter(label_map={"Yes": 200}).vote(responses, sparse=True)
+
+
+class CountingClient(Client):
+    def run(self, queries, **kwargs):
+        self.calls.append(len(queries))
+        return super().run(queries, **kwargs)
+
+
+class KindClient:
+    """answers ranked queries with their first candidate and completions with their prompt"""
+
+    def __init__(self):
+        self.calls = []
+
+    def run(self, queries, **kwargs):
+        kinds = {isinstance(query, RankedQuery) for query in queries}
+        if len(kinds) > 1:
+            raise ValueError("Mixed ranked and completion queries in one run")
+        self.calls.append(len(queries))
+        return [
+            (
+                RankedResponse(prediction=query.candidates[0], scores={})
+                if isinstance(query, RankedQuery)
+                else CompletionResponse(prediction=query.load()[0])
+            )
+            for query in queries
+        ]
+
+
+class TestVoteMatrixBuilder(unittest.TestCase):
+    def test_build(self):
+        client = CountingClient(model_type="dummy")
+        client.calls = []
+        templates = [
+            StringTemplate("[[answer]]"),
+            StringTemplate("[[answer]]"),
+            StringTemplate("[[answer]]!"),
+        ]
+        voters = [
+            Voter(label_map={"Yes": 1, "No": 2}),
+            Voter(
+                label_map={"yes": 1, "no": 2}, matching_fn=lambda x, y: x.lower() == y
+            ),
+            Voter(label_map={"Yes!": 1, "No!": 2}),
+        ]
+        dataset = [{"answer": answer} for answer in ["Yes", "No", "Maybe", "No"]]
+        expected = np.array([[1, 1, 1], [2, 2, 2], [0, 0, 0], [2, 2, 2]])
+
+        builder = VoteMatrixBuilder(client, templates, voters)
+        votes = builder.build(dataset)
+        np.testing.assert_array_equal(votes, expected)
+        # one run over the 6 distinct prompts
+        self.assertEqual(client.calls, [6])
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "votes.npy")
+            votes = builder(dataset, memmap_path=path)
+            self.assertIsInstance(votes, np.memmap)
+            np.testing.assert_array_equal(np.load(path, mmap_mode="r"), expected)
+            del votes
+
+        votes = builder(dataset, sparse=True)
+        self.assertEqual(votes.dtype, np.int8)
+        self.assertEqual(votes.nnz, 9)
+        np.testing.assert_array_equal(votes.toarray(), expected)
+        self.assertEqual(client.calls, [6, 6, 6])
+
+        with self.assertRaises(ValueError):
+            VoteMatrixBuilder(client, templates, voters[:2])
+
+    def test_build_mixed_templates(self):
+        dataset = [{"answer": answer} for answer in ["Yes", "No", "Maybe"]]
+        completion = StringTemplate("[[answer]]")
+        ranked = StringTemplate("Is it [[answer]]?", answer_choices="No|||Yes")
+        voter = Voter(label_map={"Yes": 1, "No": 2})
+        for templates, expected in [
+            ([completion, ranked], [[1, 2], [2, 2], [0, 2]]),
+            ([ranked, completion], [[2, 1], [2, 2], [2, 0]]),
+        ]:
+            client = KindClient()
+            votes = VoteMatrixBuilder(client, templates, voter).build(dataset)
+            np.testing.assert_array_equal(votes, expected)
+            # one run per kind of query
+            self.assertEqual(sorted(client.calls), [3, 3])
+
 
 if __name__ == "__main__":
     unittest.main()